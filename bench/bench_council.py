@@ -0,0 +1,182 @@
+"""
+軍議の計測 — 写し帳を再生して WarCouncil の段取りの手間を測る
+
+API を呼ばずに（castle_cassette の写し帳を再生して）1・10・100 の軍議を同時に開き、次を表にする。
+
+    - 全体の所要時間（wall）と、家臣の依存関係上の最長経路（critical path）
+      — 両者の差が、待ち時間では説明できない段取りの手間
+    - 家臣ごとに送ったプロンプトのバイト数と入出力トークン数（1軍議あたりの平均）
+    - プロセスの最大常駐メモリ（peak RSS）
+
+最大常駐メモリは下がらないので、同時に開く数ごとに別のプロセスで測る。待ち時間は写し帳の値を
+--scale 倍し（デフォルト: 0.01）、乱数の種を固定するので、同じ写し帳なら何度回しても同じ条件になる。
+写し帳を指定しなければ bench/make_cassette.py の決まった返事を録って使う。
+
+Usage:
+    python bench/bench_council.py
+    python bench/bench_council.py --themes 1 10 --scale 0.05 --json bench_result.json
+    python bench/bench_council.py --cassette my_run.jsonl --ttft lognormal:0,0.5 --tps normal:60,10
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from castle_cassette import Cassette, Distribution, ReplayTiming
+from make_cassette import BENCH_THEME, DEFAULT_CASSETTE, make_cassette
+from war_council import (
+    DEFAULT_MAX_PARALLEL,
+    RETAINERS,
+    AsyncReplayAPIClient,
+    CastleWorkspace,
+    ReplayAPIClient,
+    WarCouncil,
+    build_dependency_graph,
+)
+
+DEFAULT_THEMES = (1, 10, 100)
+DEFAULT_SCALE = 0.01
+
+
+def critical_path(council: WarCouncil) -> float:
+    """家臣の依存関係上の最長経路（各家臣の所要時間の和）に家老の所要時間を足したもの"""
+    durations = {span.name: span.duration for span in council.tracer.agent_spans()}
+    graph = build_dependency_graph(RETAINERS)
+    names = {agent.number: agent.name_en for agent in RETAINERS}
+    finish: dict[int, float] = {}
+
+    def finish_at(number: int) -> float:
+        if number not in finish:
+            finish[number] = durations.get(names[number], 0.0) + max(
+                (finish_at(dep) for dep in graph[number]), default=0.0
+            )
+        return finish[number]
+
+    return max((finish_at(number) for number in graph), default=0.0) + durations.get("Karo", 0.0)
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+async def run_councils(count: int, cassette: Cassette, timing: ReplayTiming, max_parallel: int, root: Path) -> dict:
+    """count 件の軍議を同時に開き、計測値をまとめる"""
+    councils = []
+    for index in range(count):
+        council = WarCouncil(
+            theme=f"{BENCH_THEME} {index}",
+            max_parallel=max_parallel,
+            workspace=CastleWorkspace(run_id=f"bench_{index:04d}", root=root / f"bench_{index:04d}"),
+            api=ReplayAPIClient(cassette, timing),
+            async_api=AsyncReplayAPIClient(cassette, timing),
+        )
+        councils.append(council)
+
+    started = time.perf_counter()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        results = await asyncio.gather(*(council.execute_async() for council in councils))
+    wall = time.perf_counter() - started
+
+    agents: dict[str, dict[str, float]] = {}
+    for council in councils:
+        for span in council.tracer.agent_spans():
+            totals = agents.setdefault(span.name, {"prompt_bytes": 0, "input_tokens": 0, "output_tokens": 0})
+            for key in totals:
+                totals[key] += span.attrs.get(key, 0) / count
+    paths = [critical_path(council) for council in councils]
+    return {
+        "themes": count,
+        "succeeded": sum(results),
+        "wall_sec": round(wall, 4),
+        "critical_path_sec": round(max(paths), 4),
+        "overhead_sec": round(wall - max(paths), 4),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "agents": {name: {key: round(value) for key, value in totals.items()} for name, totals in agents.items()},
+    }
+
+
+def measure(args) -> dict:
+    """子プロセス側: 1つの同時数を測る"""
+    timing = ReplayTiming(
+        ttft=Distribution.parse(args.ttft) if args.ttft else None,
+        tokens_per_sec=Distribution.parse(args.tps) if args.tps else None,
+        scale=args.scale,
+        seed=args.seed,
+    )
+    cassette = Cassette(args.cassette)
+    with tempfile.TemporaryDirectory() as tmp:
+        return asyncio.run(run_councils(args.child, cassette, timing, args.max_parallel, Path(tmp)))
+
+
+def render(results: list[dict]) -> str:
+    rows = [
+        "| 同時軍議 | 勝利 | wall | critical path | 段取りの手間 | peak RSS |",
+        "|---:|---:|---:|---:|---:|---:|",
+    ]
+    for r in results:
+        rows.append(
+            f"| {r['themes']} | {r['succeeded']} | {r['wall_sec']:.3f}s | {r['critical_path_sec']:.3f}s | "
+            f"{r['overhead_sec']:.3f}s | {r['peak_rss_mb']:.1f} MB |"
+        )
+    rows += ["", "| 家臣 | プロンプト (bytes) | 入力 | 出力 |", "|---|---:|---:|---:|"]
+    for name, totals in results[0]["agents"].items():
+        rows.append(f"| {name} | {totals['prompt_bytes']:,} | {totals['input_tokens']:,} | {totals['output_tokens']:,} |")
+    return "\n".join(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="軍議の計測（写し帳の再生）")
+    parser.add_argument("--themes", type=int, nargs="+", default=list(DEFAULT_THEMES), help="同時に開く軍議の数")
+    parser.add_argument("--cassette", type=Path, default=None, help="再生する写し帳（デフォルト: 決まった返事を録る）")
+    parser.add_argument("--scale", type=float, default=DEFAULT_SCALE, help="待ち時間の倍率")
+    parser.add_argument("--ttft", type=str, default=None, help="最初の一字までの秒数の分布（デフォルト: 録った値）")
+    parser.add_argument("--tps", type=str, default=None, help="出力速度（tok/s）の分布（デフォルト: 録った所要時間）")
+    parser.add_argument("--seed", type=int, default=0, help="待ち時間の乱数の種")
+    parser.add_argument("--max-parallel", type=int, default=DEFAULT_MAX_PARALLEL, help="軍議ごとの同時動員数")
+    parser.add_argument("--json", type=Path, default=None, help="結果を JSON で保存する先")
+    parser.add_argument("--child", type=int, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.cassette is None:
+        args.cassette = DEFAULT_CASSETTE
+        if not args.cassette.exists():
+            make_cassette(args.cassette)
+    elif not args.cassette.exists():
+        parser.error(f"無念！写し帳が見つかりませぬ: {args.cassette}")
+
+    if args.child is not None:
+        print(json.dumps(measure(args), ensure_ascii=False))
+        return
+
+    results = []
+    for count in args.themes:
+        command = [sys.executable, __file__, "--child", str(count), "--cassette", str(args.cassette),
+                   "--scale", str(args.scale), "--seed", str(args.seed), "--max-parallel", str(args.max_parallel)]
+        for flag, value in (("--ttft", args.ttft), ("--tps", args.tps)):
+            if value:
+                command += [flag, value]
+        completed = subprocess.run(command, capture_output=True, text=True)
+        if completed.returncode != 0:
+            print(completed.stderr, file=sys.stderr)
+            sys.exit(f"無念！{count} 件の計測が倒れました")
+        results.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+        print(f"  {count} 件: wall {results[-1]['wall_sec']:.3f}s", file=sys.stderr)
+
+    print(render(results))
+    if args.json:
+        args.json.write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
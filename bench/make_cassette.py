@@ -0,0 +1,113 @@
+"""
+計測用の写し帳を作る — API を呼ばず、決まった形の返事を録る
+
+bench_council.py は写し帳を再生して軍議を回す。本物の軍議を --record で録った写し帳があればそれを使えばよいが、
+API キーのない場所でも計測を始められるよう、記事の体裁を備えた決まった返事（と、それらしい
+トークン数・待ち時間）を家臣ごとに録った写し帳をここで作る。乱数の種を固定しているので、何度作っても同じ中身になる。
+
+Usage:
+    python bench/make_cassette.py [出力先.jsonl]    # デフォルト: bench/cassettes/synthetic.jsonl
+"""
+
+import contextlib
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from castle_cassette import Cassette
+from war_council import (
+    CallStats,
+    CastleRequestPool,
+    CastleWorkspace,
+    RecordingAPIClient,
+    WarCouncil,
+    new_usage_totals,
+)
+
+DEFAULT_CASSETTE = Path(__file__).resolve().parent / "cassettes" / "synthetic.jsonl"
+BENCH_THEME = "計測用のテーマ"
+
+# 返事の待ち時間（最初の一字まで: 対数正規、出力速度: tok/s）
+TTFT_MU, TTFT_SIGMA = 0.3, 0.4
+TOKENS_PER_SEC = 60.0
+
+# 1セクション分の本文（記事の長さは max_tokens に合わせてセクションの数で決める）
+_PARAGRAPH = "これは計測用の本文でございます。段取りの手間とプロンプトの大きさを測るための文章です。" * 4
+
+
+def synthetic_article(max_tokens: int) -> str:
+    """Frontmatter・H1・リード文・H2 セクション・まとめ・出典を備えた記事"""
+    sections = max(2, min(8, max_tokens // 1024))
+    parts = ["---\ntitle: 計測用の記事\n---\n", "# 計測用の記事\n", _PARAGRAPH + "\n"]
+    for number in range(1, sections + 1):
+        parts.append(f"## 第{number}章\n\n{_PARAGRAPH}\n\n{_PARAGRAPH}\n")
+    parts.append(f"## まとめ\n\n{_PARAGRAPH}\n")
+    parts.append("## 【出典・参考】\n\n- [計測用の出典](https://example.com/bench)\n")
+    return "\n".join(parts)
+
+
+class SyntheticAPIClient:
+    """CastleAPIClient の身代わり。待たずに返し、計測値だけそれらしく埋める"""
+
+    def __init__(self, model: str, seed: int = 0):
+        self.model = model
+        self.usage = new_usage_totals()
+        self._rng = random.Random(seed)
+
+    def call_agent(
+        self,
+        system_prompt: str,
+        user_message: str,
+        max_tokens: int = 8192,
+        temperature: float = 0.7,
+        context: str = "",
+        stream_to: Optional[Path] = None,
+        stats: Optional[CallStats] = None,
+        model: Optional[str] = None,
+    ) -> str:
+        stats = stats if stats is not None else CallStats()
+        text = synthetic_article(max_tokens)
+        stats.model = model or self.model
+        stats.input_tokens = CastleRequestPool.estimate_tokens(system_prompt + context + user_message)
+        stats.output_tokens = CastleRequestPool.estimate_tokens(text)
+        stats.started_at = time.time()
+        stats.first_token_at = stats.started_at + self._rng.lognormvariate(TTFT_MU, TTFT_SIGMA)
+        stats.finished_at = stats.first_token_at + stats.output_tokens / TOKENS_PER_SEC
+        stats.add_to(self.usage)
+        if stream_to is not None:
+            stream_to.parent.mkdir(parents=True, exist_ok=True)
+            stream_to.write_text(text, encoding="utf-8")
+        return text
+
+
+def make_cassette(path: Path) -> Cassette:
+    """写し帳を作り直す（既にあれば捨てる）"""
+    path.unlink(missing_ok=True)
+    cassette = Cassette(path)
+    with tempfile.TemporaryDirectory() as tmp, open(os.devnull, "w") as devnull:
+        council = WarCouncil(
+            theme=BENCH_THEME,
+            workspace=CastleWorkspace(run_id="record", root=Path(tmp) / "record"),
+        )
+        council.api = RecordingAPIClient(SyntheticAPIClient(council.model), cassette)
+        with contextlib.redirect_stdout(devnull):
+            success = council.execute()
+    if not success:
+        raise RuntimeError("無念！計測用の写し帳を録る軍議が倒れました")
+    return cassette
+
+
+def main():
+    path = Path(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_CASSETTE
+    cassette = make_cassette(path)
+    print(f"写し帳を録りました: {path}（{len(cassette.interactions)}組）")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+一括注文所の代役 — Message Batches API の手元の身代わり
+
+--batch-api は本来 Anthropic の Message Batches API に依頼の束を出すが、ネットワークのない場所でも
+束ね方・問い合わせ・結果の振り分けを確かめられるよう、同じ受け答えをする代役をここに置く。
+
+    - create(requests) で束を受け付け、latency 秒経てば処理済みとする（in_progress → ended）
+    - 各依頼の返事は responder(params) -> str で作る（既定は見出しだけ整えた定型文）
+    - fail_every を指定すると N 件に1件を errored（overloaded_error）で返す（出し直しの確かめ用）
+    - 結果は API の結果 JSONL と同じ形（custom_id / result.type / result.message.content・usage）
+
+war_council.py からは --batch-server local で使う。自前の代役は create / status / results を備えた
+オブジェクトを返す関数を --batch-server <module>:<関数名> で渡せる。
+
+Usage:
+    python castle_batch.py <requests.jsonl>    # 1行1依頼（custom_id と params）を代役に通し、結果を JSONL で出す
+"""
+
+import asyncio
+import itertools
+import json
+import re
+import sys
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Optional
+
+# custom_id に使える文字（API と同じ制約）
+_CUSTOM_ID = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+def _message_text(params: dict) -> str:
+    """依頼の最後のユーザーメッセージの本文（content が文字列でもブロックの並びでもよい）"""
+    content = params["messages"][-1]["content"]
+    if isinstance(content, str):
+        return content
+    return "\n\n".join(block.get("text", "") for block in content if block.get("type") == "text")
+
+
+def _system_text(params: dict) -> str:
+    system = params.get("system", "")
+    if isinstance(system, str):
+        return system
+    return "\n\n".join(block.get("text", "") for block in system)
+
+
+def _estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 3)
+
+
+def echo_responder(params: dict) -> str:
+    """既定の返事: 依頼の冒頭を写した Markdown（軍議を最後まで通せるよう見出しの体裁だけ整える）"""
+    lead = " ".join(_message_text(params).split())[:80]
+    return (
+        f"# 代役の返事\n\n> {lead}\n\n"
+        "## 本論\n\n（一括注文所の代役による返事でございます）\n\n"
+        "## まとめ\n\n以上でございます。\n"
+    )
+
+
+@dataclass
+class _Batch:
+    requests: list[dict]
+    created_at: float
+
+
+class LocalBatchServer:
+    """
+    Message Batches API の代役（プロセス内、ネットワークなし）。
+    war_council.MessageBatcher から見た受け答えは本番と同じ。
+    """
+
+    def __init__(
+        self,
+        responder: Optional[Callable[[dict], str]] = None,
+        latency: float = 0.0,
+        fail_every: int = 0,
+    ):
+        self.responder = responder or echo_responder
+        self.latency = latency
+        self.fail_every = fail_every
+        self.batches: dict[str, _Batch] = {}
+        self._ids = itertools.count(1)
+        self._answered = itertools.count(1)
+
+    async def create(self, requests: list[dict]) -> str:
+        """束を受け付けて batch_id を返す"""
+        if not requests:
+            raise ValueError("無念！空の束は受け付けられませぬ")
+        seen = set()
+        for request in requests:
+            custom_id = request.get("custom_id", "")
+            if not _CUSTOM_ID.match(custom_id):
+                raise ValueError(f"無念！custom_id の形が正しくございませぬ: {custom_id!r}")
+            if custom_id in seen:
+                raise ValueError(f"無念！custom_id が重なっております: {custom_id}")
+            seen.add(custom_id)
+        batch_id = f"msgbatch_local_{next(self._ids):06d}"
+        self.batches[batch_id] = _Batch(list(requests), time.monotonic())
+        return batch_id
+
+    def _batch(self, batch_id: str) -> _Batch:
+        if batch_id not in self.batches:
+            raise KeyError(f"無念！束 {batch_id} は受け付けておりませぬ")
+        return self.batches[batch_id]
+
+    async def status(self, batch_id: str) -> str:
+        """processing_status（in_progress / ended）"""
+        batch = self._batch(batch_id)
+        return "ended" if time.monotonic() - batch.created_at >= self.latency else "in_progress"
+
+    async def results(self, batch_id: str) -> list[dict]:
+        """処理済みの束の結果（API の結果 JSONL と同じ形の dict の並び）"""
+        if await self.status(batch_id) != "ended":
+            raise RuntimeError(f"無念！束 {batch_id} はまだ処理中でございます")
+        return [self._answer(request) for request in self._batch(batch_id).requests]
+
+    def _answer(self, request: dict) -> dict:
+        custom_id, params = request["custom_id"], request["params"]
+        if self.fail_every and next(self._answered) % self.fail_every == 0:
+            return {"custom_id": custom_id, "result": {
+                "type": "errored",
+                "error": {"type": "error", "error": {"type": "overloaded_error", "message": "Overloaded"}},
+            }}
+        text = self.responder(params)
+        return {"custom_id": custom_id, "result": {"type": "succeeded", "message": {
+            "id": f"msg_local_{custom_id}",
+            "type": "message",
+            "role": "assistant",
+            "model": params.get("model", ""),
+            "content": [{"type": "text", "text": text}],
+            "stop_reason": "end_turn",
+            "usage": {
+                "input_tokens": _estimate_tokens(_system_text(params) + _message_text(params)),
+                "output_tokens": _estimate_tokens(text),
+                "cache_read_input_tokens": 0,
+                "cache_creation_input_tokens": 0,
+            },
+        }}}
+
+
+def main():
+    if len(sys.argv) != 2:
+        print("Usage: python castle_batch.py <requests.jsonl>")
+        sys.exit(2)
+    lines = Path(sys.argv[1]).read_text(encoding="utf-8").splitlines()
+    requests = [json.loads(line) for line in lines if line.strip()]
+
+    async def run() -> list[dict]:
+        server = LocalBatchServer()
+        return await server.results(await server.create(requests))
+
+    for result in asyncio.run(run()):
+        print(json.dumps(result, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+"""
+写し帳 — API の依頼と返事を録り、あとで同じ軍議を API なしで再現する
+
+--dry-run は定型文を書くだけで家臣へのメッセージも組み立てないため、段取りの手間・プロンプトの大きさ・
+出陣の順序は測れない。ここでは本物の呼び出しの依頼（モデル・System Prompt・context・本文・max_tokens・
+temperature）と返事（本文・トークン数・最初の一字までの時間・所要時間）を JSONL の写し帳に録り、
+再生時は同じ依頼に同じ返事を、録った（または指定した分布の）待ち時間を置いて返す。
+
+    - 依頼が一字一句同じなら、その返事を返す
+    - 違えば（テーマを変えた・前段の返事が変わった）、同じ System Prompt の n 回目の依頼には
+      録った n 回目の返事を返す（録った回数より多ければ最初から繰り返す）
+    - 待ち時間は分布の指定で差し替えられる: fixed:<秒> / uniform:<下限>,<上限> /
+      normal:<平均>,<標準偏差> / lognormal:<mu>,<sigma>（いずれも 0 未満は 0 に切り上げ）
+
+war_council.py からは --record / --replay で使う。bench/ の計測もこれで API なしに回る。
+
+Usage:
+    python castle_cassette.py <写し帳.jsonl>    # 家臣（System Prompt）ごとの回数・トークン数・所要時間
+"""
+
+import hashlib
+import json
+import random
+import sys
+import threading
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Optional
+
+# 依頼の同一性を決める項目（AgentOutputCache.make_key と同じ顔ぶれ）
+REQUEST_FIELDS = ("model", "system_prompt", "context", "user_message", "max_tokens", "temperature")
+
+
+def _digest(*parts) -> str:
+    return hashlib.sha256(json.dumps(parts, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def request_key(request: dict) -> str:
+    return _digest(*(request.get(name) for name in REQUEST_FIELDS))
+
+
+def agent_key(request: dict) -> str:
+    """テーマ・前段の返事によらず家臣を見分ける鍵（System Prompt）"""
+    return _digest(request.get("system_prompt", ""))
+
+
+class CassetteMiss(LookupError):
+    """写し帳に当てはまる返事がない"""
+
+
+@dataclass
+class Interaction:
+    """依頼と返事のひと組"""
+    key: str
+    agent: str
+    request: dict
+    response: str
+    usage: dict = field(default_factory=dict)
+    model: str = ""
+    ttft_sec: Optional[float] = None
+    duration_sec: float = 0.0
+
+
+class Cassette:
+    """
+    写し帳（1行1組の JSONL）。録音はスレッドをまたいでも行単位で追記する。
+    再生側は cursor（agent 鍵 → 何回目か）を呼び出し元ごとに持ち、同じ写し帳を多くの軍議で共有できる。
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.interactions: list[Interaction] = []
+        self.by_key: dict[str, Interaction] = {}
+        self.by_agent: dict[str, list[Interaction]] = {}
+        self._lock = threading.Lock()
+        if path.exists():
+            with path.open(encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        self._index(Interaction(**json.loads(line)))
+
+    def _index(self, interaction: Interaction):
+        self.interactions.append(interaction)
+        self.by_key.setdefault(interaction.key, interaction)
+        self.by_agent.setdefault(interaction.agent, []).append(interaction)
+
+    def record(
+        self,
+        request: dict,
+        response: str,
+        usage: dict,
+        model: str = "",
+        ttft_sec: Optional[float] = None,
+        duration_sec: float = 0.0,
+    ) -> Interaction:
+        request = {name: request.get(name) for name in REQUEST_FIELDS}
+        interaction = Interaction(
+            request_key(request), agent_key(request), request, response, dict(usage), model, ttft_sec, duration_sec,
+        )
+        with self._lock:
+            self._index(interaction)
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with self.path.open("a", encoding="utf-8") as f:
+                f.write(json.dumps(asdict(interaction), ensure_ascii=False) + "\n")
+        return interaction
+
+    def find(self, request: dict, cursor: dict[str, int]) -> Interaction:
+        """依頼に当てはまる返事（一字一句同じ依頼 → 同じ家臣の n 回目の順に探す）"""
+        exact = self.by_key.get(request_key(request))
+        agent = agent_key(request)
+        with self._lock:
+            index = cursor.get(agent, 0)
+            cursor[agent] = index + 1
+        if exact is not None:
+            return exact
+        recorded = self.by_agent.get(agent)
+        if not recorded:
+            raise CassetteMiss(
+                f"無念！写し帳 {self.path} にこの家臣の返事は録られておりませぬ"
+                "（System Prompt が変わったなら録り直してくだされ）"
+            )
+        return recorded[index % len(recorded)]
+
+
+@dataclass
+class Distribution:
+    """待ち時間の分布（秒）"""
+    kind: str
+    params: tuple[float, ...]
+
+    KINDS = {"fixed": 1, "uniform": 2, "normal": 2, "lognormal": 2}
+
+    @classmethod
+    def parse(cls, spec: str) -> "Distribution":
+        kind, _, args = spec.partition(":")
+        if kind not in cls.KINDS:
+            raise ValueError(f"分布は {' / '.join(cls.KINDS)} のいずれかで指定してくだされ: {spec}")
+        try:
+            params = tuple(float(arg) for arg in args.split(",")) if args else ()
+        except ValueError:
+            raise ValueError(f"分布の値が数ではございませぬ: {spec}")
+        if len(params) != cls.KINDS[kind]:
+            raise ValueError(f"{kind} には値が {cls.KINDS[kind]} つ要りまする: {spec}")
+        return cls(kind, params)
+
+    def sample(self, rng: random.Random) -> float:
+        if self.kind == "fixed":
+            value = self.params[0]
+        elif self.kind == "uniform":
+            value = rng.uniform(*self.params)
+        elif self.kind == "normal":
+            value = rng.gauss(*self.params)
+        else:
+            value = rng.lognormvariate(*self.params)
+        return max(0.0, value)
+
+
+@dataclass
+class ReplayTiming:
+    """
+    再生時の待ち時間。ttft・tokens_per_sec を指定しなければ録った値を使い、
+    全体を scale 倍する（0 なら待たない）。seed を揃えれば同じ待ち時間の並びになる。
+    """
+    ttft: Optional[Distribution] = None
+    tokens_per_sec: Optional[Distribution] = None
+    scale: float = 1.0
+    seed: Optional[int] = None
+
+    def __post_init__(self):
+        self._rng = random.Random(self.seed)
+        self._lock = threading.Lock()
+
+    def delays(self, interaction: Interaction) -> tuple[float, float]:
+        """(最初の一字までの秒数, 所要秒数)"""
+        with self._lock:
+            ttft = self.ttft.sample(self._rng) if self.ttft else (interaction.ttft_sec or 0.0)
+            rate = self.tokens_per_sec.sample(self._rng) if self.tokens_per_sec else None
+        if rate:
+            duration = ttft + interaction.usage.get("output_tokens", 0) / rate
+        else:
+            duration = max(ttft, interaction.duration_sec)
+        return ttft * self.scale, duration * self.scale
+
+
+def summarize(cassette: Cassette) -> str:
+    """System Prompt の冒頭で家臣を見分け、回数・トークン数・所要時間を表にする"""
+    rows = ["| 家臣（System Prompt 冒頭） | 回数 | 入力 | 出力 | 所要（平均） |", "|---|---:|---:|---:|---:|"]
+    for recorded in cassette.by_agent.values():
+        head = " ".join((recorded[0].request.get("system_prompt") or "").split())[:24]
+        rows.append(
+            f"| {head} | {len(recorded)} | {sum(i.usage.get('input_tokens', 0) for i in recorded):,} | "
+            f"{sum(i.usage.get('output_tokens', 0) for i in recorded):,} | "
+            f"{sum(i.duration_sec for i in recorded) / len(recorded):.1f}s |"
+        )
+    return "\n".join(rows)
+
+
+def main():
+    if len(sys.argv) != 2:
+        print("Usage: python castle_cassette.py <写し帳.jsonl>")
+        sys.exit(2)
+    path = Path(sys.argv[1])
+    if not path.exists():
+        print(f"無念！写し帳が見つかりませぬ: {path}", file=sys.stderr)
+        sys.exit(1)
+    print(summarize(Cassette(path)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+"""
+勘定方（Kanjyo）の算盤 — Markdown を解する文字数カウンター
+
+LLM に数えさせると一字単位では合わないため、勘定方の集計はここで機械的に行う。
+原稿を1行ずつ流し読みし（全文をメモリに展開しない）、以下を一度に数える:
+
+    - Frontmatter と Markdown 記法を除いた本文の文字数（空白・改行を除く）
+    - リード文 / 各H2セクション（配下のH3以下を含む）ごとの文字数と配分比率
+    - 目標文字数（既定 3,000〜8,000字）に対する過不足
+
+Usage:
+    python castle_counter.py castle_floors/runs/<run_id>/04_writing_room/draft_v2.md
+"""
+
+import re
+import sys
+import unicodedata
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterable, Optional
+
+# 推奨文字数（空白除く）
+DEFAULT_TARGET_MIN = 3000
+DEFAULT_TARGET_MAX = 8000
+
+# H2セクション平均に対して、この倍率を超える/下回るセクションを警告する
+LONG_SECTION_RATIO = 2.0
+SHORT_SECTION_RATIO = 0.5
+
+# まとめ / CTA とみなす見出し
+CLOSING_HEADING = re.compile(r"まとめ|おわりに|最後に|結論|CTA", re.IGNORECASE)
+
+_FENCE = re.compile(r"^\s{0,3}(`{3,}|~{3,})")
+_HEADING = re.compile(r"^\s{0,3}(#{1,6})\s+(.*?)\s*#*\s*$")
+_HR = re.compile(r"^\s{0,3}([-*_])(\s*\1){2,}\s*$")
+_TABLE_SEPARATOR = re.compile(r"^\s*\|?\s*:?-{3,}:?\s*(\|\s*:?-{3,}:?\s*)*\|?\s*$")
+_BLOCK_PREFIX = re.compile(r"^\s*(>\s*)+|^\s*([-*+]|\d+[.)])\s+(\[[ xX]\]\s+)?")
+_IMAGE = re.compile(r"!\[[^\]]*\]\([^)]*\)")
+_LINK = re.compile(r"\[([^\]]*)\]\([^)]*\)")
+_REF_LINK = re.compile(r"\[([^\]]+)\]\[[^\]]*\]")
+_LINK_DEFINITION = re.compile(r"^\s{0,3}\[[^\]]+\]:\s+\S+")
+_AUTOLINK = re.compile(r"<(https?://[^>]+)>")
+_HTML_TAG = re.compile(r"</?[A-Za-z][^>]*>")
+_INLINE_CODE = re.compile(r"`+([^`]*)`+")
+_EMPHASIS = re.compile(r"(\*{1,3}|_{1,3}|~~)(?=\S)(.+?)(?<=\S)\1")
+_FOOTNOTE_REF = re.compile(r"\[\^[^\]]+\]")
+
+
+@dataclass
+class SectionCount:
+    """セクション1つ分の集計"""
+    title: str
+    chars: int = 0
+    kind: str = "h2"  # "lead" / "h2"
+
+    @property
+    def is_closing(self) -> bool:
+        return self.kind == "h2" and bool(CLOSING_HEADING.search(self.title))
+
+
+@dataclass
+class CountReport:
+    """原稿1本分の集計結果"""
+    title: str = ""
+    sections: list[SectionCount] = field(default_factory=list)
+    code_chars: int = 0
+    target_min: int = DEFAULT_TARGET_MIN
+    target_max: int = DEFAULT_TARGET_MAX
+
+    @property
+    def total(self) -> int:
+        """本文の総文字数（空白除く、見出しH1・コードブロックを除く）"""
+        return sum(section.chars for section in self.sections)
+
+    def ratio(self, section: SectionCount) -> float:
+        return section.chars / self.total * 100 if self.total else 0.0
+
+    @property
+    def verdict(self) -> str:
+        if self.total < self.target_min:
+            return "short"
+        if self.total > self.target_max:
+            return "long"
+        return "ok"
+
+    def imbalanced(self) -> list[tuple[SectionCount, str]]:
+        """H2セクション平均から極端に外れたセクション"""
+        body = [s for s in self.sections if s.kind == "h2"]
+        if len(body) < 2:
+            return []
+        mean = sum(s.chars for s in body) / len(body)
+        warnings = []
+        for section in body:
+            if section.chars > mean * LONG_SECTION_RATIO:
+                warnings.append((section, "long"))
+            elif section.chars < mean * SHORT_SECTION_RATIO:
+                warnings.append((section, "short"))
+        return warnings
+
+
+def strip_inline_markdown(line: str) -> str:
+    """1行分のインライン記法を取り除き、読者に見える文字だけを残す"""
+    line = _IMAGE.sub("", line)
+    line = _LINK.sub(r"\1", line)
+    line = _REF_LINK.sub(r"\1", line)
+    line = _AUTOLINK.sub(r"\1", line)
+    line = _FOOTNOTE_REF.sub("", line)
+    line = _HTML_TAG.sub("", line)
+    line = _INLINE_CODE.sub(r"\1", line)
+    previous = None
+    while previous != line:  # 入れ子の強調（***太字斜体*** など）に対応
+        previous = line
+        line = _EMPHASIS.sub(r"\2", line)
+    return line
+
+
+def visible_chars(text: str) -> int:
+    """空白（全角空白・改行を含む）を除いた文字数。結合文字は NFC に正規化してから数える"""
+    return sum(1 for ch in unicodedata.normalize("NFC", text) if not ch.isspace())
+
+
+def count_markdown(
+    lines: Iterable[str],
+    target_min: int = DEFAULT_TARGET_MIN,
+    target_max: int = DEFAULT_TARGET_MAX,
+) -> CountReport:
+    """
+    Markdown 原稿を1行ずつ読みながら文字数を集計する。
+
+    Args:
+        lines: 原稿の行（ファイルオブジェクトをそのまま渡せる）
+        target_min / target_max: 目標文字数の範囲（空白除く）
+    """
+    report = CountReport(target_min=target_min, target_max=target_max)
+    current = SectionCount(title="リード文", kind="lead")
+    report.sections.append(current)
+
+    fence: Optional[str] = None
+    in_comment = False
+    for index, raw in enumerate(lines):
+        line = raw.rstrip("\r\n")
+
+        # Frontmatter（先頭の --- 〜 ---）は対象外
+        if index == 0 and line.strip() == "---":
+            fence = "---frontmatter"
+            continue
+        if fence == "---frontmatter":
+            if line.strip() in ("---", "..."):
+                fence = None
+            continue
+
+        # コードブロックは本文とは別勘定
+        match = _FENCE.match(line)
+        if fence is not None:
+            if match and match.group(1)[0] == fence[0] and len(match.group(1)) >= len(fence):
+                fence = None
+            else:
+                report.code_chars += visible_chars(line)
+            continue
+        if match:
+            fence = match.group(1)
+            continue
+
+        # HTML コメント（複数行を含む）
+        if in_comment:
+            if "-->" in line:
+                in_comment = False
+                line = line.split("-->", 1)[1]
+            else:
+                continue
+        line = re.sub(r"<!--.*?-->", "", line)
+        if "<!--" in line:
+            line, in_comment = line.split("<!--", 1)[0], True
+
+        heading = _HEADING.match(line)
+        if heading:
+            level, text = len(heading.group(1)), strip_inline_markdown(heading.group(2))
+            if level == 1:
+                report.title = report.title or text
+                continue
+            if level == 2:
+                current = SectionCount(title=text)
+                report.sections.append(current)
+            current.chars += visible_chars(text)
+            continue
+
+        if _HR.match(line) or _TABLE_SEPARATOR.match(line) or _LINK_DEFINITION.match(line):
+            continue
+
+        line = _BLOCK_PREFIX.sub("", line)
+        line = line.replace("|", " ") if line.lstrip().startswith("|") else line
+        current.chars += visible_chars(strip_inline_markdown(line))
+
+    # 見出しより前に本文がなければリード文は載せない
+    if report.sections[0].chars == 0 and len(report.sections) > 1:
+        report.sections.pop(0)
+    return report
+
+
+def count_file(path: Path, **kwargs) -> CountReport:
+    with path.open(encoding="utf-8") as f:
+        return count_markdown(f, **kwargs)
+
+
+def render_report(report: CountReport, source_name: str = "draft_v2.md") -> str:
+    """勘定方の帳簿（count_report.md）を書き上げる"""
+    lines = [
+        "# 勘定方 文字数帳簿",
+        "",
+        f"- 対象: `{source_name}`" + (f"（{report.title}）" if report.title else ""),
+        "- 計測: 勘定方の算盤（Frontmatter・Markdown記法・見出しH1・コードブロックを除き、空白を除いて計数）",
+        "",
+        "## 1. 総文字数（空白除く）",
+        "",
+        f"**{report.total:,}字**",
+    ]
+    if report.code_chars:
+        lines.append(f"（別勘定: コードブロック {report.code_chars:,}字）")
+
+    lines += [
+        "",
+        "## 2. セクション別文字数",
+        "",
+        "| セクション | 文字数 | 配分 |",
+        "|---|---:|---:|",
+    ]
+    for section in report.sections:
+        label = section.title + ("（まとめ/CTA）" if section.is_closing else "")
+        label = label.replace("|", "\\|")
+        lines.append(f"| {label} | {section.chars:,} | {report.ratio(section):.1f}% |")
+
+    lines += ["", "## 3. バランス分析", ""]
+    warnings = report.imbalanced()
+    if not warnings:
+        lines.append("- 極端に長い・短いセクションはございませぬ。")
+    for section, kind in warnings:
+        if kind == "long":
+            lines.append(f"- ⚠️ 「{section.title}」が長すぎます（{section.chars:,}字 / 配分 {report.ratio(section):.1f}%）。削減候補ですぞ。")
+        else:
+            lines.append(f"- ⚠️ 「{section.title}」が短すぎます（{section.chars:,}字 / 配分 {report.ratio(section):.1f}%）。加筆が必要ですぞ。")
+    if not any(s.is_closing for s in report.sections):
+        lines.append("- ⚠️ まとめ / CTA のセクションが見当たりませぬ。")
+
+    lines += [
+        "",
+        "## 4. 文字数判定",
+        "",
+        f"- 目標: {report.target_min:,}〜{report.target_max:,}字",
+    ]
+    if report.verdict == "short":
+        lines.append(f"- 判定: **不足**（あと {report.target_min - report.total:,}字）")
+        lines += ["", "「計算が合いません！これでは帳尻が合いませんぞ。加筆をお願いいたします。」"]
+    elif report.verdict == "long":
+        lines.append(f"- 判定: **超過**（{report.total - report.target_max:,}字 多い）")
+        lines += ["", "「一字たりとも無駄は許しませんぞ！冗長な箇所を削っていただきます。」"]
+    else:
+        lines.append("- 判定: **適正範囲内**")
+        lines += ["", "「ふむ…一文の得にもなりませんが、文字数は適正範囲内ですな。次へ回しましょう。」"]
+    return "\n".join(lines) + "\n"
+
+
+def main():
+    if len(sys.argv) != 2:
+        print("Usage: python castle_counter.py <Markdownファイル>")
+        sys.exit(2)
+    path = Path(sys.argv[1])
+    print(render_report(count_file(path), path.name), end="")
+
+
+if __name__ == "__main__":
+    main()
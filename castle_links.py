@@ -0,0 +1,421 @@
+"""
+公文書係（Kobunsho）の台帳 — fact_sheet.md の出典による手元のリンク付与
+
+公文書係の仕事の大半は「ファクトシートにある主張が本文のどこに出てくるか」を探して
+URL を貼るだけで、記事全文を LLM に書き直させるまでもない。ここでは
+
+    1. fact_sheet.md から出典（タイトル / URL / 信頼度）と、主張 → URL の台帳を作る
+       （「」で括られた引用候補・出典タイトル・数値データを主張の目印とする）
+    2. 台帳の主張を Aho–Corasick で一度に探し、本文の該当箇所を出典 URL のリンクにする
+    3. リンクの付かなかった数値・調査結果の文だけを未解決の主張として拾い出す
+
+ところまでを行う。未解決の主張は番号付きの短い一覧にして LLM に出典を選ばせ、
+返答（番号 → URL）を apply_resolutions で本文に反映する。
+
+Usage:
+    python castle_links.py <draft_v2.md> <fact_sheet.md>
+"""
+
+import re
+import sys
+from collections import deque
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterable, Iterator, Optional
+from urllib.parse import urlparse
+
+# LLM に回す未解決の主張の上限（これを超える分は公文書係の手作業に回さない）
+MAX_UNRESOLVED = 20
+
+# 未解決の主張として1文を切り詰める長さ
+MAX_CLAIM_CHARS = 160
+
+SOURCES_SECTION_TITLE = "## 【出典・参考】"
+
+# 未解決の主張だけを出典一覧と突き合わせる小さな依頼の System Prompt
+RESOLVE_SYSTEM_PROMPT = (
+    "あなたは公文書係です。正確さと整合性のみを追求する事務処理の達人です。\n"
+    "与えられた主張と出典一覧を突き合わせ、指定の形式でのみ返答してください。"
+)
+
+_URL = re.compile(r"https?://[^\s)>\]|」』、。]+")
+_MD_LINK = re.compile(r"\[([^\]]+)\]\((https?://[^)\s]+)\)")
+_STARS = re.compile(r"[★☆]{3}")
+_QUOTED = re.compile(r"[「『]([^」』]{4,60})[」』]")
+_NUMERIC_FACT = re.compile(r"\d[\d,.]*\s*(?:%|％|ポイント|万人|億人|万件|万円|億円|兆円|億ドル|倍)")
+_FACT_SENTENCE = re.compile(
+    r"\d[\d,.]*\s*(?:%|％|ポイント|割|倍|万|億|兆|人|件|社|円|ドル)|によると|によれば|調査|統計|白書|発表|報告"
+)
+_PROTECTED = re.compile(r"!?\[[^\]]*\]\([^)]*\)|`[^`]*`|<[^>]+>|https?://\S+")
+_VAGUE_ANCHOR = re.compile(r"\[(こちら|ここ|このページ|このリンク|リンク)\]\((https?://[^)\s]+)\)")
+_FENCE = re.compile(r"^\s{0,3}(`{3,}|~{3,})")
+_HEADING = re.compile(r"^\s{0,3}#{1,6}\s")
+_TABLE_SEPARATOR = re.compile(r"^\s*\|?\s*:?-{3,}")
+_LIST_ITEM = re.compile(r"^([-*+]|\d+[.)])\s+")
+_FIELD_LABEL = re.compile(r"^\s*(?:[-*+]|\d+[.)])\s+(?:\*\*)?([^:：*\s][^:：*]{0,11}?)(?:\*\*)?\s*[:：]")
+_TITLE_LABEL = re.compile(r"^(?:[-*+]|\d+[.)])?\s*(?:\*\*)?(?:出典|タイトル|title|URL|参考)?\s*[:：]?\s*", re.IGNORECASE)
+_SENTENCE_END = re.compile(r"(?<=[。！？!?])")
+
+
+@dataclass
+class Source:
+    """出典1件"""
+    title: str
+    url: str
+    stars: str = ""
+
+    def render(self) -> str:
+        return f"- [{self.title}]({self.url})" + (f" {self.stars}" if self.stars else "")
+
+
+@dataclass
+class Claim:
+    """出典の付かなかった主張（本文の1文）"""
+    number: int
+    sentence: str
+
+    @property
+    def excerpt(self) -> str:
+        text = self.sentence.strip()
+        return text if len(text) <= MAX_CLAIM_CHARS else text[:MAX_CLAIM_CHARS] + "…"
+
+
+@dataclass
+class SourceIndex:
+    """fact_sheet.md から作った出典台帳（主張の目印 → URL）"""
+    sources: list[Source] = field(default_factory=list)
+    claims: dict[str, str] = field(default_factory=dict)
+
+    def source_for(self, url: str) -> Optional[Source]:
+        return next((s for s in self.sources if s.url == url), None)
+
+
+@dataclass
+class LinkResult:
+    """手元でのリンク付与の結果"""
+    text: str
+    linked: list[tuple[str, str]] = field(default_factory=list)  # (本文の該当箇所, URL)
+    unresolved: list[Claim] = field(default_factory=list)
+
+
+class AhoCorasick:
+    """複数の目印を本文の一回の走査で探すための Aho–Corasick オートマトン"""
+
+    def __init__(self, patterns: Iterable[str]):
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail: list[int] = [0]
+        self._out: list[list[str]] = [[]]
+        for pattern in patterns:
+            if pattern:
+                self._add(pattern)
+        self._build()
+
+    def _add(self, pattern: str):
+        state = 0
+        for ch in pattern:
+            if ch not in self._goto[state]:
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+                self._goto[state][ch] = len(self._goto) - 1
+            state = self._goto[state][ch]
+        self._out[state].append(pattern)
+
+    def _build(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fail = self._fail[state]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto[fail].get(ch, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def find_all(self, text: str) -> Iterator[tuple[int, int, str]]:
+        """(開始位置, 終了位置, 目印) をすべて返す（重なりを含む）"""
+        state = 0
+        for i, ch in enumerate(text):
+            while state and ch not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(ch, 0)
+            for pattern in self._out[state]:
+                yield i + 1 - len(pattern), i + 1, pattern
+
+
+def _source_title(line: str, url: str) -> str:
+    """出典の行からタイトルを読み取る（Markdown リンク → 表の列 → URL の前の文の順、読めなければ空）"""
+    for text, link_url in _MD_LINK.findall(line):
+        if link_url == url:
+            return text.strip()
+    if line.lstrip().startswith("|"):
+        cells = [c.strip() for c in line.strip().strip("|").split("|")]
+        for cell in cells:
+            if cell and not _URL.search(cell) and not _STARS.fullmatch(cell) and not re.fullmatch(r"[\d/.\-年月日 ]+", cell):
+                return cell.strip("*")
+    before = line.split(url, 1)[0]
+    before = re.sub(r"(?:URL|url)\s*[:：]?\s*$", "", before)
+    title = _TITLE_LABEL.sub("", before).strip(" \t/|:：-（(")
+    return title.strip("*").strip()
+
+
+def _field_label(line: str) -> str:
+    """箇条書きの頭の項目名（「- タイトル: …」の「タイトル」）。項目名がなければ空"""
+    match = _FIELD_LABEL.match(line)
+    return match.group(1).strip().lower() if match else ""
+
+
+def _starts_new_source(line: str, block: list[str]) -> bool:
+    """
+    箇条書きの1項目が、前の出典の続きではなく次の出典の始まりか。
+    URL を2つ目に持つ・項目名が繰り返される・入れ子から浅い段へ戻る、のいずれかなら次の出典とみなす。
+    """
+    if block[0].lstrip().startswith("|"):
+        return True
+    if _URL.search(line) and any(_URL.search(prev) for prev in block):
+        return True
+    label = _field_label(line)
+    if label and label in {_field_label(prev) for prev in block}:
+        return True
+    indents = [len(prev) - len(prev.lstrip()) for prev in block if _LIST_ITEM.match(prev.lstrip())]
+    return bool(indents) and len(line) - len(line.lstrip()) < indents[-1]
+
+
+def _blocks(lines: Iterable[str]) -> Iterator[list[str]]:
+    """
+    ファクトシートを出典単位のまとまりに分ける。空行・見出し・表の行で区切り、続けて並んだ箇条書きは
+    1件の出典として束ねる。「タイトル / URL / 閲覧日 / 信頼度」を1項目ずつ書いた次の形も1件になる。
+
+        - タイトル: 令和5年版 情報通信白書（総務省）
+        - URL: https://www.soumu.go.jp/...
+        - 閲覧日: 2024-05-01
+        - 信頼度: ★★★
+        - 引用候補: 「生成AIを利用したことがある」は 51.7%
+    """
+    block: list[str] = []
+    for raw in lines:
+        line = raw.rstrip("\r\n")
+        if not line.strip() or _HEADING.match(line) or _TABLE_SEPARATOR.match(line):
+            if block:
+                yield block
+            block = []
+            continue
+        if line.lstrip().startswith("|") or (
+            _LIST_ITEM.match(line.lstrip()) and block and _starts_new_source(line, block)
+        ):
+            if block:
+                yield block
+            block = [line]
+            continue
+        block.append(line)
+    if block:
+        yield block
+
+
+def _block_title(block: list[str]) -> str:
+    """URL の行にタイトルがないとき、同じまとまりの「タイトル」「出典」の項目か、最初の見出しらしい項目を使う"""
+    for line in block:
+        if _field_label(line) in ("タイトル", "出典", "title", "出典名", "資料名"):
+            return line[_FIELD_LABEL.match(line).end():].strip(" *")
+    for line in block:
+        stripped = line.strip()
+        if _LIST_ITEM.match(stripped) and not _field_label(line) and not _URL.search(line) and not _STARS.search(line):
+            return _LIST_ITEM.sub("", stripped).strip("*").strip()
+    return ""
+
+
+def parse_fact_sheet(lines: Iterable[str]) -> SourceIndex:
+    """
+    fact_sheet.md から出典台帳を作る。
+
+    URL が1つだけのまとまりに出てくる引用候補（「」内）・出典タイトル・数値データを、
+    その URL の主張の目印とする。複数の URL に紐づいてしまう目印は曖昧なので捨てる。
+    """
+    index = SourceIndex()
+    seen_urls: dict[str, Source] = {}
+    ambiguous: set[str] = set()
+
+    for block in _blocks(lines):
+        urls: list[str] = []
+        for line in block:
+            for url in _URL.findall(line):
+                url = url.rstrip(".,")
+                if url not in urls:
+                    urls.append(url)
+                if url not in seen_urls:
+                    stars = _STARS.search(line) or next(
+                        (m for m in map(_STARS.search, block) if m), None
+                    )
+                    title = _source_title(line, url) or _block_title(block)
+                    source = Source(title or urlparse(url).netloc or url, url, stars.group(0) if stars else "")
+                    if title and len(title) >= 4:
+                        index.claims.setdefault(title, url)
+                    seen_urls[url] = source
+                    index.sources.append(source)
+        if len(urls) != 1:
+            continue
+
+        url = urls[0]
+        text = "\n".join(block)
+        marks = set(_QUOTED.findall(text)) | {m.group(0).replace(" ", "") for m in _NUMERIC_FACT.finditer(text)}
+        for mark in marks:
+            if mark in index.claims and index.claims[mark] != url:
+                ambiguous.add(mark)
+            index.claims[mark] = url
+
+    for mark in ambiguous:
+        del index.claims[mark]
+    return index
+
+
+def _link_line(line: str, matcher: AhoCorasick, index: SourceIndex,
+               linked_urls: set[str], linked: list[tuple[str, str]]) -> str:
+    """1行の中で目印に一致した箇所をリンクにする（既存のリンク・コード・URL の中は触らない）"""
+    protected = [m.span() for m in _PROTECTED.finditer(line)]
+    candidates = sorted(matcher.find_all(line), key=lambda m: (m[0], -(m[1] - m[0])))
+    chosen: list[tuple[int, int, str]] = []
+    cursor = 0
+    for start, end, mark in candidates:
+        url = index.claims[mark]
+        if start < cursor or url in linked_urls:
+            continue
+        if any(start < p_end and p_start < end for p_start, p_end in protected):
+            continue
+        chosen.append((start, end, url))
+        linked_urls.add(url)
+        linked.append((line[start:end], url))
+        cursor = end
+
+    for start, end, url in reversed(chosen):
+        line = f"{line[:start]}[{line[start:end]}]({url}){line[end:]}"
+    return line
+
+
+def _clarify_anchors(line: str, index: SourceIndex) -> str:
+    """「こちら」「ここ」等の曖昧なアンカーテキストを出典タイトルに改める"""
+    def replace(match: re.Match) -> str:
+        source = index.source_for(match.group(2))
+        return f"[{source.title}]({source.url})" if source and source.title != source.url else match.group(0)
+    return _VAGUE_ANCHOR.sub(replace, line)
+
+
+def ensure_sources_section(text: str, index: SourceIndex) -> str:
+    """記事末尾の【出典・参考】セクションを作る（既にあれば、載っていない出典だけ書き足す）"""
+    if not index.sources:
+        return text
+    body = text.rstrip("\n")
+    if "【出典" in body:
+        missing = [s for s in index.sources if s.url not in body.split("【出典", 1)[1]]
+        return body + ("\n" + "\n".join(s.render() for s in missing) if missing else "") + "\n"
+    return body + "\n\n" + SOURCES_SECTION_TITLE + "\n\n" + "\n".join(s.render() for s in index.sources) + "\n"
+
+
+def link_draft(lines: Iterable[str], index: SourceIndex) -> LinkResult:
+    """
+    原稿を1行ずつ読み、台帳の主張に一致する箇所へ出典リンクを付ける。
+    各出典は最初に出てきた1箇所にだけ貼る。リンクの付かなかった数値・調査結果の文は未解決の主張とする。
+    """
+    matcher = AhoCorasick(index.claims)
+    result = LinkResult(text="")
+    linked_urls: set[str] = set()
+    out: list[str] = []
+    fence: Optional[str] = None
+    in_frontmatter = in_sources = False
+    seen_sentences: set[str] = set()
+
+    for line_no, raw in enumerate(lines):
+        line = raw.rstrip("\r\n")
+        if line_no == 0 and line.strip() == "---":
+            in_frontmatter = True
+            out.append(line)
+            continue
+        if in_frontmatter:
+            in_frontmatter = line.strip() not in ("---", "...")
+            out.append(line)
+            continue
+
+        match = _FENCE.match(line)
+        if fence is not None or match:
+            if fence is None:
+                fence = match.group(1)
+            elif match and match.group(1)[0] == fence[0] and len(match.group(1)) >= len(fence):
+                fence = None
+            out.append(line)
+            continue
+
+        if _HEADING.match(line):
+            in_sources = "出典" in line or "参考" in line
+            out.append(line)
+            continue
+        if in_sources or "【出典" in line:
+            out.append(line)
+            continue
+
+        line = _clarify_anchors(line, index)
+        if index.claims:
+            line = _link_line(line, matcher, index, linked_urls, result.linked)
+        out.append(line)
+
+        for sentence in _SENTENCE_END.split(line):
+            sentence = sentence.strip()
+            if (not sentence or "](" in sentence or sentence in seen_sentences
+                    or not _FACT_SENTENCE.search(_PROTECTED.sub("", sentence))):
+                continue
+            seen_sentences.add(sentence)
+            if len(result.unresolved) < MAX_UNRESOLVED:
+                result.unresolved.append(Claim(len(result.unresolved) + 1, sentence))
+
+    result.text = ensure_sources_section("\n".join(out) + "\n", index)
+    return result
+
+
+def build_resolve_request(claims: list[Claim], index: SourceIndex) -> str:
+    """未解決の主張ごとに出典を選ばせる、小さな依頼文を作る"""
+    source_lines = [f"- {s.title} | {s.url}" + (f" | {s.stars}" if s.stars else "") for s in index.sources]
+    claim_lines = [f"{c.number}. {c.excerpt}" for c in claims]
+    return (
+        "以下の主張それぞれについて、出典一覧から根拠となる URL を1つ選んでください。\n"
+        "該当する出典がない場合は「なし」としてください。一覧にない URL は使用禁止です。\n"
+        "返答は1行に1件、「番号: URL」または「番号: なし」の形式のみで出力してください。\n\n"
+        "## 主張\n\n" + "\n".join(claim_lines) + "\n\n"
+        "## 出典一覧\n\n" + "\n".join(source_lines) + "\n"
+    )
+
+
+def apply_resolutions(text: str, claims: list[Claim], response: str, index: SourceIndex) -> tuple[str, int]:
+    """
+    LLM の返答（番号 → URL）を本文に反映し、該当文の末尾に出典リンクを添える。
+    台帳にない URL は採らない。
+
+    Returns: (反映後の本文, 反映した件数)
+    """
+    by_number = {c.number: c for c in claims}
+    applied = 0
+    for match in re.finditer(r"^\s*(\d+)\s*[.:：]\s*(https?://\S+)", response, re.MULTILINE):
+        claim = by_number.get(int(match.group(1)))
+        source = index.source_for(match.group(2).rstrip(".,)）"))
+        if claim is None or source is None or claim.sentence not in text:
+            continue
+        sentence = claim.sentence
+        body, end = (sentence[:-1], sentence[-1]) if sentence[-1] in "。！？!?" else (sentence, "")
+        cited = f"{body}（出典: [{source.title}]({source.url})）{end}"
+        text = text.replace(sentence, cited, 1)
+        applied += 1
+    return text, applied
+
+
+def main():
+    if len(sys.argv) != 3:
+        print("Usage: python castle_links.py <draft_v2.md> <fact_sheet.md>")
+        sys.exit(2)
+    with Path(sys.argv[2]).open(encoding="utf-8") as f:
+        index = parse_fact_sheet(f)
+    with Path(sys.argv[1]).open(encoding="utf-8") as f:
+        result = link_draft(f, index)
+    print(result.text, end="")
+    print(f"\n<!-- 紐付け {len(result.linked)} 件 / 未解決 {len(result.unresolved)} 件 -->")
+
+
+if __name__ == "__main__":
+    main()
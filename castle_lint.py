@@ -0,0 +1,261 @@
+"""
+城代（Joudai）の下検分 — Markdown 形式の機械チェッカー
+
+見出しの欠落や階層飛び、画像プレースホルダーの取り残し、空リンク、コードブロックの
+閉じ忘れといった形式不備は、LLM に読ませるまでもなく機械的に判定できる。
+ここで draft_v4_visuals.md を1行ずつ一度だけ検分し、
+
+    - 直せるもの（階層飛び・空リンク・閉じ忘れ・プレースホルダー・余分な空行）はその場で直す
+    - 直せないものは不備一覧（Defect）として残し、城代（LLM）にはその残件だけを渡す
+
+重大な残件（severity="error"）がなければ、城代は API を呼ばずに検分を終えられる。
+
+Usage:
+    python castle_lint.py castle_floors/runs/<run_id>/04_writing_room/draft_v4_visuals.md
+"""
+
+import json
+import re
+import sys
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Iterable, Optional
+
+# 絵師が残していくプレースホルダー（「[ここに画像を挿入: 説明]」の形も含む）
+PLACEHOLDER = re.compile(r"\[ここに画像を挿入[^\]]*\]")
+
+# 出典セクションとまとめ / CTA とみなす見出し
+SOURCES_HEADING = re.compile(r"出典|参考")
+CLOSING_HEADING = re.compile(r"まとめ|おわりに|最後に|結論|CTA", re.IGNORECASE)
+
+# Frontmatter に求める項目
+FRONTMATTER_KEYS = ("title", "date", "tags")
+
+_FENCE = re.compile(r"^\s{0,3}(`{3,}|~{3,})")
+_HEADING = re.compile(r"^(\s{0,3})(#{1,6})(\s+.*)$")
+_EMPTY_URL_LINK = re.compile(r"(?<!!)\[([^\]]+)\]\(\s*\)")
+_EMPTY_TEXT_LINK = re.compile(r"(?<!!)\[\s*\]\(([^)\s]+)\)")
+_IMAGE_NO_ALT = re.compile(r"!\[\s*\]\([^)]*\)")
+_UNCLOSED_LINK = re.compile(r"\]\([^)]*$")
+_FRONTMATTER_KEY = re.compile(r"^([A-Za-z_][\w-]*)\s*:")
+
+
+@dataclass
+class Defect:
+    """形式不備1件"""
+    rule: str
+    line: int  # 1始まり（原稿全体に関わる不備は 0）
+    message: str
+    severity: str = "error"  # "error" / "warning"
+    fixed: bool = False
+
+    def render(self) -> str:
+        where = f"L{self.line}" if self.line else "全体"
+        status = "（自動修正済み）" if self.fixed else ""
+        return f"- {where} [{self.rule}] {self.message}{status}"
+
+
+@dataclass
+class LintResult:
+    """下検分の結果（text は自動修正後の原稿）"""
+    text: str
+    defects: list[Defect] = field(default_factory=list)
+
+    @property
+    def residual(self) -> list[Defect]:
+        """直せずに残った不備"""
+        return [d for d in self.defects if not d.fixed]
+
+    @property
+    def passed(self) -> bool:
+        """重大な残件がなければ合格（軽微な残件は条件付き合格として通す）"""
+        return not any(d.severity == "error" for d in self.residual)
+
+    def to_json(self, source_name: str = "draft_v4_visuals.md") -> str:
+        return json.dumps(
+            {
+                "source": source_name,
+                "passed": self.passed,
+                "fixed": sum(1 for d in self.defects if d.fixed),
+                "residual": len(self.residual),
+                "defects": [asdict(d) for d in self.defects],
+            },
+            ensure_ascii=False,
+            indent=2,
+        ) + "\n"
+
+
+def lint_markdown(lines: Iterable[str]) -> LintResult:
+    """
+    Markdown 原稿を1行ずつ検分し、直せる不備を直した原稿と不備一覧を返す。
+
+    Args:
+        lines: 原稿の行（ファイルオブジェクトをそのまま渡せる）
+    """
+    defects: list[Defect] = []
+    out: list[str] = []
+
+    frontmatter: Optional[dict[str, str]] = None  # 項目名 -> 値
+    frontmatter_end = 0  # out 上で Frontmatter の直後に当たる位置
+    in_frontmatter = False
+    fence: Optional[str] = None
+    fence_line = 0
+    h1_count = 0
+    prev_level = 0
+    level_shift: dict[int, int] = {}  # 階層飛びで繰り上げた見出しレベルの対応
+    blank_run = 0
+    has_sources = has_closing = False
+    has_body = False
+    line_no = 0
+
+    for line_no, raw in enumerate(lines, start=1):
+        line = raw.rstrip("\r\n")
+
+        # Frontmatter
+        if line_no == 1 and line.strip() == "---":
+            frontmatter, in_frontmatter = {}, True
+            out.append(line)
+            continue
+        if in_frontmatter:
+            if line.strip() in ("---", "..."):
+                in_frontmatter = False
+                frontmatter_end = line_no
+            else:
+                key = _FRONTMATTER_KEY.match(line)
+                if key:
+                    frontmatter[key.group(1).lower()] = line[key.end():].strip().strip("'\"")
+            out.append(line)
+            continue
+
+        # コードブロックの中は検分しない
+        match = _FENCE.match(line)
+        if fence is not None:
+            if match and match.group(1)[0] == fence[0] and len(match.group(1)) >= len(fence):
+                fence = None
+            out.append(line)
+            continue
+        if match:
+            fence, fence_line = match.group(1), line_no
+            blank_run = 0
+            out.append(line)
+            continue
+
+        # 余分な空行（3行以上の連続）は2行に詰める
+        if not line.strip():
+            blank_run += 1
+            if blank_run == 3:
+                defects.append(Defect("blank-lines", line_no, "空行が続きすぎております", "warning", fixed=True))
+            if blank_run >= 3:
+                continue
+            out.append(line)
+            continue
+        blank_run = 0
+        has_body = True
+
+        heading = _HEADING.match(line)
+        if heading:
+            indent, hashes, rest = heading.groups()
+            level = len(hashes)
+            if level == 1:
+                h1_count += 1
+                if h1_count > 1:
+                    defects.append(Defect("multiple-h1", line_no, "H1 が複数ございます"))
+                level_shift.clear()
+            else:
+                parent = max(prev_level, 1)  # H1 の欠落は別に数える
+                fixed_level = level_shift.get(level, level)
+                if fixed_level > parent + 1:
+                    fixed_level = parent + 1
+                    defects.append(Defect(
+                        "heading-skip", line_no,
+                        f"見出しが H{parent} から H{level} へ飛んでおります → H{fixed_level} に改めました",
+                        "warning", fixed=True,
+                    ))
+                level_shift = {k: v for k, v in level_shift.items() if k < level}
+                if fixed_level != level:
+                    level_shift[level] = fixed_level
+                    line = f"{indent}{'#' * fixed_level}{rest}"
+                level = fixed_level
+                title = rest.strip()
+                if level == 2 and SOURCES_HEADING.search(title):
+                    has_sources = True
+                if level == 2 and CLOSING_HEADING.search(title):
+                    has_closing = True
+            prev_level = level
+        elif "【出典" in line:
+            has_sources = True
+
+        # 画像プレースホルダーは注記に置き換える
+        if PLACEHOLDER.search(line):
+            defects.append(Defect("image-placeholder", line_no, "画像プレースホルダーが残っております → 注記に改めました",
+                                  "warning", fixed=True))
+            line = PLACEHOLDER.sub(lambda m: f"<!-- 城代注記: 画像未挿入 {m.group(0)} -->", line)
+
+        # 空リンク: URL がなければ文字だけ残し、文字がなければ URL を表示文字にする
+        if _EMPTY_URL_LINK.search(line):
+            defects.append(Defect("empty-link", line_no, "リンク先が空でございます → 文字だけ残しました",
+                                  "warning", fixed=True))
+            line = _EMPTY_URL_LINK.sub(r"\1", line)
+        if _EMPTY_TEXT_LINK.search(line):
+            defects.append(Defect("empty-link", line_no, "リンク文字が空でございます → URL を表示しました",
+                                  "warning", fixed=True))
+            line = _EMPTY_TEXT_LINK.sub(r"[\1](\1)", line)
+
+        if _IMAGE_NO_ALT.search(line):
+            defects.append(Defect("image-alt", line_no, "画像に Alt テキストがございませぬ"))
+        if _UNCLOSED_LINK.search(line):
+            defects.append(Defect("broken-link", line_no, "リンクの閉じ括弧が漏れております"))
+
+        out.append(line)
+
+    # ここから原稿全体に関わる不備
+    if in_frontmatter:
+        defects.append(Defect("frontmatter", 1, "Frontmatter が閉じておりませぬ"))
+    if fence is not None:
+        out.append(fence)
+        defects.append(Defect("unclosed-fence", fence_line, "コードブロックが閉じておりませぬ → 末尾で閉じました",
+                              "warning", fixed=True))
+    if not has_body:
+        defects.append(Defect("empty", 0, "本文がございませぬ"))
+    if h1_count == 0:
+        title = (frontmatter or {}).get("title")
+        if title and frontmatter_end:
+            spacer = [""] if out[frontmatter_end:frontmatter_end + 1] != [""] else []
+            out[frontmatter_end:frontmatter_end] = [f"# {title}"] + spacer
+            defects.append(Defect("missing-h1", 0, "H1（記事タイトル）がございませぬ → Frontmatter の title から補いました",
+                                  "warning", fixed=True))
+        else:
+            defects.append(Defect("missing-h1", 0, "H1（記事タイトル）がございませぬ"))
+    if frontmatter is None:
+        defects.append(Defect("frontmatter", 0, "Frontmatter がございませぬ", "warning"))
+    else:
+        missing = [key for key in FRONTMATTER_KEYS if key not in frontmatter]
+        if missing:
+            defects.append(Defect("frontmatter", 1, f"Frontmatter に {', '.join(missing)} がございませぬ", "warning"))
+    if not has_sources:
+        defects.append(Defect("sources-section", 0, "【出典・参考】セクションがございませぬ"))
+    if not has_closing:
+        defects.append(Defect("closing-section", 0, "まとめ / CTA のセクションがございませぬ", "warning"))
+
+    text = "\n".join(out) + ("\n" if out else "")
+    return LintResult(text=text, defects=defects)
+
+
+def render_defects(defects: list[Defect]) -> str:
+    """不備一覧を Markdown の箇条書きにする"""
+    return "\n".join(d.render() for d in defects) if defects else "- 不備なし"
+
+
+def main():
+    if len(sys.argv) != 2:
+        print("Usage: python castle_lint.py <Markdownファイル>")
+        sys.exit(2)
+    path = Path(sys.argv[1])
+    with path.open(encoding="utf-8") as f:
+        result = lint_markdown(f)
+    print(render_defects(result.defects))
+    sys.exit(0 if result.passed else 1)
+
+
+if __name__ == "__main__":
+    main()
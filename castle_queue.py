@@ -0,0 +1,461 @@
+"""
+軍議の受付帳 — 常駐の軍議所（war_council.py serve）と働き手（war_council.py worker）が使う SQLite の列
+
+受付帳（JobQueue）: CMS などから届いたテーマを1件ずつ受け付け、軍議所が空いた順に取り出す。
+プロセスが倒れても受付帳はディスクに残り、再起動時に走っていた依頼を列に戻す（作業場が残っていれば続きから）。
+
+    - 依頼には依頼主（tenant）・優先度（大きいほど先）・納期（epoch 秒、早いほど先）を付けられる
+    - 取り出しは優先度が最優先。同じ優先度なら走っている依頼の少ない依頼主、その中では納期の早いもの、受付順
+      — 1つの依頼主が大量に積んでも、他の依頼主の依頼が後回しにされ続けることはない
+    - 状態は queued → running → succeeded / failed（queued のうちは canceled にできる）
+
+持ち場帳（TaskQueue）: 軍議が家臣1人分の持ち場（task）を積み、別のプロセス・別の機械の働き手が借りて片付ける。
+
+    - 借りるときに貸し出し期限（lease）を付け、働き手は片付けるまで一定の間隔で期限を延ばす（heartbeat）
+    - 期限の切れた持ち場は、次に借りに来た働き手へ回す（働き手が倒れても失うのはその1段だけ）
+    - max_attempts 回貸し出して片付かなければ failed とする
+    - 片付けた報告は、いま借りている働き手のものだけ受け付ける（期限切れの後に戻った働き手の報告は捨てる）
+    - 状態は queued → running → succeeded / fallback / failed
+
+接続は操作ごとに開く（WAL・busy timeout 付き）ので、スレッドをまたいでも複数プロセスから使ってもよい。
+複数の機械から使うときは、共有ストレージ上の同じファイルを指す（ロックの効くファイルシステムに置くこと）。
+
+Usage:
+    python castle_queue.py <queue.db>                  # 依頼の一覧（新しい順）
+    python castle_queue.py <queue.db> --tenant cms     # 依頼主で絞る
+    python castle_queue.py <queue.db> --tasks          # 持ち場の一覧（新しい順）
+"""
+
+import datetime
+import json
+import sqlite3
+import sys
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Optional
+
+STATUSES = ("queued", "running", "succeeded", "failed", "canceled")
+TASK_STATUSES = ("queued", "running", "succeeded", "fallback", "failed")
+TASK_FINISHED = ("succeeded", "fallback", "failed")
+
+DEFAULT_LEASE_SEC = 60.0
+DEFAULT_MAX_ATTEMPTS = 3
+
+_JOB_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    theme TEXT NOT NULL,
+    tenant TEXT NOT NULL DEFAULT 'default',
+    priority INTEGER NOT NULL DEFAULT 0,
+    deadline REAL,
+    status TEXT NOT NULL DEFAULT 'queued',
+    run_id TEXT,
+    article_path TEXT NOT NULL DEFAULT '',
+    error TEXT NOT NULL DEFAULT '',
+    cost_usd REAL NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, tenant);
+"""
+
+_TASK_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_id TEXT NOT NULL,
+    workspace TEXT NOT NULL,
+    agent TEXT NOT NULL,
+    theme TEXT NOT NULL DEFAULT '',
+    options TEXT NOT NULL DEFAULT '{}',
+    status TEXT NOT NULL DEFAULT 'queued',
+    worker TEXT,
+    lease_expires_at REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 3,
+    error TEXT NOT NULL DEFAULT '',
+    calls TEXT NOT NULL DEFAULT '[]',
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    UNIQUE (run_id, agent)
+);
+CREATE INDEX IF NOT EXISTS tasks_status ON tasks (status, lease_expires_at);
+"""
+
+
+@dataclass
+class Job:
+    """受付帳の1行"""
+    id: int
+    theme: str
+    tenant: str
+    priority: int
+    deadline: Optional[float]
+    status: str
+    run_id: Optional[str]
+    article_path: str
+    error: str
+    cost_usd: float
+    attempts: int
+    created_at: float
+    started_at: Optional[float]
+    finished_at: Optional[float]
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+def parse_deadline(value) -> Optional[float]:
+    """納期を epoch 秒にする（数ならそのまま、文字列なら ISO 8601。時差がなければ手元の時刻とみなす）"""
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            return datetime.datetime.fromisoformat(value).timestamp()
+        except ValueError:
+            pass
+    raise ValueError(f"納期は epoch 秒か ISO 8601 の日時で指定してくだされ: {value!r}")
+
+
+@dataclass
+class Task:
+    """持ち場帳の1行（options・calls は JSON を解いたもの）"""
+    id: int
+    run_id: str
+    workspace: str
+    agent: str
+    theme: str
+    options: dict
+    status: str
+    worker: Optional[str]
+    lease_expires_at: Optional[float]
+    attempts: int
+    max_attempts: int
+    error: str
+    calls: list
+    created_at: float
+    started_at: Optional[float]
+    finished_at: Optional[float]
+
+    @property
+    def finished(self) -> bool:
+        return self.status in TASK_FINISHED
+
+
+class _SQLiteQueue:
+    """接続・書き込みの取り合いの扱いを JobQueue と TaskQueue で共有する"""
+
+    SCHEMA = ""
+
+    def __init__(self, path: Path):
+        self.path = path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.executescript(self.SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        db.row_factory = sqlite3.Row
+        try:
+            yield db
+        finally:
+            db.close()
+
+    @contextmanager
+    def _transaction(self):
+        """書き込みの取り合いになる操作は BEGIN IMMEDIATE で先に書き込み権を取る"""
+        with self._connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                yield db
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+            db.execute("COMMIT")
+
+
+class JobQueue(_SQLiteQueue):
+    """SQLite の依頼の列"""
+
+    SCHEMA = _JOB_SCHEMA
+
+    @staticmethod
+    def _job(row: Optional[sqlite3.Row]) -> Optional[Job]:
+        return Job(**dict(row)) if row is not None else None
+
+    def submit(self, theme: str, tenant: str = "default", priority: int = 0, deadline: Optional[float] = None) -> Job:
+        if not theme.strip():
+            raise ValueError("無念！テーマが空でございます")
+        with self._connect() as db:
+            cursor = db.execute(
+                "INSERT INTO jobs (theme, tenant, priority, deadline, created_at) VALUES (?, ?, ?, ?, ?)",
+                (theme, tenant or "default", priority, deadline, time.time()),
+            )
+            return self._job(db.execute("SELECT * FROM jobs WHERE id = ?", (cursor.lastrowid,)).fetchone())
+
+    def get(self, job_id: int) -> Optional[Job]:
+        with self._connect() as db:
+            return self._job(db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone())
+
+    def list(self, tenant: Optional[str] = None, status: Optional[str] = None, limit: int = 100) -> list[Job]:
+        clauses, params = [], []
+        if tenant:
+            clauses.append("tenant = ?")
+            params.append(tenant)
+        if status:
+            clauses.append("status = ?")
+            params.append(status)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._connect() as db:
+            rows = db.execute(f"SELECT * FROM jobs {where} ORDER BY id DESC LIMIT ?", (*params, limit)).fetchall()
+        return [self._job(row) for row in rows]
+
+    def counts(self) -> dict[str, int]:
+        with self._connect() as db:
+            rows = db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: 0 for status in STATUSES} | {row[0]: row[1] for row in rows}
+
+    def cancel(self, job_id: int) -> bool:
+        """列で待っている依頼だけ取り消せる"""
+        with self._connect() as db:
+            cursor = db.execute(
+                "UPDATE jobs SET status = 'canceled', finished_at = ? WHERE id = ? AND status = 'queued'",
+                (time.time(), job_id),
+            )
+            return cursor.rowcount == 1
+
+    def claim(self, run_id: str) -> Optional[Job]:
+        """
+        次に取りかかる依頼を取り出して running にする（なければ None）。
+        作業場がまだない依頼には run_id を割り当てる（列に戻された依頼は前の作業場を使い続ける）。
+        """
+        with self._transaction() as db:
+            heads = db.execute(
+                """
+                SELECT * FROM (
+                    SELECT *, ROW_NUMBER() OVER (
+                        PARTITION BY tenant ORDER BY priority DESC, deadline IS NULL, deadline, id
+                    ) AS rank FROM jobs WHERE status = 'queued'
+                ) WHERE rank = 1
+                """
+            ).fetchall()
+            if not heads:
+                return None
+            running = dict(db.execute(
+                "SELECT tenant, COUNT(*) FROM jobs WHERE status = 'running' GROUP BY tenant"
+            ).fetchall())
+            head = min(heads, key=lambda row: (
+                -row["priority"],
+                running.get(row["tenant"], 0),
+                row["deadline"] if row["deadline"] is not None else float("inf"),
+                row["id"],
+            ))
+            db.execute(
+                "UPDATE jobs SET status = 'running', started_at = ?, attempts = attempts + 1, "
+                "run_id = COALESCE(run_id, ?) WHERE id = ?",
+                (time.time(), run_id, head["id"]),
+            )
+            return self._job(db.execute("SELECT * FROM jobs WHERE id = ?", (head["id"],)).fetchone())
+
+    def finish(self, job_id: int, status: str, article_path: str = "", error: str = "", cost_usd: float = 0.0):
+        if status not in ("succeeded", "failed"):
+            raise ValueError(f"終わりの状態は succeeded / failed のいずれかでございます: {status}")
+        with self._connect() as db:
+            db.execute(
+                "UPDATE jobs SET status = ?, article_path = ?, error = ?, cost_usd = cost_usd + ?, finished_at = ? "
+                "WHERE id = ?",
+                (status, article_path, error, cost_usd, time.time(), job_id),
+            )
+
+    def recover(self) -> int:
+        """前のプロセスが走らせたまま倒れた依頼を列に戻す（起動時に呼ぶ）"""
+        with self._connect() as db:
+            return db.execute("UPDATE jobs SET status = 'queued' WHERE status = 'running'").rowcount
+
+
+class TaskQueue(_SQLiteQueue):
+    """SQLite の持ち場帳（貸し出し期限付き）"""
+
+    SCHEMA = _TASK_SCHEMA
+
+    @staticmethod
+    def _task(row: Optional[sqlite3.Row]) -> Optional[Task]:
+        if row is None:
+            return None
+        fields = dict(row)
+        fields["options"] = json.loads(fields["options"])
+        fields["calls"] = json.loads(fields["calls"])
+        return Task(**fields)
+
+    def enqueue(
+        self,
+        run_id: str,
+        workspace: str,
+        agent: str,
+        theme: str = "",
+        options: Optional[dict] = None,
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+    ) -> Task:
+        """
+        持ち場を積む。同じ軍議・同じ家臣の持ち場が
+        まだ片付いていなければそれを返し（軍議を開き直しても二重に積まない）、片付いていれば積み直す。
+        """
+        options_json = json.dumps(options or {}, ensure_ascii=False)
+        with self._transaction() as db:
+            row = db.execute("SELECT * FROM tasks WHERE run_id = ? AND agent = ?", (run_id, agent)).fetchone()
+            if row is None:
+                db.execute(
+                    "INSERT INTO tasks (run_id, workspace, agent, theme, options, max_attempts, created_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (run_id, workspace, agent, theme, options_json, max(1, max_attempts), time.time()),
+                )
+            elif row["status"] in TASK_FINISHED:
+                db.execute(
+                    "UPDATE tasks SET workspace = ?, theme = ?, options = ?, max_attempts = ?, status = 'queued', "
+                    "worker = NULL, lease_expires_at = NULL, attempts = 0, error = '', calls = '[]', "
+                    "created_at = ?, started_at = NULL, finished_at = NULL WHERE id = ?",
+                    (workspace, theme, options_json, max(1, max_attempts), time.time(), row["id"]),
+                )
+            return self._task(db.execute(
+                "SELECT * FROM tasks WHERE run_id = ? AND agent = ?", (run_id, agent)
+            ).fetchone())
+
+    def get(self, task_id: int) -> Optional[Task]:
+        with self._connect() as db:
+            return self._task(db.execute("SELECT * FROM tasks WHERE id = ?", (task_id,)).fetchone())
+
+    def list(self, run_id: Optional[str] = None, status: Optional[str] = None, limit: int = 100) -> list[Task]:
+        clauses, params = [], []
+        if run_id:
+            clauses.append("run_id = ?")
+            params.append(run_id)
+        if status:
+            clauses.append("status = ?")
+            params.append(status)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._connect() as db:
+            rows = db.execute(f"SELECT * FROM tasks {where} ORDER BY id DESC LIMIT ?", (*params, limit)).fetchall()
+        return [self._task(row) for row in rows]
+
+    def counts(self) -> dict[str, int]:
+        with self._connect() as db:
+            rows = db.execute("SELECT status, COUNT(*) FROM tasks GROUP BY status").fetchall()
+        return {status: 0 for status in TASK_STATUSES} | {row[0]: row[1] for row in rows}
+
+    def claim(self, worker: str, lease_sec: float = DEFAULT_LEASE_SEC) -> Optional[Task]:
+        """
+        列で待っている持ち場か、貸し出し期限の切れた持ち場を1つ借りる（なければ None）。
+        attempts が 2 以上なら、前の働き手から引き継いだ持ち場。
+        """
+        now = time.time()
+        with self._transaction() as db:
+            db.execute(
+                "UPDATE tasks SET status = 'failed', finished_at = ?, "
+                "error = '働き手が ' || attempts || ' 度続けて期限までに戻りませんでした（最後の働き手: ' || worker || '）' "
+                "WHERE status = 'running' AND lease_expires_at < ? AND attempts >= max_attempts",
+                (now, now),
+            )
+            row = db.execute(
+                "SELECT * FROM tasks WHERE status = 'queued' OR (status = 'running' AND lease_expires_at < ?) "
+                "ORDER BY id LIMIT 1",
+                (now,),
+            ).fetchone()
+            if row is None:
+                return None
+            db.execute(
+                "UPDATE tasks SET status = 'running', worker = ?, lease_expires_at = ?, attempts = attempts + 1, "
+                "started_at = ? WHERE id = ?",
+                (worker, now + lease_sec, now, row["id"]),
+            )
+            task = self._task(row)
+        task.status, task.worker, task.lease_expires_at = "running", worker, now + lease_sec
+        task.attempts += 1
+        return task
+
+    def heartbeat(self, task_id: int, worker: str, lease_sec: float = DEFAULT_LEASE_SEC) -> bool:
+        """
+        貸し出し期限を延ばす。既に他の働き手へ回っていれば False
+        （期限が切れていても、まだ誰も借りに来ていなければ延ばせる）。
+        """
+        with self._connect() as db:
+            cursor = db.execute(
+                "UPDATE tasks SET lease_expires_at = ? WHERE id = ? AND worker = ? AND status = 'running'",
+                (time.time() + lease_sec, task_id, worker),
+            )
+            return cursor.rowcount == 1
+
+    def complete(self, task_id: int, worker: str, status: str, error: str = "", calls: Optional[list] = None) -> bool:
+        """片付けた報告。いま借りている働き手の報告でなければ受け付けず False"""
+        if status not in TASK_FINISHED:
+            raise ValueError(f"終わりの状態は {' / '.join(TASK_FINISHED)} のいずれかでございます: {status}")
+        with self._connect() as db:
+            cursor = db.execute(
+                "UPDATE tasks SET status = ?, error = ?, calls = ?, lease_expires_at = NULL, finished_at = ? "
+                "WHERE id = ? AND worker = ? AND status = 'running'",
+                (status, error, json.dumps(calls or [], ensure_ascii=False), time.time(), task_id, worker),
+            )
+            return cursor.rowcount == 1
+
+    def release(self, task_id: int, worker: str) -> bool:
+        """働き手が止まるとき、片付けていない持ち場を期限を待たずに列へ戻す（貸し出し回数に数えない）"""
+        with self._connect() as db:
+            cursor = db.execute(
+                "UPDATE tasks SET status = 'queued', lease_expires_at = NULL, attempts = attempts - 1 "
+                "WHERE id = ? AND worker = ? AND status = 'running'",
+                (task_id, worker),
+            )
+            return cursor.rowcount == 1
+
+
+def _format_time(value: Optional[float]) -> str:
+    return datetime.datetime.fromtimestamp(value).strftime("%m-%d %H:%M") if value else "-"
+
+
+def _print_tasks(queue: TaskQueue):
+    print("| # | 状態 | 家臣 | 働き手 | 貸出 | 期限 | 軍議ID |")
+    print("|---:|---|---|---|---:|---|---|")
+    for task in queue.list():
+        print(f"| {task.id} | {task.status} | {task.agent} | {task.worker or '-'} | "
+              f"{task.attempts}/{task.max_attempts} | {_format_time(task.lease_expires_at)} | {task.run_id} |")
+    print("\n" + " | ".join(f"{status} {count}" for status, count in queue.counts().items()))
+
+
+def main():
+    args = sys.argv[1:]
+    tasks = "--tasks" in args
+    if tasks:
+        args.remove("--tasks")
+    tenant = None
+    if "--tenant" in args:
+        index = args.index("--tenant")
+        tenant = args[index + 1] if index + 1 < len(args) else None
+        del args[index:index + 2]
+    if len(args) != 1 or not tenant and "--tenant" in sys.argv:
+        print("Usage: python castle_queue.py <queue.db> [--tenant <依頼主> | --tasks]")
+        sys.exit(2)
+    path = Path(args[0])
+    if not path.exists():
+        print(f"無念！受付帳が見つかりませぬ: {path}", file=sys.stderr)
+        sys.exit(1)
+    if tasks:
+        _print_tasks(TaskQueue(path))
+        return
+    queue = JobQueue(path)
+    print("| # | 状態 | 依頼主 | 優先度 | 納期 | 受付 | テーマ |")
+    print("|---:|---|---|---:|---|---|---|")
+    for job in queue.list(tenant=tenant):
+        print(f"| {job.id} | {job.status} | {job.tenant} | {job.priority} | {_format_time(job.deadline)} | "
+              f"{_format_time(job.created_at)} | {job.theme} |")
+    print("\n" + " | ".join(f"{status} {count}" for status, count in queue.counts().items()))
+
+
+if __name__ == "__main__":
+    main()
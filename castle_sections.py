@@ -0,0 +1,459 @@
+"""
+右筆・代筆の分担表 — 記事を H2 セクション単位で扱うための道具
+
+右筆（Yuhitsu）が記事を1回の呼び出しで書き上げると、出力の長さがそのまま待ち時間になり、
+max_tokens の天井で記事の長さも頭打ちになる。代筆（Daihitsu）も、批評で指摘されたのが
+数セクションだけでも記事全体を書き直してしまう。ここでは
+
+    - structure_fixed.md の見出し構成から H2 ごとの執筆指示（SectionBrief）を読み取る
+    - 冒頭（Frontmatter・H1・リード文）と各 H2 セクションを別々の依頼に分ける
+    - 書き上がった各セクションを構成順に継ぎ合わせ、継ぎ目の段落だけを整える依頼を作る
+    - critique_report.md 末尾の構造化された批評（見出し → 指摘）から、書き直すセクションを決める
+
+ための部品を用意する。原稿を H2 単位に切り分ける split_sections / join_sections は、
+切り分けた文字列をそのまま継げば元の原稿とバイト単位で一致する。
+
+Usage:
+    python castle_sections.py castle_floors/runs/<run_id>/02_blueprint/structure_fixed.md
+    python castle_sections.py <draft_v1.md> <critique_report.md>
+"""
+
+import difflib
+import json
+import re
+import sys
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional
+
+# 継ぎ目を整える依頼の System Prompt
+SMOOTH_SYSTEM_PROMPT = (
+    "あなたは右筆です。別々に書かれたセクションの継ぎ目を、自然な流れに整える文豪です。\n"
+    "指定の形式でのみ返答し、内容・数値・出典は変えないでください。"
+)
+
+# 批評の評価記号と重み（大きいほど重い）
+SEVERITY_WEIGHTS = {"◎": 0, "○": 1, "△": 2, "×": 3}
+
+# この重み以上の指摘があるセクションを書き直す（△ 以上）
+REWRITE_MIN_SEVERITY = 2
+
+# 冒頭部分と記事全体を指す批評の見出し
+LEAD_ANCHOR = "冒頭"
+GENERAL_ANCHOR = "全体"
+LEAD_ALIASES = {LEAD_ANCHOR, "リード", "リード文", "導入", "frontmatter", "タイトル"}
+
+# 見出し構成の中で H2 を示す行（「H2: 見出し」「### H2-1：見出し」「- **H2** 見出し」など）
+_H2_LABEL = re.compile(r"^[\s#>*\-+|]*(?:\d+[.)]\s*)?[【\[]?\**H2\**(?:\s*[-‐－_]?\s*\d+)?[】\]]?\**\s*[:：.．]?\s*(.+)$")
+_H3_LABEL = re.compile(r"H3", re.IGNORECASE)
+_HEADING = re.compile(r"^\s{0,3}(#{1,6})\s+(.*?)\s*#*\s*$")
+_FENCE = re.compile(r"^\s{0,3}(`{3,}|~{3,})")
+_CHAR_ESTIMATE = re.compile(r"\s*[（(]\s*(?:約|目安)?\s*[\d,]+\s*字[^)）]*[)）]\s*$")
+_JSON_BLOCK = re.compile(r"```json\s*\n(.*?)\n```", re.S)
+_OUTLINE_CONTAINER = re.compile(r"見出し構成|構成案|アウトライン|目次", re.IGNORECASE)
+
+# H2 一つ分の執筆指示として持ち回る行数の上限
+MAX_BRIEF_LINES = 40
+
+
+@dataclass
+class SectionBrief:
+    """構成案の H2 一つ分（見出しと、その下の H3・メモ）"""
+    title: str
+    brief: list[str] = field(default_factory=list)
+
+
+@dataclass
+class Outline:
+    """structure_fixed.md から読み取った見出し構成"""
+    sections: list[SectionBrief] = field(default_factory=list)
+
+    @property
+    def titles(self) -> list[str]:
+        return [s.title for s in self.sections]
+
+
+@dataclass
+class Section:
+    """原稿の一区画（冒頭部分は title が空）。text は見出し行から次の H2 の直前までをそのまま持つ"""
+    title: str
+    text: str
+
+    @property
+    def anchor(self) -> str:
+        """批評と原稿を突き合わせるための目印（見出しの文字列から空白・記号を除いたもの）"""
+        return normalize_anchor(self.title) if self.title else LEAD_ANCHOR
+
+
+def normalize_anchor(title: str) -> str:
+    """見出し同士を比べるための正規化（番号・記号・空白の揺れを吸収する）"""
+    title = re.sub(r"^[\s#]*(?:\d+[.)．]\s*|第\d+章\s*)?", "", title)
+    return re.sub(r"[\s*_`「」『』【】\[\]（）()・:：、。!！?？\-—–]", "", title).lower()
+
+
+def _clean_title(text: str) -> str:
+    text = _CHAR_ESTIMATE.sub("", text.strip())
+    text = text.strip("*_ ").strip()
+    if len(text) >= 2 and text[0] in "「『" and text[-1] in "」』":
+        text = text[1:-1]
+    return text.strip()
+
+
+def parse_outline(text: str) -> Outline:
+    """
+    見出し構成から H2 を読み取る。
+
+    「H2: 見出し」の形で書かれた行を優先し、なければ「見出し構成」の見出しの一段下にある
+    Markdown 見出しを H2 とみなす。どちらも見つからなければ空の Outline を返す。
+    """
+    outline = Outline()
+    lines = text.splitlines()
+
+    current: Optional[SectionBrief] = None
+    stop_level = 2
+    for line in lines:
+        label = _H2_LABEL.match(line)
+        heading = _HEADING.match(line)
+        if label and not _H3_LABEL.search(line.split("H2", 1)[0]):
+            current = SectionBrief(_clean_title(label.group(1)))
+            outline.sections.append(current)
+            stop_level = len(heading.group(1)) if heading else 2
+            continue
+        if current is None:
+            continue
+        if heading and len(heading.group(1)) <= stop_level and not _H3_LABEL.search(line):
+            current = None
+            continue
+        if line.strip() and len(current.brief) < MAX_BRIEF_LINES:
+            current.brief.append(line.rstrip())
+    if outline.sections:
+        return outline
+
+    container_level: Optional[int] = None
+    for line in lines:
+        heading = _HEADING.match(line)
+        if not heading:
+            if current is not None and line.strip() and len(current.brief) < MAX_BRIEF_LINES:
+                current.brief.append(line.rstrip())
+            continue
+        level, title = len(heading.group(1)), heading.group(2)
+        if container_level is None:
+            if _OUTLINE_CONTAINER.search(title):
+                container_level = level
+            continue
+        if level <= container_level:
+            break
+        if level == container_level + 1:
+            current = SectionBrief(_clean_title(title))
+            outline.sections.append(current)
+        elif current is not None and len(current.brief) < MAX_BRIEF_LINES:
+            current.brief.append(line.rstrip())
+    return outline
+
+
+def split_sections(text: str) -> list[Section]:
+    """
+    原稿を H2 ごとに切り分ける。先頭（Frontmatter・H1・リード文）は title が空の区画になる。
+    コードブロック内の「## 」は見出しとみなさない。join_sections で継げば元の原稿に戻る。
+    """
+    sections = [Section(title="", text="")]
+    fence: Optional[str] = None
+    for line in text.splitlines(keepends=True):
+        match = _FENCE.match(line)
+        if fence is not None:
+            if match and match.group(1)[0] == fence[0] and len(match.group(1)) >= len(fence):
+                fence = None
+        elif match:
+            fence = match.group(1)
+        else:
+            heading = _HEADING.match(line.rstrip("\r\n"))
+            if heading and len(heading.group(1)) == 2:
+                sections.append(Section(title=heading.group(2), text=""))
+        sections[-1].text += line
+    return sections
+
+
+def join_sections(sections: list[Section]) -> str:
+    return "".join(section.text for section in sections)
+
+
+def ensure_heading(text: str, title: str) -> str:
+    """セクションの出力が「## 見出し」で始まっていなければ付ける（前置きの文があれば捨てる）"""
+    text = text.strip("\n")
+    for i, line in enumerate(text.splitlines()):
+        heading = _HEADING.match(line)
+        if heading and len(heading.group(1)) == 2:
+            return "\n".join(text.splitlines()[i:]).strip("\n") + "\n"
+    return f"## {title}\n\n{text}\n"
+
+
+def header_message(theme: str, titles: list[str]) -> str:
+    """冒頭（Frontmatter・H1・リード文）だけを書かせる依頼文"""
+    toc = "\n".join(f"{i}. {title}" for i, title in enumerate(titles, start=1))
+    return (
+        f"# 将軍の勅命（テーマ）\n\n「{theme}」\n\n---\n\n"
+        "## 担当: 冒頭\n\n"
+        "この記事は H2 セクションごとに手分けして執筆する。あなたの担当は冒頭部分のみ。\n"
+        "Frontmatter（title, date, tags）・H1 タイトル・リード文だけを書き、H2 以降は書かないこと。\n\n"
+        f"## 記事全体の H2 構成\n\n{toc}\n"
+    )
+
+
+def section_message(theme: str, titles: list[str], index: int, section: SectionBrief) -> str:
+    """H2 セクション一つだけを書かせる依頼文（index は 0 始まり）"""
+    toc = "\n".join(
+        f"{i}. {title}" + ("  ← 担当" if i - 1 == index else "") for i, title in enumerate(titles, start=1)
+    )
+    brief = "\n".join(section.brief) or "（構成案に補足なし）"
+    position = "最後のセクション。まとめと CTA（行動喚起）で締めること。" if index == len(titles) - 1 else (
+        "前後のセクションと内容が重ならないよう、担当範囲だけを書くこと。"
+    )
+    return (
+        f"# 将軍の勅命（テーマ）\n\n「{theme}」\n\n---\n\n"
+        f"## 担当: H2 セクション {index + 1}/{len(titles)}「{section.title}」\n\n"
+        "この記事は H2 セクションごとに手分けして執筆する。あなたの担当はこのセクションのみ。\n"
+        f"「## {section.title}」の見出しから書き始め、Frontmatter・H1・リード文・他のセクションは書かないこと。\n"
+        f"{position}\n\n"
+        f"## 構成案の指示\n\n{brief}\n\n"
+        f"## 記事全体の H2 構成\n\n{toc}\n"
+    )
+
+
+def _paragraphs(text: str) -> list[str]:
+    return [p for p in re.split(r"\n\s*\n", text.strip("\n")) if p.strip()]
+
+
+def _head_paragraph(section_text: str) -> Optional[str]:
+    """見出しの直後にある最初の地の文の段落（箇条書き・表・見出しは除く）"""
+    for paragraph in _paragraphs(section_text)[:3]:
+        first = paragraph.lstrip()
+        if not first.startswith(("#", "-", "*", "+", "|", ">", "`", "!")) and not re.match(r"\d+[.)]", first):
+            return paragraph
+    return None
+
+
+def _tail_paragraph(section_text: str) -> Optional[str]:
+    paragraphs = _paragraphs(section_text)
+    return paragraphs[-1] if paragraphs else None
+
+
+def build_smoothing_request(parts: list[str]) -> tuple[str, list[tuple[int, str]]]:
+    """
+    継ぎ目ごとに「前の区画の末尾」と「次の区画の冒頭段落」を並べた依頼文を作る。
+
+    Returns: (依頼文, [(区画番号, 書き換え対象の冒頭段落)]) — 整える継ぎ目がなければ依頼文は空
+    """
+    blocks: list[str] = []
+    targets: list[tuple[int, str]] = []
+    for i in range(1, len(parts)):
+        head, tail = _head_paragraph(parts[i]), _tail_paragraph(parts[i - 1])
+        if head is None or tail is None:
+            continue
+        targets.append((i, head))
+        blocks.append(f"### 継ぎ目 {len(targets)}\n\n【前節の末尾】\n{tail}\n\n【次節の冒頭】\n{head}")
+    if not targets:
+        return "", []
+    request = (
+        "以下は別々に執筆された記事セクションの継ぎ目です。\n"
+        "前節からの流れが自然につながるよう、各【次節の冒頭】の段落だけを書き直してください。\n"
+        "重複した前置きは削り、接続の一文を添える程度の軽い手直しに留めてください。\n"
+        "返答は「### 継ぎ目 番号」の見出しの後に、書き直した段落だけを記す形式のみとしてください。\n\n"
+        + "\n\n".join(blocks) + "\n"
+    )
+    return request, targets
+
+
+def apply_smoothing(parts: list[str], targets: list[tuple[int, str]], response: str) -> list[str]:
+    """継ぎ目の書き直しを反映する。形式が崩れた・長くなりすぎた書き直しは採らない"""
+    parts = list(parts)
+    rewritten = dict(
+        (int(number), body.strip())
+        for number, body in re.findall(r"^#{2,4}\s*継ぎ目\s*(\d+)\s*$(.*?)(?=^#{2,4}\s*継ぎ目|\Z)", response, re.M | re.S)
+    )
+    for number, (index, head) in enumerate(targets, start=1):
+        body = rewritten.get(number, "")
+        if not body or body.startswith("#") or len(body) > len(head) * 2 + 200:
+            continue
+        parts[index] = parts[index].replace(head, body, 1)
+    return parts
+
+
+@dataclass
+class SectionCritique:
+    """批評の一項目（セクション一つ、または記事全体への指摘）"""
+    anchor: str
+    severity: str = "○"
+    issues: list[str] = field(default_factory=list)
+
+    @property
+    def weight(self) -> int:
+        return SEVERITY_WEIGHTS.get(self.severity, 1)
+
+
+@dataclass
+class Critique:
+    """critique_report.md 末尾の JSON から読み取った構造化された批評"""
+    sections: list[SectionCritique] = field(default_factory=list)
+
+    @property
+    def general(self) -> list[SectionCritique]:
+        return [c for c in self.sections if normalize_anchor(c.anchor) == GENERAL_ANCHOR]
+
+    @property
+    def score(self) -> int:
+        """批評の重さ: 指摘のある項目のうち最も重い評価の重み（指摘がなければ 0）"""
+        return max((c.weight for c in self.sections if c.issues), default=0)
+
+
+@dataclass
+class RewritePlan:
+    """差分リライトの段取り: 原稿の区画と、書き直す区画（番号と指摘）"""
+    sections: list[Section]
+    targets: list[tuple[int, SectionCritique]] = field(default_factory=list)
+    general: list[SectionCritique] = field(default_factory=list)
+
+
+def parse_critique(text: str) -> Optional[Critique]:
+    """
+    批評レポート末尾の ```json ブロックを読む。形式が崩れていれば None（全文リライトに戻す）。
+
+    期待する形式:
+        {"sections": [{"anchor": "見出し", "severity": "△", "issues": ["指摘", ...]}, ...]}
+    """
+    blocks = _JSON_BLOCK.findall(text)
+    if not blocks:
+        return None
+    try:
+        data = json.loads(blocks[-1])
+    except json.JSONDecodeError:
+        return None
+    entries = data.get("sections") if isinstance(data, dict) else data
+    if not isinstance(entries, list):
+        return None
+
+    critique = Critique()
+    for entry in entries:
+        if not isinstance(entry, dict) or not str(entry.get("anchor", "")).strip():
+            continue
+        issues = entry.get("issues") or []
+        critique.sections.append(SectionCritique(
+            anchor=str(entry["anchor"]).strip(),
+            severity=str(entry.get("severity", "○")).strip(),
+            issues=[str(issue) for issue in (issues if isinstance(issues, list) else [issues])],
+        ))
+    return critique
+
+
+def _match_section(anchor: str, sections: list[Section]) -> Optional[int]:
+    """批評の見出しに当たる区画の番号（完全一致 → 片方がもう片方を含む一意の区画の順）"""
+    key = normalize_anchor(anchor)
+    if not key:
+        return None
+    if key in LEAD_ALIASES:
+        return 0
+    exact = [i for i, s in enumerate(sections) if s.anchor == key]
+    if exact:
+        return exact[0]
+    partial = [i for i, s in enumerate(sections) if s.title and (key in s.anchor or s.anchor in key)]
+    return partial[0] if len(partial) == 1 else None
+
+
+def plan_rewrite(draft: str, critique: Critique, min_severity: int = REWRITE_MIN_SEVERITY) -> Optional[RewritePlan]:
+    """
+    批評を原稿の区画に突き合わせ、書き直す区画を決める。
+    見出しが原稿と突き合わない指摘や、記事全体への × の指摘があれば None（全文リライトに戻す）。
+    """
+    plan = RewritePlan(sections=split_sections(draft), general=critique.general)
+    if any(c.weight >= SEVERITY_WEIGHTS["×"] for c in plan.general):
+        return None
+
+    flagged: dict[int, SectionCritique] = {}
+    for item in critique.sections:
+        if item in plan.general:
+            continue
+        index = _match_section(item.anchor, plan.sections)
+        if index is None:
+            if item.weight >= min_severity and item.issues:
+                return None
+            continue
+        if item.weight >= min_severity and item.issues:
+            if index in flagged:
+                flagged[index].issues.extend(item.issues)
+                flagged[index].severity = max(flagged[index].severity, item.severity, key=lambda s: SEVERITY_WEIGHTS.get(s, 1))
+            else:
+                flagged[index] = SectionCritique(item.anchor, item.severity, list(item.issues))
+    plan.targets = sorted(flagged.items())
+    return plan
+
+
+def rewrite_message(theme: str, plan: RewritePlan, index: int, item: SectionCritique) -> str:
+    """書き直す区画一つ分の依頼文"""
+    section = plan.sections[index]
+    if section.title:
+        scope = (f"「## {section.title}」の見出しから書き始め、このセクションだけを出力すること。"
+                 "見出しの文言は必要なら改めてよい。")
+        name = f"「{section.title}」"
+    else:
+        scope = "Frontmatter・H1・リード文だけを出力し、H2 以降は書かないこと。"
+        name = "冒頭（Frontmatter・H1・リード文）"
+    issues = "\n".join(f"- {issue}" for issue in item.issues)
+    general = "\n".join(f"- [{c.severity}] {issue}" for c in plan.general for issue in c.issues)
+    return (
+        f"# 将軍の勅命（テーマ）\n\n「{theme}」\n\n---\n\n"
+        f"## 担当: {name}の書き直し\n\n"
+        "御意見番の指摘があったセクションだけを書き直す。指摘をすべて反映した改訂版を出力せよ。\n"
+        f"{scope}\n他のセクションと修正箇所サマリーは書かないこと。\n\n"
+        f"## このセクションへの指摘（評価: {item.severity}）\n\n{issues}\n\n"
+        + (f"## 記事全体への指摘\n\n{general}\n\n" if general else "")
+        + f"## 現在のセクション\n\n{section.text.strip()}\n"
+    )
+
+
+def splice_rewrite(plan: RewritePlan, rewritten: dict[int, str]) -> str:
+    """
+    書き直した区画を元の位置に継ぎ戻す。指摘のなかった区画は一字も変えない。
+    区画末尾の空行は元の区画に揃える。
+    """
+    sections = [Section(s.title, s.text) for s in plan.sections]
+    for index, text in rewritten.items():
+        original = sections[index]
+        trailing = original.text[len(original.text.rstrip("\n")):] or "\n"
+        if original.title:
+            parts = split_sections(ensure_heading(text, original.title))
+            text = parts[1].text if len(parts) > 1 else text
+        else:
+            text = split_sections(text.strip("\n") + "\n")[0].text
+        sections[index] = Section(original.title, text.rstrip("\n") + trailing)
+    return join_sections(sections)
+
+
+def change_ratio(before: str, after: str) -> float:
+    """2つの原稿の行単位の変化率（0.0 = 同一、1.0 = 全面的に別物）"""
+    if before == after:
+        return 0.0
+    matcher = difflib.SequenceMatcher(None, before.splitlines(), after.splitlines(), autojunk=False)
+    return 1.0 - matcher.ratio()
+
+
+def main():
+    if len(sys.argv) == 3:
+        draft = Path(sys.argv[1]).read_text(encoding="utf-8")
+        critique = parse_critique(Path(sys.argv[2]).read_text(encoding="utf-8"))
+        plan = plan_rewrite(draft, critique) if critique else None
+        if plan is None:
+            print("構造化された批評を原稿に突き合わせられませぬ（全文リライト）")
+            sys.exit(1)
+        for index, item in plan.targets:
+            print(f"{plan.sections[index].title or LEAD_ANCHOR}: {item.severity} 指摘 {len(item.issues)}件")
+        return
+    if len(sys.argv) != 2:
+        print("Usage: python castle_sections.py <structure_fixed.md>")
+        print("       python castle_sections.py <draft_v1.md> <critique_report.md>")
+        sys.exit(2)
+    outline = parse_outline(Path(sys.argv[1]).read_text(encoding="utf-8"))
+    for number, section in enumerate(outline.sections, start=1):
+        print(f"{number}. {section.title}（指示 {len(section.brief)}行）")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,395 @@
+"""
+軍目付の記録 — 軍議のスパン・トークン・所要時間・費用を書き出す
+
+軍議ログは口上の一覧で、どの家臣が p95 を押し上げているのか、記事1本にいくら掛かったのかは
+読み取れない。ここでは軍議・フェーズ・家臣・API 呼び出しごとにスパンを記録し、
+
+    - trace.jsonl         1行1スパン（後から集計・突き合わせる原本）
+    - trace.chrome.json   Chrome trace-event 形式（chrome://tracing / Perfetto でそのまま開ける）
+    - *.prom              Prometheus の text-file 形式（一斉軍議の家臣ごとの p50/p95・トークン・費用）
+
+として書き出す。家臣のスパンには入出力トークン・最初の一字までの時間・所要時間・
+読んだ／書いたバイト数・送ったプロンプトのバイト数・蔵出し・再試行の回数と費用の概算を載せる。
+
+Usage:
+    python castle_trace.py castle_floors/runs/<run_id>/trace.jsonl
+    python castle_trace.py castle_floors/runs/*/trace.jsonl --prometheus castle_floors/metrics.prom
+"""
+
+import itertools
+import json
+import sys
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Iterable, Optional
+
+# 費用の概算に使う単価（USD / 100万トークン: 入力・出力・キャッシュ読込・キャッシュ書込）
+MODEL_PRICES = {
+    "claude-3-5-haiku-20241022": (0.80, 4.00, 0.08, 1.00),
+    "claude-sonnet-4-20250514": (3.00, 15.00, 0.30, 3.75),
+    "claude-opus-4-20250514": (15.00, 75.00, 1.50, 18.75),
+}
+
+# Message Batches（--batch-api）経由の呼び出しは単価の半額
+BATCH_DISCOUNT = 0.5
+
+TOKEN_KINDS = ("input_tokens", "output_tokens", "cache_read_tokens", "cache_write_tokens")
+
+# Chrome trace で家臣1人に割り当てるレーン（同時に走る呼び出しは家臣のレーンの下に並べる）
+LANE_WIDTH = 100
+
+
+def price(model: str, tokens: dict, discount: float = 1.0) -> float:
+    """1回の呼び出しの費用（USD）。単価の分からないモデルは 0 とする"""
+    rates = MODEL_PRICES.get(model)
+    if rates is None:
+        return 0.0
+    return sum(tokens.get(kind, 0) * rate for kind, rate in zip(TOKEN_KINDS, rates)) / 1_000_000 * discount
+
+
+@dataclass
+class Span:
+    """スパン1つ（kind: council / phase / agent / call）"""
+    span_id: int
+    kind: str
+    name: str
+    start: float
+    end: Optional[float] = None
+    parent_id: Optional[int] = None
+    lane: int = 0
+    attrs: dict = field(default_factory=dict)
+
+    @property
+    def duration(self) -> float:
+        return max(0.0, (self.end or self.start) - self.start)
+
+
+class Tracer:
+    """
+    1回の軍議のスパンを集める。家臣はスレッド・asyncio のどちらからでも同時に記録してよい。
+    呼び出しのスパンは、その家臣のスパンが開いていればその子に、なければ軍議の子にする（先回りなど）。
+    """
+
+    def __init__(self, run_id: str, theme: str):
+        self.run_id = run_id
+        self.theme = theme
+        self.spans: list[Span] = []
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._open_agents: dict[str, Span] = {}
+        self.council: Optional[Span] = None
+
+    def _new(self, kind: str, name: str, start: float, parent: Optional[Span], lane: int, attrs: dict) -> Span:
+        span = Span(next(self._ids), kind, name, start, parent_id=parent.span_id if parent else None,
+                    lane=lane, attrs=attrs)
+        with self._lock:
+            self.spans.append(span)
+        return span
+
+    def open_council(self) -> Span:
+        self.council = self._new("council", self.theme, time.time(), None, 0, {"run_id": self.run_id})
+        return self.council
+
+    def close_council(self, success: bool):
+        """軍議を閉じ、家臣のスパンからフェーズのスパンを組み立てる"""
+        if self.council is None:
+            return
+        self.council.end = time.time()
+        self.council.attrs.update(self.totals(), success=success)
+        phases: dict[str, list[Span]] = {}
+        for span in self.agent_spans():
+            phases.setdefault(span.attrs.get("phase", ""), []).append(span)
+        for phase, members in phases.items():
+            span = self._new("phase", phase, min(s.start for s in members), self.council, 0, {})
+            span.end = max(s.end or s.start for s in members)
+            span.attrs.update(self.totals(members))
+
+    def start_agent(self, name_en: str, name_jp: str, phase: str, lane: int, **attrs) -> Span:
+        span = self._new("agent", name_en, time.time(), self.council, lane,
+                         {"name_jp": name_jp, "phase": phase, **attrs})
+        with self._lock:
+            self._open_agents[name_en] = span
+        return span
+
+    def end_agent(self, span: Span, status: str, **attrs):
+        """家臣のスパンを閉じ、配下の呼び出しのトークン・費用・回数を集計して載せる"""
+        span.end = time.time()
+        with self._lock:
+            self._open_agents.pop(span.name, None)
+            calls = [s for s in self.spans if s.kind == "call" and s.attrs.get("agent") == span.name]
+        ttfts = [c.attrs["ttft_sec"] for c in calls if c.attrs.get("ttft_sec") is not None]
+        span.attrs.update(
+            status=status,
+            calls=sum(1 for c in calls if not c.attrs.get("cached")),
+            cache_hits=sum(1 for c in calls if c.attrs.get("cached")),
+            retries=sum(c.attrs.get("retries", 0) for c in calls),
+            hedges=sum(c.attrs.get("hedges", 0) for c in calls),
+            ttft_sec=min(ttfts) if ttfts else None,
+            models=sorted({c.attrs["model"] for c in calls if c.attrs.get("model")}),
+            **{kind: sum(c.attrs.get(kind, 0) for c in calls) for kind in TOKEN_KINDS},
+            cost_usd=round(sum((c.attrs.get("cost_usd", 0.0) for c in calls), 0.0), 6),
+            prompt_bytes=sum(c.attrs.get("prompt_bytes", 0) for c in calls),
+            **attrs,
+        )
+
+    def record_call(
+        self,
+        agent: str,
+        label: str,
+        start: float,
+        end: float,
+        model: str = "",
+        tokens: Optional[dict] = None,
+        ttft_sec: Optional[float] = None,
+        cached: bool = False,
+        discount: float = 1.0,
+        **attrs,
+    ) -> Span:
+        """API 呼び出し1回（蔵出しを含む）。終わってから記録する"""
+        with self._lock:
+            parent = self._open_agents.get(agent, self.council)
+        tokens = tokens or {}
+        span = self._new("call", label, start, parent, parent.lane if parent else 0, {
+            "agent": agent,
+            "model": model,
+            "cached": cached,
+            "ttft_sec": ttft_sec,
+            **{kind: tokens.get(kind, 0) for kind in TOKEN_KINDS},
+            "cost_usd": round(0.0 if cached else price(model, tokens, discount), 6),
+            **attrs,
+        })
+        span.end = end
+        return span
+
+    def export_calls(self, agent: str) -> list[dict]:
+        """家臣の呼び出しのスパンを、別のプロセスの軍議へ渡す形（name / start / end / attrs）にする"""
+        with self._lock:
+            calls = [s for s in self.spans if s.kind == "call" and s.attrs.get("agent") == agent]
+        return [{"name": s.name, "start": s.start, "end": s.end, "attrs": s.attrs} for s in calls]
+
+    def adopt_calls(self, agent: str, calls: Iterable[dict]) -> list[Span]:
+        """別のプロセス（war_council.py worker）で記録された呼び出しを、この軍議の家臣のスパンの下に付け直す"""
+        with self._lock:
+            parent = self._open_agents.get(agent, self.council)
+        adopted = []
+        for call in calls:
+            span = self._new("call", call["name"], call["start"], parent, parent.lane if parent else 0,
+                             dict(call["attrs"], agent=agent))
+            span.end = call["end"]
+            adopted.append(span)
+        return adopted
+
+    def agent_spans(self) -> list[Span]:
+        return [s for s in self.spans if s.kind == "agent"]
+
+    def totals(self, spans: Optional[list[Span]] = None) -> dict:
+        """トークン・費用の合計（既定は全家臣）"""
+        spans = self.agent_spans() if spans is None else spans
+        totals = {kind: sum(s.attrs.get(kind, 0) for s in spans) for kind in TOKEN_KINDS}
+        totals["cost_usd"] = round(sum((s.attrs.get("cost_usd", 0.0) for s in spans), 0.0), 6)
+        return totals
+
+    def write(self, root: Path) -> tuple[Path, Path]:
+        """trace.jsonl と trace.chrome.json を作業場に書き出す"""
+        jsonl_path, chrome_path = root / "trace.jsonl", root / "trace.chrome.json"
+        jsonl_path.write_text(to_jsonl(self.spans, self.run_id), encoding="utf-8")
+        chrome_path.write_text(json.dumps(to_chrome(self.spans), ensure_ascii=False), encoding="utf-8")
+        return jsonl_path, chrome_path
+
+
+def to_jsonl(spans: Iterable[Span], run_id: str) -> str:
+    return "".join(
+        json.dumps({"run_id": run_id, **asdict(span), "duration": round(span.duration, 6)}, ensure_ascii=False) + "\n"
+        for span in sorted(spans, key=lambda s: (s.start, s.span_id))
+    )
+
+
+def load_jsonl(path: Path) -> list[Span]:
+    spans = []
+    with path.open(encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                data = json.loads(line)
+                data.pop("run_id", None)
+                data.pop("duration", None)
+                spans.append(Span(**data))
+    return spans
+
+
+def _sublanes(spans: list[Span]) -> dict[int, int]:
+    """同じ家臣の中で時間の重なる呼び出しを別の段に振り分ける（Chrome trace は段ごとに入れ子が前提）"""
+    ends: list[float] = []
+    assigned = {}
+    for span in sorted(spans, key=lambda s: s.start):
+        for index, end in enumerate(ends):
+            if end <= span.start:
+                break
+        else:
+            index = len(ends)
+            ends.append(0.0)
+        ends[index] = span.end or span.start
+        assigned[span.span_id] = index
+    return assigned
+
+
+def to_chrome(spans: list[Span]) -> dict:
+    """Chrome trace-event 形式（"X" 完了イベント。時刻は軍議開始からのマイクロ秒）"""
+    if not spans:
+        return {"traceEvents": []}
+    origin = min(s.start for s in spans)
+    events = []
+    lanes: dict[int, list[Span]] = {}
+    for span in spans:
+        if span.kind == "call":
+            lanes.setdefault(span.lane, []).append(span)
+    sublane = {}
+    for members in lanes.values():
+        sublane.update(_sublanes(members))
+
+    names = {0: "軍議"}
+    for span in spans:
+        tid = span.lane * LANE_WIDTH + sublane.get(span.span_id, 0)
+        if span.kind == "agent":
+            names[tid] = span.attrs.get("name_jp", span.name)
+        events.append({
+            "name": span.name,
+            "cat": span.kind,
+            "ph": "X",
+            "ts": round((span.start - origin) * 1e6),
+            "dur": round(span.duration * 1e6),
+            "pid": 1,
+            "tid": tid,
+            "args": span.attrs,
+        })
+    for span in spans:
+        if span.kind == "call":
+            tid = span.lane * LANE_WIDTH + sublane.get(span.span_id, 0)
+            names.setdefault(tid, f"{names.get(span.lane * LANE_WIDTH, span.attrs.get('agent', ''))}・{sublane[span.span_id]}")
+    events += [
+        {"name": "thread_name", "ph": "M", "pid": 1, "tid": tid, "args": {"name": name}}
+        for tid, name in sorted(names.items())
+    ]
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+def _quantile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(q * len(ordered))) - 1))] if ordered else 0.0
+
+
+def _labels(**labels) -> str:
+    return "{" + ",".join(f'{k}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+                          for k, v in labels.items()) + "}"
+
+
+def to_prometheus(spans: Iterable[Span]) -> str:
+    """
+    複数の軍議のスパンを家臣ごとに集計し、Prometheus の text-file 形式にする
+    （node_exporter の textfile collector にそのまま置ける）。
+    """
+    spans = list(spans)
+    agents: dict[str, list[Span]] = {}
+    for span in spans:
+        if span.kind == "agent":
+            agents.setdefault(span.name, []).append(span)
+    councils = [s for s in spans if s.kind == "council"]
+
+    lines = [
+        "# HELP castle_agent_duration_seconds 家臣1人分の所要時間",
+        "# TYPE castle_agent_duration_seconds summary",
+    ]
+    for name, members in sorted(agents.items()):
+        durations = [s.duration for s in members]
+        for q in (0.5, 0.95, 0.99):
+            lines.append(f"castle_agent_duration_seconds{_labels(agent=name, quantile=q)} {_quantile(durations, q):.6f}")
+        lines.append(f"castle_agent_duration_seconds_sum{_labels(agent=name)} {sum(durations):.6f}")
+        lines.append(f"castle_agent_duration_seconds_count{_labels(agent=name)} {len(durations)}")
+
+    lines += ["# HELP castle_agent_tokens_total 家臣ごとのトークン数", "# TYPE castle_agent_tokens_total counter"]
+    for name, members in sorted(agents.items()):
+        for kind in TOKEN_KINDS:
+            total = sum(s.attrs.get(kind, 0) for s in members)
+            lines.append(f"castle_agent_tokens_total{_labels(agent=name, kind=kind.removesuffix('_tokens'))} {total}")
+
+    counters = [
+        ("castle_agent_cost_usd_total", "家臣ごとの費用の概算（USD）", "cost_usd"),
+        ("castle_agent_calls_total", "家臣ごとの API 呼び出し数", "calls"),
+        ("castle_agent_cache_hits_total", "家臣ごとの蔵出し数", "cache_hits"),
+        ("castle_agent_retries_total", "家臣ごとの再試行数", "retries"),
+        ("castle_agent_hedges_total", "家臣ごとの二の矢の数", "hedges"),
+        ("castle_agent_bytes_read_total", "家臣ごとに読んだ入力のバイト数", "bytes_read"),
+        ("castle_agent_prompt_bytes_total", "家臣ごとに送ったプロンプトのバイト数", "prompt_bytes"),
+        ("castle_agent_bytes_written_total", "家臣ごとに書いた出力のバイト数", "bytes_written"),
+    ]
+    for metric, help_text, key in counters:
+        lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} counter"]
+        for name, members in sorted(agents.items()):
+            total = sum(s.attrs.get(key) or 0 for s in members)
+            lines.append(f"{metric}{_labels(agent=name)} {round(total, 6)}")
+
+    lines += ["# HELP castle_councils_total 軍議の数", "# TYPE castle_councils_total counter"]
+    for status in (True, False):
+        count = sum(1 for s in councils if bool(s.attrs.get("success")) is status)
+        lines.append(f"castle_councils_total{_labels(status='success' if status else 'failed')} {count}")
+    durations = [s.duration for s in councils]
+    lines += ["# HELP castle_council_duration_seconds 軍議1回分の所要時間",
+              "# TYPE castle_council_duration_seconds summary"]
+    for q in (0.5, 0.95, 0.99):
+        lines.append(f"castle_council_duration_seconds{_labels(quantile=q)} {_quantile(durations, q):.6f}")
+    lines.append(f"castle_council_duration_seconds_sum {sum(durations):.6f}")
+    lines.append(f"castle_council_duration_seconds_count {len(durations)}")
+    lines += ["# HELP castle_council_cost_usd_total 軍議の費用の概算（USD）", "# TYPE castle_council_cost_usd_total counter",
+              f"castle_council_cost_usd_total {round(sum(s.attrs.get('cost_usd', 0.0) for s in councils), 6)}"]
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus(spans: Iterable[Span], path: Path):
+    """text-file collector が読みかけを拾わないよう、一時ファイルに書いてから差し替える"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    tmp_path.write_text(to_prometheus(spans), encoding="utf-8")
+    tmp_path.replace(path)
+
+
+def summarize(spans: list[Span]) -> str:
+    """家臣ごとの所要時間・トークン・費用の表（所要時間の長い順）"""
+    rows = ["| 家臣 | 回数 | p50 | p95 | 入力 | 出力 | 費用 (USD) |", "|---|---:|---:|---:|---:|---:|---:|"]
+    agents: dict[str, list[Span]] = {}
+    for span in spans:
+        if span.kind == "agent":
+            agents.setdefault(span.name, []).append(span)
+    for name, members in sorted(agents.items(), key=lambda item: -_quantile([s.duration for s in item[1]], 0.95)):
+        durations = [s.duration for s in members]
+        rows.append(
+            f"| {members[0].attrs.get('name_jp', name)} | {len(members)} | {_quantile(durations, 0.5):.1f}s | "
+            f"{_quantile(durations, 0.95):.1f}s | {sum(s.attrs.get('input_tokens', 0) for s in members):,} | "
+            f"{sum(s.attrs.get('output_tokens', 0) for s in members):,} | "
+            f"{sum(s.attrs.get('cost_usd', 0.0) for s in members):.4f} |"
+        )
+    return "\n".join(rows)
+
+
+def main():
+    args = sys.argv[1:]
+    prometheus_path = None
+    if "--prometheus" in args:
+        index = args.index("--prometheus")
+        if index + 1 >= len(args):
+            print("Usage: python castle_trace.py <trace.jsonl>... [--prometheus <出力.prom>]")
+            sys.exit(2)
+        prometheus_path = Path(args[index + 1])
+        del args[index:index + 2]
+    if not args:
+        print("Usage: python castle_trace.py <trace.jsonl>... [--prometheus <出力.prom>]")
+        sys.exit(2)
+    spans = [span for arg in args for span in load_jsonl(Path(arg))]
+    print(summarize(spans))
+    if prometheus_path is not None:
+        write_prometheus(spans, prometheus_path)
+        print(f"\n→ {prometheus_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,323 @@
+"""
+Vault の索引 — Strategy / Template / Assets から持ち場とテーマに効く抜粋だけを選ぶ
+
+これまでは Strategy.md・Templates/Article.md・Assets/Assets.md を丸ごと家臣 1〜4 と家老に渡していたため、
+Vault が育つほどプロンプトが大きくなり、最初の一字までの待ち時間も延びていた。ここでは
+
+    - 各ファイルを見出し単位の抜粋（chunk）に切る（長い節は段落の切れ目でさらに切る）
+    - 抜粋の語を数えて BM25 の索引を作る。日本語は分かち書きせず文字の 2-gram、英数字は単語で数える
+    - 索引は JSON でディスクに置き、元のファイルの mtime・大きさが変わったときだけ作り直す
+    - 問い（テーマ＋持ち場の言葉）に効く抜粋を上位 top_k 件まで、トークン数の予算に収まるだけ選ぶ
+      （選んだ抜粋は元のファイルの順に並べ直すので、同じ問いなら同じ並びになる）
+
+war_council.py からは家臣ごとの Agent.vault_budget・vault_query で使う（--vault-top-k 0 で丸ごと渡す）。
+
+Usage:
+    python castle_vault.py "テーマ ペルソナ 読者"                    # 上位の抜粋と点数
+    python castle_vault.py "テーマ" --top-k 5 --budget 1500 --vault ~/claude-vault --rebuild
+"""
+
+import argparse
+import json
+import math
+import os
+import re
+import sys
+import threading
+from collections import Counter
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Iterable, Optional
+
+# 索引に載せる Vault 資料（Vault ルートからの相対パスと、プロンプトでの見出し）
+VAULT_SOURCES = (
+    ("Strategy/Strategy.md", "Strategy.md（執筆戦略ガイド）"),
+    ("Templates/Article.md", "Article Template"),
+    ("Assets/Assets.md", "Assets（表現集）"),
+)
+
+# 索引の形を変えたら上げる（古い索引は作り直す）
+INDEX_VERSION = 1
+
+# 1つの抜粋の大きさの上限（トークンの概算）
+CHUNK_MAX_TOKENS = 400
+
+# BM25 の係数
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_HEADING = re.compile(r"^\s{0,3}(#{1,6})\s+(.*?)\s*#*\s*$")
+_FENCE = re.compile(r"^\s{0,3}(`{3,}|~{3,})")
+_WORD = re.compile(r"[A-Za-z0-9][A-Za-z0-9_\-]*")
+_CJK = re.compile(r"[ぁ-ヿ㐀-䶿一-鿿豈-﫿ｦ-ﾟ々〆ー]+")
+
+
+def estimate_tokens(text: str) -> int:
+    """トークン数の概算（war_council.CastleRequestPool.estimate_tokens と同じ見積もり）"""
+    return max(1, len(text) // 2)
+
+
+def terms(text: str) -> list[str]:
+    """索引の語: 英数字は小文字の単語、日本語は文字の 2-gram（1文字だけの並びはその1文字）"""
+    found = [word.lower() for word in _WORD.findall(text)]
+    for run in _CJK.findall(text):
+        found.extend([run] if len(run) == 1 else [run[i:i + 2] for i in range(len(run) - 1)])
+    return found
+
+
+@dataclass
+class Chunk:
+    """抜粋1つ"""
+    source: str  # Vault ルートからの相対パス
+    heading: str  # 見出しの並び（「大見出し > 小見出し」、冒頭の見出しなしの部分は空）
+    text: str
+    position: int  # 元のファイルの中での順番
+    tokens: int = 0
+    tf: dict[str, int] = field(default_factory=dict)
+
+    def __post_init__(self):
+        if not self.tokens:
+            self.tokens = estimate_tokens(self.text)
+        if not self.tf:
+            self.tf = dict(Counter(terms(f"{self.heading}\n{self.text}")))
+
+    @property
+    def length(self) -> int:
+        return sum(self.tf.values())
+
+
+def _split_long(body: list[str], max_tokens: int) -> list[str]:
+    """長い節を段落の切れ目で max_tokens 以下の塊に分ける（1段落で超えるものはそのまま）"""
+    paragraphs, current = [], []
+    for line in body + [""]:
+        if line.strip():
+            current.append(line)
+        elif current:
+            paragraphs.append("\n".join(current))
+            current = []
+    pieces, piece = [], ""
+    for paragraph in paragraphs:
+        candidate = f"{piece}\n\n{paragraph}" if piece else paragraph
+        if piece and estimate_tokens(candidate) > max_tokens:
+            pieces.append(piece)
+            piece = paragraph
+        else:
+            piece = candidate
+    if piece:
+        pieces.append(piece)
+    return pieces
+
+
+def chunk_markdown(text: str, source: str, max_tokens: int = CHUNK_MAX_TOKENS) -> list[Chunk]:
+    """Markdown を見出し単位の抜粋に切る（コードブロックの中の # は見出しとみなさない）"""
+    sections: list[tuple[list[str], list[str]]] = []  # (見出しの並び, 本文の行)
+    path: list[tuple[int, str]] = []
+    body: list[str] = []
+    fence = None
+    for line in text.splitlines():
+        match = _FENCE.match(line)
+        if match:
+            marker = match.group(1)
+            if fence is None:
+                fence = marker
+            elif marker[0] == fence[0] and len(marker) >= len(fence):
+                fence = None
+        heading = _HEADING.match(line) if fence is None else None
+        if heading:
+            sections.append(([title for _, title in path], body))
+            level = len(heading.group(1))
+            path = [(lv, title) for lv, title in path if lv < level] + [(level, heading.group(2))]
+            body = []
+        else:
+            body.append(line)
+    sections.append(([title for _, title in path], body))
+
+    chunks = []
+    for titles, lines in sections:
+        heading = " > ".join(titles)
+        for piece in _split_long(lines, max_tokens):
+            chunks.append(Chunk(source=source, heading=heading, text=piece, position=len(chunks)))
+    return chunks
+
+
+def _stat(path: Path) -> Optional[list[int]]:
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+class VaultIndex:
+    """Vault 資料の抜粋と BM25 の索引"""
+
+    def __init__(self, root: Path, chunks: list[Chunk], sources: dict[str, Optional[list[int]]]):
+        self.root = root
+        self.chunks = chunks
+        self.sources = sources  # 相対パス -> [mtime_ns, size]（ファイルがなければ None）
+        self.df = Counter(term for chunk in chunks for term in chunk.tf)
+        self.avg_length = sum(chunk.length for chunk in chunks) / len(chunks) if chunks else 0.0
+        self._order = {rel: index for index, (rel, _) in enumerate(VAULT_SOURCES)}
+
+    @classmethod
+    def build(cls, root: Path) -> "VaultIndex":
+        chunks, sources = [], {}
+        for rel, _ in VAULT_SOURCES:
+            path = root / rel
+            sources[rel] = _stat(path)
+            if sources[rel] is not None:
+                chunks.extend(chunk_markdown(path.read_text(encoding="utf-8"), rel))
+        return cls(root, chunks, sources)
+
+    def is_fresh(self) -> bool:
+        """元のファイルが索引を作ったときのまま（mtime・大きさが同じ）か"""
+        return all(_stat(self.root / rel) == self.sources.get(rel) for rel, _ in VAULT_SOURCES)
+
+    def to_json(self) -> str:
+        return json.dumps({
+            "version": INDEX_VERSION,
+            "root": str(self.root),
+            "sources": self.sources,
+            "chunks": [asdict(chunk) for chunk in self.chunks],
+        }, ensure_ascii=False)
+
+    @classmethod
+    def from_json(cls, text: str) -> Optional["VaultIndex"]:
+        """索引を読む（形の古いものは None）"""
+        data = json.loads(text)
+        if data.get("version") != INDEX_VERSION:
+            return None
+        return cls(Path(data["root"]), [Chunk(**chunk) for chunk in data["chunks"]], data["sources"])
+
+    def save(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # 別のプロセスが同時に作り直しても tmp が重ならないよう pid を付ける
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        tmp_path.write_text(self.to_json(), encoding="utf-8")
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load_or_build(cls, root: Path, path: Path) -> "VaultIndex":
+        """ディスクの索引が同じ Vault の最新のものならそれを、そうでなければ作り直して置く"""
+        if path.exists():
+            try:
+                index = cls.from_json(path.read_text(encoding="utf-8"))
+            except (OSError, ValueError, KeyError, TypeError):
+                index = None
+            if index is not None and index.root == root and index.is_fresh():
+                return index
+        index = cls.build(root)
+        index.save(path)
+        return index
+
+    def score(self, query_terms: Iterable[str], chunk: Chunk) -> float:
+        total = 0.0
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * chunk.length / (self.avg_length or 1.0))
+        for term in set(query_terms):
+            tf = chunk.tf.get(term, 0)
+            if tf:
+                idf = math.log(1 + (len(self.chunks) - self.df[term] + 0.5) / (self.df[term] + 0.5))
+                total += idf * tf * (BM25_K1 + 1) / (tf + norm)
+        return total
+
+    def search(self, query: str, sources: Optional[Iterable[str]] = None) -> list[tuple[float, Chunk]]:
+        """問いに効く順の (点数, 抜粋)。点数 0 の抜粋は含めない"""
+        allowed = set(sources) if sources is not None else None
+        query_terms = terms(query)
+        scored = [
+            (self.score(query_terms, chunk), chunk)
+            for chunk in self.chunks if allowed is None or chunk.source in allowed
+        ]
+        return sorted(
+            ((score, chunk) for score, chunk in scored if score > 0),
+            key=lambda pair: (-pair[0], self._order.get(pair[1].source, 0), pair[1].position),
+        )
+
+    def select(
+        self,
+        query: str,
+        top_k: int,
+        budget_tokens: int,
+        sources: Optional[Iterable[str]] = None,
+    ) -> list[Chunk]:
+        """
+        問いに効く抜粋を上位 top_k 件まで、予算に収まるだけ選び、元のファイルの順に並べる。
+        効く抜粋が1つもなければ、ファイルの頭から予算に収まるだけ選ぶ。
+        """
+        ranked = [chunk for _, chunk in self.search(query, sources)]
+        if not ranked:
+            allowed = set(sources) if sources is not None else None
+            ranked = [chunk for chunk in self.chunks if allowed is None or chunk.source in allowed]
+        chosen, spent = [], 0
+        for chunk in ranked:
+            if len(chosen) >= top_k:
+                break
+            if spent + chunk.tokens > budget_tokens:
+                continue
+            chosen.append(chunk)
+            spent += chunk.tokens
+        return sorted(chosen, key=lambda chunk: (self._order.get(chunk.source, 0), chunk.position))
+
+
+def render(chunks: list[Chunk]) -> str:
+    """選んだ抜粋をファイルごとの見出しの下にまとめる（_load_vault_context と同じ見出し）"""
+    labels = dict(VAULT_SOURCES)
+    parts: list[str] = []
+    for rel, _ in VAULT_SOURCES:
+        members = [chunk for chunk in chunks if chunk.source == rel]
+        if not members:
+            continue
+        body = "\n\n".join(
+            f"### {chunk.heading}\n\n{chunk.text}" if chunk.heading else chunk.text for chunk in members
+        )
+        parts.append(f"## {labels[rel]}（抜粋）\n\n{body}")
+    return "\n\n---\n\n".join(parts)
+
+
+_indexes: dict[tuple[Path, Path], VaultIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def load_index(root: Path, path: Path) -> VaultIndex:
+    """
+    プロセス内で使い回す索引（常駐の軍議所では全軍議で共有）。
+    呼ぶたびに元のファイルの mtime を確かめ、変わっていればディスクの索引ごと作り直す。
+    """
+    key = (root, path)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None or not index.is_fresh():
+            index = _indexes[key] = VaultIndex.load_or_build(root, path)
+        return index
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Vault の索引を引く（BM25・文字 2-gram）")
+    parser.add_argument("query", type=str, help="問い（テーマ・持ち場の言葉）")
+    parser.add_argument("--vault", type=Path, default=Path(__file__).resolve().parent.parent, help="Vault のルート")
+    parser.add_argument("--index", type=Path, default=None,
+                        help="索引の置き場（デフォルト: castle_floors/vault_index.json）")
+    parser.add_argument("--top-k", type=int, default=8, help="選ぶ抜粋の上限")
+    parser.add_argument("--budget", type=int, default=3000, help="選ぶ抜粋のトークン数の上限")
+    parser.add_argument("--rebuild", action="store_true", help="索引を作り直す")
+    args = parser.parse_args()
+
+    index_path = args.index or Path(__file__).resolve().parent / "castle_floors" / "vault_index.json"
+    if args.rebuild:
+        index_path.unlink(missing_ok=True)
+    index = load_index(args.vault, index_path)
+    if not index.chunks:
+        print(f"無念！Vault 資料が見つかりませぬ: {args.vault}", file=sys.stderr)
+        sys.exit(1)
+
+    chosen = {id(chunk) for chunk in index.select(args.query, args.top_k, args.budget)}
+    print(f"抜粋 {len(index.chunks)}件 | 語 {len(index.df)}種 | 索引: {index_path}\n")
+    print("| 選 | 点数 | 資料 | 見出し | トークン |")
+    print("|---|---:|---|---|---:|")
+    for score, chunk in index.search(args.query)[:max(args.top_k * 2, 10)]:
+        mark = "◎" if id(chunk) in chosen else ""
+        print(f"| {mark} | {score:.2f} | {chunk.source} | {chunk.heading or '（冒頭）'} | {chunk.tokens} |")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+"""
+絵師の先回り — 画像の配置をリンク済み原稿へ移し替える道具
+
+絵師（Eshi）の画像戦略が拠り所にするのは記事の見出し構成であって、公文書係の貼るリンクではない。
+そこで絵師には draft_v2.md が出来た時点で先回りして画像を配置させ（勘定方・公文書係と同時に動く）、
+公文書係が draft_v3_linked.md を仕上げたら、その配置だけを見出し単位で移し替える。
+
+    - 先回りの出力と draft_v2.md を H2 セクションごとに突き合わせ、絵師が挿し込んだ画像の塊を拾う
+    - 各塊を「draft_v2.md のどの行の直前に入ったか」で覚え、リンク済み原稿の同じ見出しの同じ位置へ入れる
+    - 見出しが変わっていれば（絵師が見出しを変えた・公文書係の後で見出しが消えた）移し替えは諦める
+
+移し替えられなければ呼び出し側は従来どおり draft_v3_linked.md を絵師に渡し直す。
+
+Usage:
+    python castle_visuals.py <draft_v2.md> <絵師の先回り出力> <draft_v3_linked.md>
+"""
+
+import difflib
+import re
+import sys
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional
+
+from castle_sections import Section, split_sections
+
+# 絵師が挿し込む行（画像タグ・プレースホルダー）
+_IMAGE = re.compile(r"!\[[^\]]*\]\([^)]*\)")
+_PLACEHOLDER = re.compile(r"\[ここに画像を挿入[^\]]*\]")
+
+
+@dataclass
+class Visual:
+    """絵師が挿し込んだ塊1つ（point は元原稿のセクション内で、この行の直前に入ったという位置）"""
+    anchor: str
+    point: int
+    lines: list[str]
+
+
+@dataclass
+class ReanchorResult:
+    """移し替えの結果（text が None なら移し替えられなかった）"""
+    text: Optional[str]
+    visuals: list[Visual] = field(default_factory=list)
+    reason: str = ""
+
+
+def _lines(text: str) -> list[str]:
+    return text.splitlines(keepends=True)
+
+
+def is_visual(line: str) -> bool:
+    return bool(_IMAGE.search(line) or _PLACEHOLDER.search(line))
+
+
+def extract_visuals(source: Section, decorated: Section) -> list[Visual]:
+    """
+    同じ見出しの区画同士を比べ、絵師が新たに挿し込んだ塊のうち画像を含むものを返す。
+    本文の書き換え（replace）は拾わない — 先回りで持ち帰るのは画像の配置だけである。
+    """
+    before, after = _lines(source.text), _lines(decorated.text)
+    matcher = difflib.SequenceMatcher(None, before, after, autojunk=False)
+    return [
+        Visual(source.anchor, i1, after[j1:j2])
+        for tag, i1, _, j1, j2 in matcher.get_opcodes()
+        if tag == "insert" and any(is_visual(line) for line in after[j1:j2])
+    ]
+
+
+def _trailing_blanks(lines: list[str]) -> int:
+    """区画の末尾の空行（次の見出しとの区切り）の行数"""
+    count = 0
+    while count < len(lines) and not lines[len(lines) - 1 - count].strip():
+        count += 1
+    return count
+
+
+def _point_map(before: list[str], after: list[str]) -> list[int]:
+    """
+    before の各挿入位置（0〜len）が after のどこに当たるか。
+    区画の末尾の空行のあたりは、後ろから数えて対応させる（before が原稿の最後の区画で空行を持たなくても、
+    末尾への挿入は after の区切りの空行より前に入る）。
+    """
+    points = [0] * (len(before) + 1)
+    matcher = difflib.SequenceMatcher(None, before, after, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        for k in range(i2 - i1):
+            # 書き換えられた行（公文書係のリンク付与）は行数が同じなら一行ずつ対応させる
+            points[i1 + k] = j1 + k if tag == "equal" or (i2 - i1) == (j2 - j1) else min(j1 + k, j2)
+    before_tail, after_tail = _trailing_blanks(before), _trailing_blanks(after)
+    for k in range(before_tail + 1):
+        points[len(before) - before_tail + k] = min(len(after) - after_tail + k, len(after))
+    return points
+
+
+def _align(source: list[Section], target: list[Section]) -> Optional[dict[int, int]]:
+    """
+    source の各区画が target のどの区画に当たるかを見出しで決める。
+    target 側にだけある区画（公文書係が足した出典セクションなど）は飛ばしてよいが、
+    source の見出しが1つでも見つからない・順序が入れ替わっていれば None。
+    """
+    mapping: dict[int, int] = {}
+    cursor = 0
+    for index, section in enumerate(source):
+        while cursor < len(target) and target[cursor].anchor != section.anchor:
+            cursor += 1
+        if cursor == len(target):
+            return None
+        mapping[index] = cursor
+        cursor += 1
+    return mapping
+
+
+def reanchor_visuals(source: str, decorated: str, target: str) -> ReanchorResult:
+    """
+    先回りの出力（decorated）から画像の配置を拾い、target の同じ見出しの下へ移し替える。
+
+    Args:
+        source: 絵師が先回りで読んだ原稿（draft_v2.md）
+        decorated: 絵師の先回りの出力
+        target: 本来の入力（draft_v3_linked.md）
+
+    元原稿の最後の区画の末尾に入った画像は、target で後ろに区画が続いても、その見出しとの間に空行を1つ残す:
+
+    >>> source = "## A\\n\\npara a\\n\\n## B\\n\\npara b1\\n"
+    >>> decorated = source + "\\n[ここに画像を挿入: b]\\n"
+    >>> target = "## A\\n\\npara a\\n\\n## B\\n\\npara b1\\n\\n## 出典\\n\\n- x\\n"
+    >>> print(reanchor_visuals(source, decorated, target).text)
+    ## A
+    <BLANKLINE>
+    para a
+    <BLANKLINE>
+    ## B
+    <BLANKLINE>
+    para b1
+    <BLANKLINE>
+    [ここに画像を挿入: b]
+    <BLANKLINE>
+    ## 出典
+    <BLANKLINE>
+    - x
+    <BLANKLINE>
+    """
+    source_sections, decorated_sections = split_sections(source), split_sections(decorated)
+    if [s.anchor for s in source_sections] != [s.anchor for s in decorated_sections]:
+        return ReanchorResult(None, reason="絵師が見出しを改めております")
+    target_sections = split_sections(target)
+    mapping = _align(source_sections, target_sections)
+    if mapping is None:
+        return ReanchorResult(None, reason="公文書係の後で見出しが変わっております")
+
+    visuals: list[Visual] = []
+    texts = [s.text for s in target_sections]
+    for index, (plain, decorated_section) in enumerate(zip(source_sections, decorated_sections)):
+        found = extract_visuals(plain, decorated_section)
+        if not found:
+            continue
+        visuals += found
+        lines = _lines(texts[mapping[index]])
+        if lines and not lines[-1].endswith("\n"):
+            lines[-1] += "\n"
+        points = _point_map(_lines(plain.text), lines)
+        # 後ろの挿入から入れていけば、前の挿入位置はずれない
+        last = mapping[index] == len(target_sections) - 1
+        for visual in sorted(found, key=lambda v: v.point, reverse=True):
+            at = points[visual.point]
+            block = list(visual.lines)
+            # 区画の末尾に入れた塊は、次の見出しとの間に空行を1つ残す
+            if not last and at == len(lines) and block[-1].strip():
+                block.append("\n")
+            lines[at:at] = block
+        texts[mapping[index]] = "".join(lines)
+    if not visuals:
+        return ReanchorResult(None, reason="先回りの出力に画像の配置がございませぬ")
+    text = "".join(texts)
+    if not target.endswith("\n"):
+        text = text.rstrip("\n")
+    return ReanchorResult(text, visuals)
+
+
+def main():
+    if len(sys.argv) != 4:
+        print("Usage: python castle_visuals.py <draft_v2.md> <絵師の先回り出力> <draft_v3_linked.md>")
+        sys.exit(2)
+    source, decorated, target = (Path(arg).read_text(encoding="utf-8") for arg in sys.argv[1:])
+    result = reanchor_visuals(source, decorated, target)
+    if result.text is None:
+        print(f"移し替えられませぬ: {result.reason}", file=sys.stderr)
+        sys.exit(1)
+    print(result.text, end="")
+
+
+if __name__ == "__main__":
+    main()
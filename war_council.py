@@ -13,18 +13,60 @@ Usage:
     python war_council.py "テーマ"
     python war_council.py "テーマ" --model claude-sonnet-4-20250514
     python war_council.py "テーマ" --dry-run
+    python war_council.py "テーマ" --max-parallel 4
+    python war_council.py "テーマ" --async --max-in-flight 8 --rpm 50 --tpm 40000
+    python war_council.py --themes-file themes.txt --batch-concurrency 8
+    python war_council.py "テーマ" --section-parallel --diff-rewrite
+    python war_council.py "テーマ" --max-review-rounds 3 --review-budget-sec 300
+    python war_council.py "テーマ" --speculate
+    python war_council.py "テーマ" --routing routing.toml
+    python war_council.py "テーマ" --refresh-agent Joudai
+    python war_council.py --resume 20250101_120000_abc123
+    python war_council.py --rebuild-from castle_floors/runs/<run_id>/04_writing_room/draft_v2.md
 """
 
 import os
 import sys
 import json
+import hashlib
 import time
+import random
+import asyncio
 import argparse
+import secrets
+import threading
 import datetime
+import importlib
+import itertools
+import signal
+import socket
+import socketserver
+import urllib.parse
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from concurrent.futures import Future, ThreadPoolExecutor, FIRST_COMPLETED, wait
 from pathlib import Path
-from dataclasses import dataclass, field
+from dataclasses import asdict, dataclass, field, replace
 from enum import Enum
-from typing import Optional
+from typing import Callable, Generator, Optional
+
+from castle_counter import count_markdown, render_report
+from castle_lint import lint_markdown, render_defects
+from castle_sections import (
+    SEVERITY_WEIGHTS, SMOOTH_SYSTEM_PROMPT, Critique, Outline, RewritePlan, apply_smoothing,
+    build_smoothing_request, change_ratio, ensure_heading, header_message, join_sections, parse_critique,
+    parse_outline, plan_rewrite, rewrite_message, section_message, splice_rewrite,
+)
+from castle_visuals import reanchor_visuals
+from castle_trace import BATCH_DISCOUNT, TOKEN_KINDS, Tracer, write_prometheus
+from castle_batch import LocalBatchServer
+from castle_cassette import Cassette, Distribution, ReplayTiming
+from castle_vault import VAULT_SOURCES, load_index, render as render_vault_chunks
+from castle_queue import STATUSES as JOB_STATUSES, DEFAULT_LEASE_SEC, Job, JobQueue, Task, TaskQueue, parse_deadline
+from castle_links import (
+    RESOLVE_SYSTEM_PROMPT, apply_resolutions, build_resolve_request, link_draft, parse_fact_sheet,
+)
 
 # ---------------------------------------------------------------------------
 # 基本設定
@@ -35,17 +77,77 @@ AGENTS_DIR = BASE_DIR / "agents"
 CASTLE_FLOORS = BASE_DIR / "castle_floors"
 VAULT_ROOT = BASE_DIR.parent  # claude-vault のルート
 
-# 作業ディレクトリ
-FLOOR_STRATEGY = CASTLE_FLOORS / "01_strategy"
-FLOOR_BLUEPRINT = CASTLE_FLOORS / "02_blueprint"
-FLOOR_LIBRARY = CASTLE_FLOORS / "03_library"
-FLOOR_WRITING = CASTLE_FLOORS / "04_writing_room"
-FLOOR_TENSHUKAKU = CASTLE_FLOORS / "05_tenshukaku"
-FLOOR_GALLERY = CASTLE_FLOORS / "06_gallery"
+# 軍議ごとの作業場（castle_floors/runs/<run_id>/）
+RUNS_DIR = CASTLE_FLOORS / "runs"
+
+# エージェント出力の蔵（全軍議で共有）
+CACHE_DIR = CASTLE_FLOORS / "cache"
+DEFAULT_CACHE_MAX_AGE_DAYS = 7
+DEFAULT_CACHE_MAX_MB = 200
+
+# 作業フロア（各作業場の直下に置くディレクトリ名）
+FLOOR_STRATEGY = "01_strategy"
+FLOOR_BLUEPRINT = "02_blueprint"
+FLOOR_LIBRARY = "03_library"
+FLOOR_WRITING = "04_writing_room"
+FLOOR_TENSHUKAKU = "05_tenshukaku"
+FLOOR_GALLERY = "06_gallery"
+ALL_FLOORS = [
+    FLOOR_STRATEGY, FLOOR_BLUEPRINT, FLOOR_LIBRARY,
+    FLOOR_WRITING, FLOOR_TENSHUKAKU, FLOOR_GALLERY,
+]
+
+# 家老の検分対象と納品物
+KARO_INPUT_REL = f"{FLOOR_TENSHUKAKU}/final_draft.md"
+KARO_OUTPUT_REL = f"{FLOOR_TENSHUKAKU}/FINAL_ARTICLE.md"
 
-# デフォルトモデル
+# デフォルトモデル（標準格。--model で差し替える）
 DEFAULT_MODEL = "claude-sonnet-4-20250514"
 
+# モデルの格付け（standard は --model に従う。--routing の [tiers] で差し替えられる）
+MODEL_TIERS = {
+    "fast": "claude-3-5-haiku-20241022",
+    "standard": DEFAULT_MODEL,
+    "premium": "claude-opus-4-20250514",
+}
+
+# 御意見番 → 代筆の推敲を繰り返す上限と打ち切り条件（デフォルト）
+DEFAULT_MAX_REVIEW_ROUNDS = 1
+DEFAULT_REVIEW_THRESHOLD = SEVERITY_WEIGHTS["△"]
+DEFAULT_REVIEW_MIN_CHANGE = 0.02
+
+# 同時に動員できる家臣の上限（デフォルト）
+DEFAULT_MAX_PARALLEL = 4
+
+# asyncio 経路で同時に飛ばせる API リクエストの上限（デフォルト）
+DEFAULT_MAX_IN_FLIGHT = 8
+
+# 一時的な API エラー（過負荷・混雑など）の再試行回数と待ち時間の上限（デフォルト）
+DEFAULT_MAX_RETRIES = 4
+DEFAULT_RETRY_MAX_DELAY = 60.0
+
+# 二重発注（hedged request）: p95 が測れるまでは、この秒数で返事がなければ二の矢を放つ
+DEFAULT_HEDGE_AFTER = 30.0
+
+# 遮断器: 同じモデルでこの回数続けて倒れたら、しばらく代わりのモデルへ回す
+DEFAULT_BREAKER_THRESHOLD = 5
+DEFAULT_BREAKER_COOLDOWN = 60.0
+
+# Message Batches（--batch-api）: 新しい依頼がこの秒数途絶えたら束を出し、この間隔で処理の終わりを問い合わせる
+DEFAULT_BATCH_GATHER_WINDOW = 2.0
+DEFAULT_BATCH_POLL_INTERVAL = 30.0
+
+# 1つの束に入れられる依頼の数と大きさ（API の上限）
+BATCH_MAX_REQUESTS = 100_000
+BATCH_MAX_BYTES = 256 * 1024 * 1024
+
+# Vault 資料の索引の置き場と、家臣1人に添える抜粋の上限（0 なら資料を丸ごと添える）
+VAULT_INDEX_PATH = CASTLE_FLOORS / "vault_index.json"
+DEFAULT_VAULT_TOP_K = 8
+
+# 持ち場帳（--task-queue）: 軍議が働き手の片付けを確かめる間隔（秒）
+TASK_POLL_INTERVAL = 0.5
+
 # ログ用の色（ANSI）
 class Color:
     RESET = "\033[0m"
@@ -78,6 +180,39 @@ class Phase(Enum):
 # エージェント定義
 # ---------------------------------------------------------------------------
 
+@dataclass
+class ModelRoute:
+    """
+    家臣ごとのモデルの格と出力の枠。
+    output_ratio を持つ家臣（原稿を受け取って原稿を返す者）は、入力の長さから出力上限を見積もる。
+    """
+    tier: str = "standard"
+    max_tokens: int = 8192
+    temperature: float = 0.7
+    output_ratio: Optional[float] = None  # 入力トークンの概算に掛ける倍率（None なら常に max_tokens）
+    min_tokens: int = 1024
+    model: Optional[str] = None  # 格を使わずにモデルを名指しする場合
+
+    def budget(self, input_tokens: int) -> int:
+        """この呼び出しの max_tokens"""
+        if self.output_ratio is None:
+            return self.max_tokens
+        return max(self.min_tokens, min(self.max_tokens, int(input_tokens * self.output_ratio)))
+
+
+@dataclass
+class PreGate:
+    """API を呼ぶ前に手元で済ませた下検分の結果"""
+    inputs: dict[str, Optional[str]]  # 手直し後の入力（API にはこちらを渡す）
+    output: Optional[str] = None  # 手元で決着した場合の出力（None なら API へ回す）
+    notes: str = ""  # API に渡す残件（ユーザーメッセージの末尾に添える）
+    reports: dict[str, str] = field(default_factory=dict)  # 作業場に書き出す付帯資料（相対パス → 内容）
+    summary: str = ""  # 軍議ログに残す手元処理の結果
+    # 指令書どおりの依頼の代わりに送る小さな依頼（call_agent の引数）と、その返答から出力を組み立てる処理
+    request: Optional[dict] = None
+    finish: Optional[Callable[[str], str]] = None
+
+
 @dataclass
 class Agent:
     """家臣団のメンバー定義"""
@@ -88,24 +223,113 @@ class Agent:
     prompt_file: str
     input_files: list = field(default_factory=list)
     output_file: str = ""
-    output_dir: Path = FLOOR_STRATEGY
+    floor: str = FLOOR_STRATEGY
     phase: Phase = Phase.STRATEGY
+    # API を呼ばずに手元で出力を作る家臣の処理（入力ファイルの内容 → 出力本文）
+    local_executor: Optional[Callable[[dict[str, Optional[str]]], str]] = None
+    # API の前に手元で入力を検分し、決着すれば API を呼ばずに済ませる処理
+    pre_gate: Optional[Callable[[dict[str, Optional[str]]], PreGate]] = None
+    # --section-parallel 時に H2 セクションごとに手分けして書かせる家臣
+    section_parallel: bool = False
+    # --diff-rewrite 時に批評で指摘のあったセクションだけを書き直させる家臣
+    section_rewrite: bool = False
+    # --max-review-rounds が 2 以上のとき、書き上げた後に御意見番との推敲を繰り返す家臣
+    review_loop: bool = False
+    # --speculate 時、本来の入力より先に出来る原稿で先回りして動かせる家臣の、その原稿
+    speculative_input: str = ""
+    # モデルの格・出力上限・温度（--routing で差し替えられる）
+    route: ModelRoute = field(default_factory=ModelRoute)
+    # Vault 資料から添える抜粋のトークン数の上限（0 なら添えない）と、抜粋を選ぶ問いに足す持ち場の言葉
+    vault_budget: int = 0
+    vault_query: str = ""
 
     @property
     def prompt_path(self) -> Path:
         return AGENTS_DIR / self.prompt_file
 
     @property
-    def output_path(self) -> Path:
-        return self.output_dir / self.output_file
+    def output_rel(self) -> str:
+        """作業場からの相対パス（input_files と同じ表記）"""
+        return f"{self.floor}/{self.output_file}"
+
+    def output_path(self, workspace: "CastleWorkspace") -> Path:
+        return workspace.path(self.output_rel)
 
     def load_system_prompt(self) -> str:
         """System Promptファイルを読み込む"""
-        if self.prompt_path.exists():
-            return self.prompt_path.read_text(encoding="utf-8")
+        content = read_warm(self.prompt_path)
+        if content is not None:
+            return content
         raise FileNotFoundError(f"無念！{self.name_jp}の指令書が見つかりませぬ: {self.prompt_path}")
 
 
+def kanjyo_count(inputs: dict[str, Optional[str]]) -> str:
+    """勘定方の算盤: draft_v2.md を手元で数え、count_report.md を書き上げる"""
+    draft = inputs.get(f"{FLOOR_WRITING}/draft_v2.md")
+    if draft is None:
+        raise FileNotFoundError("帳簿（draft_v2.md）が届いておりませぬ")
+    return render_report(count_markdown(draft.splitlines()), "draft_v2.md")
+
+
+def joudai_pre_gate(inputs: dict[str, Optional[str]]) -> PreGate:
+    """
+    城代の下検分: draft_v4_visuals.md の形式不備を機械的に洗い出し、直せるものは直す。
+    重大な残件がなければ API を呼ばずに final_draft.md とし、残れば残件だけを城代に渡す。
+    """
+    source_rel = f"{FLOOR_WRITING}/draft_v4_visuals.md"
+    draft = inputs.get(source_rel)
+    if draft is None:
+        raise FileNotFoundError("検分対象（draft_v4_visuals.md）が届いておらぬ")
+    result = lint_markdown(draft.splitlines())
+    if any(d.rule == "empty" for d in result.residual):
+        raise ValueError("draft_v4_visuals.md に本文がない。即刻差し戻す")
+
+    fixed = len(result.defects) - len(result.residual)
+    gate = PreGate(
+        inputs={**inputs, source_rel: result.text},
+        reports={f"{FLOOR_TENSHUKAKU}/gate_lint.json": result.to_json()},
+        summary=f"不備 {len(result.defects)}件（自動修正 {fixed}件・残件 {len(result.residual)}件）",
+    )
+    if result.passed:
+        gate.output = result.text
+    else:
+        gate.notes = (
+            "## 下検分の残件\n\n"
+            "機械検分で直せなかった不備は以下のとおり（それ以外の形式は検分・修正済み）。\n"
+            "これらを直した原稿全文を final_draft.md として出力せよ。\n\n"
+            f"{render_defects(result.residual)}"
+        )
+    return gate
+
+
+def kobunsho_pre_gate(inputs: dict[str, Optional[str]]) -> PreGate:
+    """
+    公文書係の下ごしらえ: fact_sheet.md の出典台帳から手元でリンクを貼る。
+    出典の付かなかった主張が残った場合だけ、その主張と出典一覧を小さな依頼にして API に回す。
+    """
+    draft = inputs.get(f"{FLOOR_WRITING}/draft_v2.md")
+    if draft is None:
+        raise FileNotFoundError("リライト済み原稿（draft_v2.md）が届いておりませぬ")
+    index = parse_fact_sheet((inputs.get(f"{FLOOR_LIBRARY}/fact_sheet.md") or "").splitlines())
+    result = link_draft(draft.splitlines(), index)
+
+    gate = PreGate(
+        inputs=inputs,
+        summary=f"出典 {len(index.sources)}件 | 紐付け {len(result.linked)}件・未解決 {len(result.unresolved)}件",
+    )
+    if not (result.unresolved and index.sources):
+        gate.output = result.text
+        return gate
+    gate.request = {
+        "system_prompt": RESOLVE_SYSTEM_PROMPT,
+        "user_message": build_resolve_request(result.unresolved, index),
+        "max_tokens": 1024,
+        "temperature": 0.0,
+    }
+    gate.finish = lambda response: apply_resolutions(result.text, result.unresolved, response, index)[0]
+    return gate
+
+
 # 家臣団の定義（実行順序通り）
 RETAINERS = [
     Agent(
@@ -114,8 +338,11 @@ RETAINERS = [
         prompt_file="01_gunshi_persona.md",
         input_files=[],
         output_file="persona.md",
-        output_dir=FLOOR_STRATEGY,
+        floor=FLOOR_STRATEGY,
         phase=Phase.STRATEGY,
+        route=ModelRoute(tier="standard", max_tokens=4096),
+        vault_budget=3000,
+        vault_query="ペルソナ 読者 ターゲット 悩み 戦略 トーン 文体",
     ),
     Agent(
         number=2, name_jp="乱波・忍", name_en="Shinobi",
@@ -123,8 +350,11 @@ RETAINERS = [
         prompt_file="02_shinobi_keywords.md",
         input_files=["01_strategy/persona.md"],
         output_file="keywords.md",
-        output_dir=FLOOR_STRATEGY,
+        floor=FLOOR_STRATEGY,
         phase=Phase.STRATEGY,
+        route=ModelRoute(tier="fast", max_tokens=4096),
+        vault_budget=1500,
+        vault_query="キーワード 検索 意図 SEO 戦略",
     ),
     Agent(
         number=3, name_jp="物見", name_en="Monomi",
@@ -132,8 +362,11 @@ RETAINERS = [
         prompt_file="03_monomi_serp.md",
         input_files=["01_strategy/keywords.md"],
         output_file="serp_analysis.md",
-        output_dir=FLOOR_STRATEGY,
+        floor=FLOOR_STRATEGY,
         phase=Phase.STRATEGY,
+        route=ModelRoute(tier="fast", max_tokens=4096),
+        vault_budget=1500,
+        vault_query="上位 競合 記事 分析 差別化 検索",
     ),
     Agent(
         number=4, name_jp="作事奉行", name_en="Sakuji",
@@ -145,8 +378,11 @@ RETAINERS = [
             "01_strategy/serp_analysis.md",
         ],
         output_file="structure_draft.md",
-        output_dir=FLOOR_BLUEPRINT,
+        floor=FLOOR_BLUEPRINT,
         phase=Phase.STRUCTURE,
+        route=ModelRoute(tier="standard"),
+        vault_budget=3000,
+        vault_query="構成 見出し 導入 まとめ テンプレート 表現",
     ),
     Agent(
         number=5, name_jp="目付", name_en="Metsuke",
@@ -157,8 +393,9 @@ RETAINERS = [
             "01_strategy/persona.md",
         ],
         output_file="structure_fixed.md",
-        output_dir=FLOOR_BLUEPRINT,
+        floor=FLOOR_BLUEPRINT,
         phase=Phase.STRUCTURE,
+        route=ModelRoute(tier="fast", output_ratio=2.0, min_tokens=2048),
     ),
     Agent(
         number=6, name_jp="儒学者", name_en="Jugakusha",
@@ -166,8 +403,9 @@ RETAINERS = [
         prompt_file="06_jugakusha_fact.md",
         input_files=["02_blueprint/structure_fixed.md"],
         output_file="fact_sheet.md",
-        output_dir=FLOOR_LIBRARY,
+        floor=FLOOR_LIBRARY,
         phase=Phase.DRAFTING,
+        route=ModelRoute(tier="standard"),
     ),
     Agent(
         number=7, name_jp="右筆", name_en="Yuhitsu",
@@ -178,8 +416,10 @@ RETAINERS = [
             "03_library/fact_sheet.md",
         ],
         output_file="draft_v1.md",
-        output_dir=FLOOR_WRITING,
+        floor=FLOOR_WRITING,
         phase=Phase.DRAFTING,
+        route=ModelRoute(tier="premium"),
+        section_parallel=True,
     ),
     Agent(
         number=8, name_jp="御意見番", name_en="Goikenban",
@@ -190,8 +430,9 @@ RETAINERS = [
             "03_library/fact_sheet.md",
         ],
         output_file="critique_report.md",
-        output_dir=FLOOR_WRITING,
+        floor=FLOOR_WRITING,
         phase=Phase.DRAFTING,
+        route=ModelRoute(tier="standard", max_tokens=4096),
     ),
     Agent(
         number=9, name_jp="代筆", name_en="Daihitsu",
@@ -202,8 +443,11 @@ RETAINERS = [
             "04_writing_room/critique_report.md",
         ],
         output_file="draft_v2.md",
-        output_dir=FLOOR_WRITING,
+        floor=FLOOR_WRITING,
         phase=Phase.DRAFTING,
+        route=ModelRoute(tier="premium", output_ratio=2.5, min_tokens=2048),
+        section_rewrite=True,
+        review_loop=True,
     ),
     Agent(
         number=10, name_jp="勘定方", name_en="Kanjyo",
@@ -211,8 +455,10 @@ RETAINERS = [
         prompt_file="10_kanjyo_count.md",
         input_files=["04_writing_room/draft_v2.md"],
         output_file="count_report.md",
-        output_dir=FLOOR_WRITING,
+        floor=FLOOR_WRITING,
         phase=Phase.POLISHING,
+        route=ModelRoute(tier="fast", max_tokens=2048, temperature=0.0),
+        local_executor=kanjyo_count,
     ),
     Agent(
         number=11, name_jp="公文書係", name_en="Kobunsho",
@@ -223,8 +469,10 @@ RETAINERS = [
             "03_library/fact_sheet.md",
         ],
         output_file="draft_v3_linked.md",
-        output_dir=FLOOR_WRITING,
+        floor=FLOOR_WRITING,
         phase=Phase.POLISHING,
+        route=ModelRoute(tier="fast", output_ratio=2.5, min_tokens=2048, temperature=0.3),
+        pre_gate=kobunsho_pre_gate,
     ),
     Agent(
         number=13, name_jp="絵師", name_en="Eshi",
@@ -232,8 +480,10 @@ RETAINERS = [
         prompt_file="13_eshi_visual.md",
         input_files=["04_writing_room/draft_v3_linked.md"],
         output_file="draft_v4_visuals.md",
-        output_dir=FLOOR_WRITING,
+        floor=FLOOR_WRITING,
         phase=Phase.POLISHING,
+        route=ModelRoute(tier="standard", output_ratio=2.5, min_tokens=2048),
+        speculative_input="04_writing_room/draft_v2.md",
     ),
     Agent(
         number=12, name_jp="城代", name_en="Joudai",
@@ -241,12 +491,471 @@ RETAINERS = [
         prompt_file="12_joudai_final.md",
         input_files=["04_writing_room/draft_v4_visuals.md"],
         output_file="final_draft.md",
-        output_dir=FLOOR_TENSHUKAKU,
+        floor=FLOOR_TENSHUKAKU,
         phase=Phase.GATEKEEPING,
+        route=ModelRoute(tier="fast", output_ratio=2.5, min_tokens=2048, temperature=0.3),
+        pre_gate=joudai_pre_gate,
     ),
 ]
 
 
+# 筆頭家老（最終確認）の振り分け
+KARO_ROUTE = ModelRoute(tier="premium", output_ratio=2.5, min_tokens=2048, temperature=0.3)
+
+# 家老の照合用に Strategy.md から添える抜粋の上限と、抜粋を選ぶ問いに足す言葉
+KARO_VAULT_BUDGET = 3000
+KARO_VAULT_QUERY = "戦略 トーン 表記 ルール 禁止 品質 読者"
+
+# 軍目付の記録（trace.chrome.json）で家老に割り当てるレーン（家臣は Agent.number のレーン）
+KARO_LANE = len(RETAINERS) + 1
+
+
+@dataclass
+class RoutingTable:
+    """
+    家臣ごとのモデルの振り分け表。
+    既定は各 Agent.route（家老は KARO_ROUTE）で、--routing の設定ファイルで格の中身や家臣ごとの値を差し替える。
+    """
+    tiers: dict[str, str] = field(default_factory=dict)
+    overrides: dict[str, dict] = field(default_factory=dict)  # name_en -> ModelRoute の項目
+    fallbacks: dict[str, str] = field(default_factory=dict)  # モデル -> 遮断中の代わりのモデル
+
+    def resolve(self, name_en: str, default: ModelRoute) -> ModelRoute:
+        return replace(default, **self.overrides.get(name_en, {}))
+
+    def model_for(self, route: ModelRoute, standard_model: str) -> str:
+        """route の格をモデル名に直す（standard は設定ファイルで差し替えない限り --model に従う）"""
+        if route.model:
+            return route.model
+        if route.tier == "standard":
+            return self.tiers.get("standard", standard_model)
+        return self.tiers.get(route.tier) or MODEL_TIERS[route.tier]
+
+
+def load_routing(path: Path) -> RoutingTable:
+    """
+    振り分け設定（TOML / JSON）を読む。
+
+        [tiers]
+        fast = "claude-3-5-haiku-20241022"
+
+        [agents.Kobunsho]      # name_en（大文字小文字は問わない）または name_jp
+        tier = "standard"
+        max_tokens = 4096
+
+        [fallbacks]            # 遮断器が落ちている間の代わりのモデル
+        "claude-opus-4-20250514" = "claude-sonnet-4-20250514"
+    """
+    text = path.read_text(encoding="utf-8")
+    if path.suffix == ".json":
+        data = json.loads(text)
+    else:
+        try:
+            import tomllib
+        except ImportError:
+            raise ImportError(
+                "無念！TOML を読むには Python 3.11 以上が要りまする。\n"
+                "振り分け設定は JSON でもお書きいただけますぞ。"
+            )
+        data = tomllib.loads(text)
+
+    tiers = data.get("tiers", {})
+    unknown_tiers = set(tiers) - set(MODEL_TIERS)
+    if unknown_tiers:
+        raise ValueError(f"無念！聞き慣れぬモデルの格でございます: {', '.join(sorted(unknown_tiers))}")
+
+    names = {agent.name_en.lower(): agent.name_en for agent in RETAINERS}
+    names.update({agent.name_jp: agent.name_en for agent in RETAINERS})
+    names.update({"karo": "Karo", "筆頭家老": "Karo"})
+    fields_allowed = set(ModelRoute.__dataclass_fields__)
+    overrides: dict[str, dict] = {}
+    for name, values in data.get("agents", {}).items():
+        name_en = names.get(name.lower(), names.get(name))
+        if name_en is None:
+            raise ValueError(f"無念！振り分け設定に見知らぬ家臣がおりまする: {name}")
+        unknown = set(values) - fields_allowed
+        if unknown:
+            raise ValueError(f"無念！{name} の振り分けに解せぬ項目がございます: {', '.join(sorted(unknown))}")
+        if values.get("tier", "standard") not in MODEL_TIERS:
+            raise ValueError(f"無念！{name} のモデルの格が解せませぬ: {values['tier']}")
+        overrides[name_en] = dict(values)
+    return RoutingTable(tiers=dict(tiers), overrides=overrides, fallbacks=dict(data.get("fallbacks", {})))
+
+
+def build_dependency_graph(agents: list[Agent]) -> dict[int, set[int]]:
+    """
+    input_files / output_path から依存関係グラフを構築する。
+
+    Returns:
+        agent.number -> 先に完了している必要がある agent.number の集合
+    """
+    producers = {agent.output_rel: agent.number for agent in agents}
+    graph: dict[int, set[int]] = {}
+    for agent in agents:
+        graph[agent.number] = {
+            producers[input_rel]
+            for input_rel in agent.input_files
+            if input_rel in producers and producers[input_rel] != agent.number
+        }
+    return graph
+
+
+def plan_rebuild(agents: list[Agent], edited_rel: str) -> tuple[Optional[Agent], list[Agent]]:
+    """
+    手直しされた成果物から作り直しの範囲を求める（make 方式）。
+
+    Returns:
+        (その成果物を出力した家臣 — 外部ファイルなら None,
+         それを直接・間接に入力とする下流の家臣 — 定義順)
+    """
+    producer = next((a for a in agents if a.output_rel == edited_rel), None)
+    if producer is None and edited_rel != KARO_OUTPUT_REL:
+        raise ValueError(f"無念！{edited_rel} はどの家臣の成果物でもございませぬ")
+
+    dirty = {edited_rel}
+    changed = True
+    while changed:
+        changed = False
+        for agent in agents:
+            if agent.output_rel not in dirty and dirty & set(agent.input_files):
+                dirty.add(agent.output_rel)
+                changed = True
+    downstream = [a for a in agents if a.output_rel in dirty and a is not producer]
+    return producer, downstream
+
+
+class RetainerSchedule:
+    """
+    依存関係グラフに沿った出陣管理（スレッド版・asyncio 版の共通部分）
+
+    倒れた家臣が出たら新たな出陣は止め、出陣中の者の帰還だけを待つ。
+    """
+
+    def __init__(self, agents: list[Agent]):
+        self.graph = build_dependency_graph(agents)
+        self.pending: list[Agent] = list(agents)
+        self.finished: set[int] = set()
+        self.success_count = 0
+        self.fallen: Optional[Agent] = None
+
+    def ready(self) -> list[Agent]:
+        """入力が揃った家臣（RETAINERS の定義順）"""
+        if self.fallen is not None:
+            return []
+        return [a for a in self.pending if self.graph[a.number] <= self.finished]
+
+    def start(self, agent: Agent):
+        self.pending.remove(agent)
+
+    def finish(self, agent: Agent, success: bool):
+        if success:
+            self.success_count += 1
+            self.finished.add(agent.number)
+        elif agent.number == 13:
+            # 画像生成の失敗は致命的ではない
+            self.finished.add(agent.number)
+        elif self.fallen is None:
+            self.fallen = agent
+
+    def check_stalled(self):
+        """出陣中の者がいないのに待機組が残っていれば、依存関係が循環している"""
+        if self.pending and self.fallen is None:
+            names = ", ".join(a.name_jp for a in self.pending)
+            raise RuntimeError(f"無念！家臣団の依存関係が循環しております: {names}")
+
+
+# ---------------------------------------------------------------------------
+# 作業場（ワークスペース）
+# ---------------------------------------------------------------------------
+
+def new_run_id() -> str:
+    """軍議ID（日時 + 乱数）を払い出す"""
+    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    return f"{timestamp}_{secrets.token_hex(3)}"
+
+
+@dataclass
+class CastleWorkspace:
+    """
+    1回の軍議専用の作業場。
+
+    同じホストで複数の軍議が同時に開かれても成果物を踏み荒らさないよう、
+    各フロアは castle_floors/runs/<run_id>/ の下に作る。
+    """
+    run_id: str
+    root: Path
+
+    @classmethod
+    def for_run(cls, run_id: Optional[str] = None, runs_dir: Path = RUNS_DIR) -> "CastleWorkspace":
+        run_id = run_id or new_run_id()
+        return cls(run_id=run_id, root=runs_dir / run_id)
+
+    def path(self, rel: str) -> Path:
+        """作業場からの相対パス（"04_writing_room/draft_v2.md" など）を解決"""
+        return self.root / rel
+
+    def floor(self, name: str) -> Path:
+        return self.root / name
+
+    def ensure(self):
+        """作業ディレクトリを確保"""
+        for name in ALL_FLOORS:
+            self.floor(name).mkdir(parents=True, exist_ok=True)
+
+    @property
+    def final_draft_path(self) -> Path:
+        return self.path(KARO_INPUT_REL)
+
+    @property
+    def final_article_path(self) -> Path:
+        return self.path(KARO_OUTPUT_REL)
+
+    def display_path(self, path: Path) -> str:
+        """ログ表示用のパス（BASE_DIR 配下なら相対表記）"""
+        try:
+            return str(path.relative_to(BASE_DIR))
+        except ValueError:
+            return str(path)
+
+
+_warm_files: dict[Path, tuple[int, str]] = {}
+_warm_files_lock = threading.Lock()
+
+
+def read_warm(path: Path) -> Optional[str]:
+    """
+    指令書・Vault 資料など、全軍議で共通のファイルを読む（存在しなければ None）。
+    プロセス内に写しを持ち、更新時刻が変わったときだけ読み直す — 常駐（serve）中も直した指令書はすぐ効く。
+    """
+    try:
+        mtime = path.stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+    with _warm_files_lock:
+        cached = _warm_files.get(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    content = path.read_text(encoding="utf-8")
+    with _warm_files_lock:
+        _warm_files[path] = (mtime, content)
+    return content
+
+
+_artifact_writer: Optional[ThreadPoolExecutor] = None
+_artifact_writer_lock = threading.Lock()
+
+
+def _get_artifact_writer() -> ThreadPoolExecutor:
+    """成果物のディスク書き込みを引き受ける共有スレッド（全軍議で共用）"""
+    global _artifact_writer
+    with _artifact_writer_lock:
+        if _artifact_writer is None:
+            _artifact_writer = ThreadPoolExecutor(max_workers=4, thread_name_prefix="artifact-writer")
+        return _artifact_writer
+
+
+class ArtifactStore:
+    """
+    軍議中の成果物の置き場（メモリ上）。
+
+    家臣の出力は書いた時点でメモリに保持し、ディスクへは裏で書き込む（write-through）。
+    読み出しはメモリから返し、メモリにないもの（--resume 時の前回分や Vault 資料など）だけ
+    ディスクから一度読んで以後はメモリから返す。ネットワーク越しのストレージで
+    小さな読み書きが積み重なるのを避けるためのもの。
+    """
+
+    def __init__(self, workspace: CastleWorkspace):
+        self.workspace = workspace
+        self._memory: dict[str, str] = {}
+        self._written: set[str] = set()
+        self._external: dict[Path, Optional[str]] = {}
+        self._pending: list[Future] = []
+        self._lock = threading.Lock()
+        self._disk_lock = threading.Lock()
+
+    def read(self, rel: str) -> Optional[str]:
+        """作業場の成果物を読む（存在しなければ None）"""
+        with self._lock:
+            if rel in self._memory:
+                return self._memory[rel]
+        path = self.workspace.path(rel)
+        if not path.exists():
+            return None
+        content = path.read_text(encoding="utf-8")
+        with self._lock:
+            return self._memory.setdefault(rel, content)
+
+    def exists(self, rel: str) -> bool:
+        return self.read(rel) is not None
+
+    def sha256(self, rel: str) -> Optional[str]:
+        content = self.read(rel)
+        if content is None:
+            return None
+        return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+    def write(self, rel: str, content: str, persisted: bool = False):
+        """
+        成果物を置く。ディスクへの書き込みは裏で行う。
+        persisted=True ならディスクには既に同じ内容がある（ストリーミング出力など）ので書かない。
+        """
+        with self._lock:
+            self._memory[rel] = content
+            self._written.add(rel)
+            if persisted:
+                return
+            self._pending.append(_get_artifact_writer().submit(self._persist, rel))
+
+    def _persist(self, rel: str):
+        # 書き込み順が前後しても最後に置かれた内容が残るよう、実行時点のメモリ内容を書く
+        with self._disk_lock:
+            with self._lock:
+                content = self._memory[rel]
+            path = self.workspace.path(rel)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_name(path.name + ".tmp")
+            tmp_path.write_text(content, encoding="utf-8")
+            os.replace(tmp_path, path)
+
+    def flush(self):
+        """裏での書き込みが全て終わるまで待つ（書き込みエラーはここで送出）"""
+        with self._lock:
+            pending, self._pending = self._pending, []
+        for future in pending:
+            future.result()
+
+    def forget(self):
+        """
+        この軍議が書いたもの以外をメモリから捨て、次の読み出しでディスクから読み直す
+        （働き手など別のプロセスが作業場に書いた成果物を拾うため）。
+        """
+        with self._lock:
+            self._memory = {rel: content for rel, content in self._memory.items() if rel in self._written}
+
+    def read_external(self, path: Path) -> Optional[str]:
+        """作業場の外のファイル（Vault 資料など）を軍議中に一度だけ読む"""
+        with self._lock:
+            if path in self._external:
+                return self._external[path]
+        content = read_warm(path)
+        with self._lock:
+            return self._external.setdefault(path, content)
+
+
+def file_sha256(path: Path) -> Optional[str]:
+    """ファイル内容の SHA-256（存在しなければ None）"""
+    if not path.exists():
+        return None
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+class RunManifest:
+    """
+    軍議の陣中日誌（run_manifest.json）。
+
+    家臣ごとに入力ファイルのハッシュ・出力ファイルのハッシュ・成否・所要時間を記録し、
+    家臣が1人帰還するたびに書き出す。--resume ではこれを見て、入力も出力も
+    記録時のままの家臣を再出陣させずに済ませる。
+    """
+
+    FILENAME = "run_manifest.json"
+
+    def __init__(
+        self,
+        workspace: CastleWorkspace,
+        theme: str = "",
+        model: str = "",
+        store: Optional[ArtifactStore] = None,
+    ):
+        self.workspace = workspace
+        self.store = store
+        self.path = workspace.root / self.FILENAME
+        self.data: dict = {
+            "run_id": workspace.run_id,
+            "theme": theme,
+            "model": model,
+            "agents": {},
+        }
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, workspace: CastleWorkspace, store: Optional[ArtifactStore] = None) -> "RunManifest":
+        """既存の陣中日誌を読み込む"""
+        manifest = cls(workspace, store=store)
+        if not manifest.path.exists():
+            raise FileNotFoundError(f"無念！軍議 {workspace.run_id} の陣中日誌が見つかりませぬ: {manifest.path}")
+        manifest.data = json.loads(manifest.path.read_text(encoding="utf-8"))
+        return manifest
+
+    @property
+    def theme(self) -> str:
+        return self.data.get("theme", "")
+
+    def _hash(self, rel: str) -> Optional[str]:
+        if self.store is not None:
+            return self.store.sha256(rel)
+        return file_sha256(self.workspace.path(rel))
+
+    def input_hashes(self, input_rels: list[str]) -> dict[str, Optional[str]]:
+        return {rel: self._hash(rel) for rel in input_rels}
+
+    def record(
+        self,
+        name: str,
+        input_hashes: dict[str, Optional[str]],
+        output_rel: str,
+        status: str,
+        started_at: float,
+        **fields,
+    ):
+        """家臣1人分の結果を記録して書き出す（fields は記録に添える・上書きする項目）"""
+        entry = {
+            "status": status,
+            "input_hashes": input_hashes,
+            "output": output_rel,
+            "output_hash": self._hash(output_rel),
+            "started_at": started_at,
+            "duration_sec": round(time.time() - started_at, 3),
+            **fields,
+        }
+        with self._lock:
+            self.data["agents"][name] = entry
+            self.workspace.root.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix(".json.tmp")
+            tmp_path.write_text(json.dumps(self.data, ensure_ascii=False, indent=2), encoding="utf-8")
+            os.replace(tmp_path, self.path)
+
+    def checkpoint_state(self, name: str, input_rels: list[str], output_rel: str) -> Optional[str]:
+        """
+        前回の働きを引き継げるか判定する。
+
+        Returns:
+            "unchanged" — 前回成功しており、入力・出力とも記録時のまま
+            "edited"    — 入力は記録時のままだが、出力が手で直されている（直しを活かす）
+            None        — 引き継げない（再出陣が必要）
+        """
+        entry = self.data["agents"].get(name)
+        if not entry or entry.get("status") != "success" or entry.get("output") != output_rel:
+            return None
+        output_hash = self._hash(output_rel)
+        if output_hash is None or self.input_hashes(input_rels) != entry.get("input_hashes"):
+            return None
+        return "unchanged" if output_hash == entry.get("output_hash") else "edited"
+
+    def adopt_edit(self, name: str, input_rels: list[str], output_rel: str):
+        """手直しされた出力を、その家臣の正式な成果として記録し直す"""
+        entry = self.data["agents"].get(name, {})
+        self.record(
+            name,
+            self.input_hashes(input_rels),
+            output_rel,
+            "success",
+            entry.get("started_at", time.time()),
+            edited=True,
+            duration_sec=entry.get("duration_sec", 0.0),
+        )
+
+
 # ---------------------------------------------------------------------------
 # ログ出力
 # ---------------------------------------------------------------------------
@@ -315,6 +1024,84 @@ class WarCouncilLogger:
             plain=f"  [失敗: {agent.name_jp}] {message}",
         )
 
+    def task_queued(self, name_jp: str, task_id: int):
+        """持ち場帳に積んだ持ち場"""
+        self._log(f"  📋 [{name_jp}] 持ち場 #{task_id} を積み、働き手を待ちまする。", Color.DIM,
+                  plain=f"  [持ち場: {name_jp}] #{task_id} を積みました")
+
+    def workspace_info(self, run_id: str, path: str):
+        """作業場の告知"""
+        self._log(f"  🗂  軍議ID: {run_id} | 作業場: {path}", Color.DIM, plain=f"  軍議ID: {run_id} | 作業場: {path}")
+
+    def agent_resumed(self, name_jp: str, output_file: str, edited: bool = False):
+        """前回の出力を引き継いだ家臣"""
+        if edited:
+            self._log(
+                f"  ✍️  [{name_jp}] 手直し済みの {output_file} をそのまま用います。",
+                Color.YELLOW,
+                plain=f"  [手直し引継: {name_jp}] {output_file}",
+            )
+            return
+        self._log(
+            f"  ⏭  [{name_jp}] 前回の働きを引き継ぎます。→ {output_file}",
+            Color.DIM,
+            plain=f"  [引継: {name_jp}] {output_file}",
+        )
+
+    def pre_gate(self, name_jp: str, summary: str, settled: bool):
+        """API 前の手元処理の結果"""
+        if settled:
+            self._log(f"  🔍 [{name_jp}] {summary} — 手元で片が付きました。API に頼るまでもない。", Color.DIM,
+                      plain=f"  [下検分: {name_jp}] {summary} | API 呼び出しなし")
+        else:
+            self._log(f"  🔍 [{name_jp}] {summary} — 片付かぬ分のみ API に回します。", Color.YELLOW,
+                      plain=f"  [下検分: {name_jp}] {summary} | 残件のみ API へ")
+
+    def sections_dispatched(self, name_jp: str, count: int):
+        """H2 セクションごとの手分け"""
+        self._log(f"  ✂️  [{name_jp}] 冒頭と H2 {count}節を手分けして同時に書き上げます。", Color.DIM,
+                  plain=f"  [手分け: {name_jp}] 冒頭 + H2 {count}節")
+
+    def speculation_started(self, name_jp: str, source: str):
+        """家臣の先回り"""
+        self._log(f"  🏃 [{name_jp}] {source} で先回りいたします。", Color.DIM,
+                  plain=f"  [先回り: {name_jp}] {source} で開始")
+
+    def speculation_adopted(self, name_jp: str, count: int):
+        """先回りの結果を移し替えた"""
+        self._log(f"  🏃 [{name_jp}] 先回りの画像 {count}件を見出しに合わせて移し替えました。", Color.DIM,
+                  plain=f"  [先回り: {name_jp}] 採用（{count}件移し替え）")
+
+    def speculation_discarded(self, name_jp: str, reason: str):
+        """先回りの結果を捨てて本来の入力でやり直す"""
+        self._log(f"  🏃 [{name_jp}] 先回りは無駄足でした（{reason}）。本来の原稿で描き直します。", Color.YELLOW,
+                  plain=f"  [先回り: {name_jp}] 不採用: {reason}")
+
+    def rewrite_planned(self, name_jp: str, titles: list[str], total: int):
+        """差分リライトの段取り"""
+        if not titles:
+            self._log(f"  ✂️  [{name_jp}] 書き直すべきセクションはございませぬ。初稿をそのまま清書いたします。", Color.DIM,
+                      plain=f"  [差分リライト: {name_jp}] 0/{total}節")
+            return
+        names = "、".join(f"「{t}」" for t in titles)
+        self._log(f"  ✂️  [{name_jp}] 指摘のあった {len(titles)}/{total}節だけ書き直します: {names}", Color.DIM,
+                  plain=f"  [差分リライト: {name_jp}] {len(titles)}/{total}節 {names}")
+
+    def rewrite_fallback(self, name_jp: str):
+        """構造化された批評が使えず全文を書き直す"""
+        self._log(f"  ✂️  [{name_jp}] 批評を原稿に突き合わせられませぬ。全文を書き直します…（泣）", Color.YELLOW,
+                  plain=f"  [差分リライト: {name_jp}] 全文リライトに戻す")
+
+    def review_round(self, name_jp: str, round_no: int, score: int, change: float):
+        """推敲を1回終えた"""
+        self._log(f"  🔁 [{name_jp}] 第{round_no}回の推敲を終えました（批評の重さ {score} / 変化率 {change:.1%}）", Color.CYAN,
+                  plain=f"  [推敲: {name_jp}] 第{round_no}回 score={score} change={change:.1%}")
+
+    def review_stopped(self, name_jp: str, round_no: int, reason: str):
+        """推敲を打ち切った"""
+        self._log(f"  🔁 [{name_jp}] 第{round_no}回で推敲を打ち切ります: {reason}", Color.CYAN,
+                  plain=f"  [推敲: {name_jp}] 第{round_no}回で打ち切り: {reason}")
+
     def karo_speaks(self, message: str):
         """家老の発言"""
         self._log(f"\n  👑 【筆頭家老】 {message}", Color.YELLOW, plain=f"  【筆頭家老】 {message}")
@@ -347,9 +1134,60 @@ class WarCouncilLogger:
             plain=f"  軍議結果: {status} | 動員家臣: {agents_count}名 | 所要時間: {minutes}分{seconds}秒",
         )
 
+    def call_metrics(self, name_jp: str, stats: "CallStats"):
+        """API 呼び出しの計測値（最初の一字まで・所要時間・出力速度）"""
+        ttft = stats.time_to_first_token
+        ttft_text = f"初字まで {ttft:.1f}秒 | " if ttft is not None else ""
+        msg = (
+            f"{ttft_text}所要 {stats.duration:.1f}秒 | "
+            f"入力 {stats.input_tokens}・出力 {stats.output_tokens}トークン "
+            f"({stats.tokens_per_sec:.1f} tok/s)"
+        )
+        if stats.model:
+            msg += f" | {stats.model}" + ("（代わり）" if stats.failover else "")
+        if stats.retries:
+            msg += f" | 再試行 {stats.retries}回"
+        if stats.hedges:
+            msg += f" | 二の矢 {stats.hedges}本"
+        if stats.batch:
+            msg += " | 一括注文"
+        self._log(f"  ⏱  [{name_jp}] {msg}", Color.DIM, plain=f"  [計測: {name_jp}] {msg}")
+
+    def token_summary(self, usage: dict, cost_usd: Optional[float] = None):
+        """トークン使用量（prompt cache の読み書きを含む）と費用の概算"""
+        msg = (
+            f"入力 {usage['input_tokens']} | 出力 {usage['output_tokens']} | "
+            f"キャッシュ読込 {usage['cache_read_tokens']} | キャッシュ書込 {usage['cache_write_tokens']}"
+        )
+        if cost_usd is not None:
+            msg += f" | 費用 約 ${cost_usd:.4f}"
+        self._log(f"  🪙 兵糧（トークン）: {msg}", Color.MAGENTA, plain=f"  トークン: {msg}")
+
+    def resilience_summary(self, tallies: dict[str, dict[str, int]]):
+        """家臣ごとの再試行・二の矢・代わりのモデルの回数"""
+        for name, tally in tallies.items():
+            msg = f"再試行 {tally['retries']}回 | 二の矢 {tally['hedges']}本 | 代わりのモデル {tally['failovers']}回"
+            self._log(f"  🛡  [{name}] {msg}", Color.MAGENTA, plain=f"  [粘り: {name}] {msg}")
+
+    def cache_hit(self, name_jp: str):
+        """蔵出しの報告"""
+        self._log(f"  📦 [{name_jp}] 蔵に同じ注文がございました。蔵出しいたします。", Color.DIM,
+                  plain=f"  [蔵出し: {name_jp}] キャッシュ命中")
+
+    def cache_summary(self, hits: int, misses: int):
+        """蔵の出入り集計"""
+        total = hits + misses
+        rate = (hits / total * 100) if total else 0.0
+        self._log(
+            f"  📦 蔵出し: {hits}件 | 新規注文: {misses}件 | 命中率: {rate:.0f}%",
+            Color.MAGENTA,
+            plain=f"  キャッシュ: 命中 {hits}件 | 未命中 {misses}件 | 命中率 {rate:.0f}%",
+        )
+
     def save_log(self, theme: str):
         """ログファイルを保存"""
         timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        self.log_dir.mkdir(parents=True, exist_ok=True)
         log_path = self.log_dir / f"war_council_log_{timestamp}.md"
         header = f"# 軍議記録 — 「{theme}」\n\n"
         header += f"日時: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n"
@@ -363,22 +1201,284 @@ class WarCouncilLogger:
 # API クライアント（Claude API呼び出し）
 # ---------------------------------------------------------------------------
 
+@dataclass
+class CallStats:
+    """1回の API 呼び出しの計測値"""
+    model: str = ""
+    started_at: float = 0.0
+    retries: int = 0  # 一時的なエラーで再試行した回数
+    hedges: int = 0  # 二の矢を放った回数
+    failover: bool = False  # 遮断器により代わりのモデルで応じた
+    batch: bool = False  # Message Batches 経由（単価は半額）
+    first_token_at: Optional[float] = None
+    finished_at: float = 0.0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cache_read_tokens: int = 0
+    cache_write_tokens: int = 0
+
+    def record_usage(self, usage):
+        """response.usage を取り込む（prompt cache の読み書き分を含む）"""
+        self.input_tokens = usage.input_tokens
+        self.output_tokens = usage.output_tokens
+        self.cache_read_tokens = getattr(usage, "cache_read_input_tokens", 0) or 0
+        self.cache_write_tokens = getattr(usage, "cache_creation_input_tokens", 0) or 0
+
+    def add_to(self, totals: dict):
+        """クライアントの累計（usage）に加算する"""
+        totals["input_tokens"] += self.input_tokens
+        totals["output_tokens"] += self.output_tokens
+        totals["cache_read_tokens"] += self.cache_read_tokens
+        totals["cache_write_tokens"] += self.cache_write_tokens
+
+    @property
+    def duration(self) -> float:
+        return max(0.0, self.finished_at - self.started_at)
+
+    @property
+    def time_to_first_token(self) -> Optional[float]:
+        """最初の一字が届くまでの秒数（ストリーミング時のみ）"""
+        if self.first_token_at is None:
+            return None
+        return self.first_token_at - self.started_at
+
+    @property
+    def tokens_per_sec(self) -> float:
+        """出力速度（ストリーミング時は最初の一字以降の生成速度）"""
+        generating = self.finished_at - (self.first_token_at or self.started_at)
+        return self.output_tokens / generating if generating > 0 else 0.0
+
+
+def new_usage_totals() -> dict:
+    return {"input_tokens": 0, "output_tokens": 0, "cache_read_tokens": 0, "cache_write_tokens": 0}
+
+
+def build_message_params(
+    model: str,
+    system_prompt: str,
+    user_message: str,
+    max_tokens: int,
+    temperature: float,
+    context: str = "",
+    prompt_cache: bool = True,
+) -> dict:
+    """
+    Messages API のリクエストを組み立てる。
+
+    context（Vault 戦略コンテキストなど、テーマをまたいで共通の資料）は本文より前に置き、
+    prompt_cache 有効時は System Prompt と context の末尾に cache_control の区切りを付ける。
+    同じ家臣・同じ Vault の呼び出しはこの前置き部分がキャッシュから読まれる。
+    """
+    cache_control = {"type": "ephemeral"}
+    if prompt_cache:
+        system = [{"type": "text", "text": system_prompt, "cache_control": cache_control}]
+    else:
+        system = system_prompt
+
+    content = []
+    if context:
+        context_block = {"type": "text", "text": context}
+        if prompt_cache:
+            context_block["cache_control"] = cache_control
+        content.append(context_block)
+    content.append({"type": "text", "text": user_message})
+
+    return dict(
+        model=model,
+        max_tokens=max_tokens,
+        system=system,
+        messages=[
+            {"role": "user", "content": content}
+        ],
+        temperature=temperature,
+    )
+
+
+# 再試行してよい HTTP ステータス（タイムアウト・競合・流量超過・サーバー側の不調・過負荷）
+TRANSIENT_STATUS = {408, 409, 429, 500, 502, 503, 504, 529}
+
+
+def is_transient(error: Exception) -> bool:
+    """一時的な API エラーか（anthropic の例外は取り込まず、属性と名前で見分ける）"""
+    status = getattr(error, "status_code", None)
+    if status is not None:
+        return status in TRANSIENT_STATUS
+    return type(error).__name__ in ("APIConnectionError", "APITimeoutError")
+
+
+def retry_after(error: Exception) -> Optional[float]:
+    """retry-after ヘッダーの秒数（なければ None）"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        return max(0.0, float(headers.get("retry-after")))
+    except (TypeError, ValueError):
+        return None
+
+
+@dataclass
+class RetryPolicy:
+    """API 呼び出しの再試行・二重発注・遮断器の設定"""
+    max_retries: int = DEFAULT_MAX_RETRIES
+    base_delay: float = 1.0
+    max_delay: float = DEFAULT_RETRY_MAX_DELAY
+    hedge: bool = False
+    hedge_after: float = DEFAULT_HEDGE_AFTER
+    hedge_min_samples: int = 20  # これだけ測れたら p95 を二の矢の合図にする
+    fallbacks: dict[str, str] = field(default_factory=dict)  # モデル -> 遮断中の代わりのモデル
+    breaker_threshold: int = DEFAULT_BREAKER_THRESHOLD
+    breaker_cooldown: float = DEFAULT_BREAKER_COOLDOWN
+
+    def backoff(self, attempt: int, error: Exception) -> float:
+        """attempt 回目（0始まり）の再試行までの待ち時間（full jitter。retry-after があればそれ以上待つ）"""
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        hinted = retry_after(error)
+        return max(delay, min(hinted, self.max_delay)) if hinted is not None else delay
+
+
+class CallGuard:
+    """
+    API 呼び出しの見張り番（プロセス共通）。
+    モデルごとの遮断器と、二重発注の合図にする所要時間の記録を持つ。
+    スレッド版・asyncio 版の両クライアントから使うため、状態はロックで守る。
+    """
+
+    _shared: Optional["CallGuard"] = None
+
+    def __init__(self, policy: Optional[RetryPolicy] = None):
+        self.policy = policy or RetryPolicy()
+        self._lock = threading.Lock()
+        self._failures: dict[str, int] = {}
+        self._opened_at: dict[str, float] = {}
+        self._latency: dict[tuple[str, int], deque] = {}
+
+    @classmethod
+    def shared(cls) -> "CallGuard":
+        if cls._shared is None:
+            cls._shared = cls()
+        return cls._shared
+
+    @classmethod
+    def configure(cls, policy: RetryPolicy) -> "CallGuard":
+        cls._shared = cls(policy)
+        return cls._shared
+
+    def route(self, model: str) -> tuple[str, float]:
+        """
+        今このモデルに頼んでよいか。遮断中なら代わりのモデルを順にたどり、最初に遮断の明けているものを返す
+        （明けた直後の1回は試しに通す）。どれも遮断中なら、遮断が最も早く明けるモデルとその待ち時間を返す。
+        代わりの指定が輪になっていても、同じモデルは二度たどらない。
+        """
+        with self._lock:
+            now = time.monotonic()
+            soonest: Optional[tuple[str, float]] = None
+            visited: set[str] = set()
+            candidate: Optional[str] = model
+            while candidate and candidate not in visited:
+                visited.add(candidate)
+                opened_at = self._opened_at.get(candidate)
+                if opened_at is None:
+                    return candidate, 0.0
+                remaining = opened_at + self.policy.breaker_cooldown - now
+                if remaining <= 0:
+                    del self._opened_at[candidate]
+                    self._failures[candidate] = self.policy.breaker_threshold - 1
+                    return candidate, 0.0
+                if soonest is None or remaining < soonest[1]:
+                    soonest = (candidate, remaining)
+                candidate = self.policy.fallbacks.get(candidate)
+            return soonest
+
+    def record_success(self, model: str, max_tokens: int, duration: float):
+        with self._lock:
+            self._failures[model] = 0
+            self._latency.setdefault((model, max_tokens), deque(maxlen=100)).append(duration)
+
+    def record_failure(self, model: str) -> bool:
+        """倒れた回数を数え、遮断器が落ちたら True"""
+        with self._lock:
+            self._failures[model] = self._failures.get(model, 0) + 1
+            if self._failures[model] >= self.policy.breaker_threshold and model not in self._opened_at:
+                self._opened_at[model] = time.monotonic()
+                return True
+            return False
+
+    def hedge_delay(self, model: str, max_tokens: int) -> Optional[float]:
+        """二の矢を放つまでの秒数（同じモデル・同じ出力上限の p95。二重発注しないなら None）"""
+        if not self.policy.hedge:
+            return None
+        with self._lock:
+            samples = sorted(self._latency.get((model, max_tokens), ()))
+        if len(samples) < self.policy.hedge_min_samples:
+            return self.policy.hedge_after
+        return samples[int(len(samples) * 0.95) - 1]
+
+
+def response_text(response) -> str:
+    """テキストブロックを結合"""
+    return "".join(block.text for block in response.content if block.type == "text")
+
+
+class StreamingOutput:
+    """
+    ストリーミング出力を一時ファイル（<出力>.partial）へ書き足し、
+    完了時に本来のパスへ差し替える。途中で倒れたら一時ファイルは捨てる。
+    """
+
+    def __init__(self, path: Path, stats: CallStats):
+        self.path = path
+        self.tmp_path = path.with_name(path.name + ".partial")
+        self.stats = stats
+        self._parts: list[str] = []
+        self._file = None
+
+    def __enter__(self) -> "StreamingOutput":
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = self.tmp_path.open("w", encoding="utf-8")
+        return self
+
+    def write(self, text: str):
+        if self.stats.first_token_at is None:
+            self.stats.first_token_at = time.time()
+        self._parts.append(text)
+        self._file.write(text)
+        self._file.flush()
+
+    @property
+    def text(self) -> str:
+        return "".join(self._parts)
+
+    def __exit__(self, exc_type, exc, tb):
+        self._file.close()
+        if exc_type is None:
+            os.replace(self.tmp_path, self.path)
+        else:
+            self.tmp_path.unlink(missing_ok=True)
+        return False
+
+
 class CastleAPIClient:
     """
     Claude API を呼び出すクライアント。
     Anthropic SDK を使用。環境変数 ANTHROPIC_API_KEY が必要。
     """
 
-    def __init__(self, model: str = DEFAULT_MODEL):
+    def __init__(self, model: str = DEFAULT_MODEL, prompt_cache: bool = True, guard: Optional[CallGuard] = None):
         self.model = model
+        self.prompt_cache = prompt_cache
+        self.guard = guard or CallGuard.shared()
         self._client = None
+        self.usage = new_usage_totals()
+        self._usage_lock = threading.Lock()  # 動員の worker スレッドと二の矢のコールバックの両方から足す
 
     def _get_client(self):
         """遅延初期化でAnthropic clientを取得"""
         if self._client is None:
             try:
                 from anthropic import Anthropic
-                self._client = Anthropic()
+                self._client = Anthropic(max_retries=0)  # 再試行は CallGuard の方針で行う
             except ImportError:
                 raise ImportError(
                     "無念！anthropic パッケージが見つかりませぬ。\n"
@@ -398,6 +1498,10 @@ class CastleAPIClient:
         user_message: str,
         max_tokens: int = 8192,
         temperature: float = 0.7,
+        context: str = "",
+        stream_to: Optional[Path] = None,
+        stats: Optional[CallStats] = None,
+        model: Optional[str] = None,
     ) -> str:
         """
         エージェントを呼び出してテキストレスポンスを返す。
@@ -407,31 +1511,868 @@ class CastleAPIClient:
             user_message: ユーザーメッセージ（入力データ）
             max_tokens: 最大出力トークン数
             temperature: 温度パラメータ
+            context: 本文より前に置く共通資料（Vault など。prompt cache の対象）
+            stream_to: 指定するとストリーミングで受け取り、届いた分からこのファイルへ書き出す
+            stats: 指定すると所要時間・最初の一字までの時間・トークン数を書き込む
+            model: この呼び出しだけ使うモデル（None ならクライアントのモデル）
 
         Returns:
             レスポンステキスト
         """
         client = self._get_client()
+        stats = stats if stats is not None else CallStats()
+        requested = model or self.model
+        policy = self.guard.policy
 
-        response = client.messages.create(
-            model=self.model,
-            max_tokens=max_tokens,
-            system=system_prompt,
-            messages=[
-                {"role": "user", "content": user_message}
-            ],
-            temperature=temperature,
-        )
+        stats.started_at = time.time()
+        for attempt in range(policy.max_retries + 1):
+            stats.model, wait_sec = self.guard.route(requested)
+            stats.failover = stats.model != requested
+            time.sleep(wait_sec)
+            params = build_message_params(
+                stats.model, system_prompt, user_message, max_tokens, temperature,
+                context=context, prompt_cache=self.prompt_cache,
+            )
+            attempt_started = time.monotonic()
+            try:
+                text, response = self._attempt(client, params, stats, stream_to)
+                break
+            except Exception as e:
+                if not is_transient(e):
+                    raise
+                self.guard.record_failure(stats.model)
+                if attempt == policy.max_retries:
+                    raise
+                stats.retries += 1
+                time.sleep(policy.backoff(attempt, e))
+        self.guard.record_success(stats.model, max_tokens, time.monotonic() - attempt_started)
+        stats.finished_at = time.time()
 
-        # テキストブロックを結合して返す
-        return "".join(
-            block.text for block in response.content if block.type == "text"
-        )
+        stats.record_usage(response.usage)
+        with self._usage_lock:
+            stats.add_to(self.usage)
+        return text
 
+    def _attempt(self, client, params: dict, stats: CallStats, stream_to: Optional[Path]):
+        """1回分の呼び出し。ストリーミングでなければ、p95 を過ぎても返事がない時に二の矢を放つ"""
+        if stream_to is not None:
+            with StreamingOutput(stream_to, stats) as output, client.messages.stream(**params) as stream:
+                for text in stream.text_stream:
+                    output.write(text)
+                response = stream.get_final_message()
+            return output.text, response
 
-# ---------------------------------------------------------------------------
-# メインオーケストレーター
-# ---------------------------------------------------------------------------
+        def create():
+            response = client.messages.create(**params)
+            return response_text(response), response
+
+        delay = self.guard.hedge_delay(params["model"], params["max_tokens"])
+        if delay is None:
+            return create()
+        pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="hedge")
+        try:
+            pending = {pool.submit(create)}
+            done, _ = wait(pending, timeout=delay)
+            if not done:
+                stats.hedges += 1
+                pending.add(pool.submit(create))
+            error = None
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future.exception() is None:
+                        # 遅れて届いた方の消費も勘定に入れる
+                        for loser in pending:
+                            loser.add_done_callback(self._record_loser)
+                        return future.result()
+                    error = future.exception()
+            raise error
+        finally:
+            pool.shutdown(wait=False)
+
+    def _record_loser(self, future: Future):
+        if future.exception() is None:
+            loser = CallStats()
+            loser.record_usage(future.result()[1].usage)
+            with self._usage_lock:
+                loser.add_to(self.usage)
+
+
+class TokenBucket:
+    """
+    トークンバケット方式の流量制限（asyncio 用）。
+    1分あたり per_minute 単位を上限とし、連続的に補充する。
+    """
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.tokens = float(per_minute)
+        self.rate = per_minute / 60.0  # 1秒あたりの補充量
+        self.updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    async def acquire(self, amount: float = 1.0):
+        """amount 単位が貯まるまで待って消費する（容量超の要求は満杯まで待つ）"""
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+    def settle(self, reserved: float, actual: float):
+        """見積もりで確保した分と実消費との差を精算する（不足分は借りとして残る）"""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + reserved - actual)
+
+
+class CastleRequestPool:
+    """
+    API 呼び出しの関所。同時実行数（セマフォ）と RPM / TPM（トークンバケット）を管理する。
+    複数の軍議で1つを共有することで、プロセス全体の流量を制御できる。
+    """
+
+    _shared: Optional["CastleRequestPool"] = None
+
+    def __init__(
+        self,
+        max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+        requests_per_minute: Optional[int] = None,
+        tokens_per_minute: Optional[int] = None,
+    ):
+        self.max_in_flight = max(1, max_in_flight)
+        self._semaphore = asyncio.Semaphore(self.max_in_flight)
+        self._requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self._tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+
+    @classmethod
+    def shared(cls) -> "CastleRequestPool":
+        """プロセス共通の関所（configure() していなければデフォルト設定で作る）"""
+        if cls._shared is None:
+            cls._shared = cls()
+        return cls._shared
+
+    @classmethod
+    def configure(cls, **kwargs) -> "CastleRequestPool":
+        """プロセス共通の関所を設定し直す"""
+        cls._shared = cls(**kwargs)
+        return cls._shared
+
+    @staticmethod
+    def estimate_tokens(text: str) -> int:
+        """入力トークン数の概算（日本語はおおむね1文字1トークン弱）"""
+        return max(1, len(text) // 2)
+
+    async def __aenter__(self):
+        await self._semaphore.acquire()
+        return self
+
+    async def __aexit__(self, *exc):
+        self._semaphore.release()
+
+    async def reserve(self, estimated_tokens: int):
+        """RPM / TPM の枠を確保する"""
+        if self._requests is not None:
+            await self._requests.acquire(1)
+        if self._tokens is not None:
+            await self._tokens.acquire(estimated_tokens)
+
+    def settle(self, estimated_tokens: int, actual_tokens: int):
+        """TPM の見積もりを実消費で精算する"""
+        if self._tokens is not None:
+            self._tokens.settle(estimated_tokens, actual_tokens)
+
+
+class AsyncCastleAPIClient:
+    """
+    CastleAPIClient の asyncio 版。
+
+    AsyncAnthropic クライアント（HTTP コネクションプール）はプロセス内で1つだけ作り、
+    全エージェント・全軍議で共有する。流量制限は CastleRequestPool に委ねる。
+    """
+
+    _shared_client = None
+
+    def __init__(
+        self,
+        model: str = DEFAULT_MODEL,
+        pool: Optional[CastleRequestPool] = None,
+        prompt_cache: bool = True,
+        guard: Optional[CallGuard] = None,
+    ):
+        self.model = model
+        self.prompt_cache = prompt_cache
+        self.pool = pool or CastleRequestPool.shared()
+        self.guard = guard or CallGuard.shared()
+        self.usage = new_usage_totals()
+
+    def _get_client(self):
+        """遅延初期化で共有 AsyncAnthropic client を取得"""
+        cls = type(self)
+        if cls._shared_client is None:
+            try:
+                import httpx
+                from anthropic import AsyncAnthropic, DefaultAsyncHttpxClient
+                limits = httpx.Limits(
+                    max_connections=self.pool.max_in_flight,
+                    max_keepalive_connections=self.pool.max_in_flight,
+                )
+                cls._shared_client = AsyncAnthropic(
+                    http_client=DefaultAsyncHttpxClient(limits=limits),
+                    max_retries=0,  # 再試行は CallGuard の方針で行う
+                )
+            except ImportError:
+                raise ImportError(
+                    "無念！anthropic パッケージが見つかりませぬ。\n"
+                    "  pip install anthropic\n"
+                    "を実行してくだされ。"
+                )
+            except Exception as e:
+                raise RuntimeError(
+                    f"無念！API接続に失敗いたしました: {e}\n"
+                    "ANTHROPIC_API_KEY が正しく設定されているかご確認くだされ。"
+                )
+        return cls._shared_client
+
+    async def call_agent(
+        self,
+        system_prompt: str,
+        user_message: str,
+        max_tokens: int = 8192,
+        temperature: float = 0.7,
+        context: str = "",
+        stream_to: Optional[Path] = None,
+        stats: Optional[CallStats] = None,
+        model: Optional[str] = None,
+    ) -> str:
+        """
+        エージェントを呼び出してテキストレスポンスを返す（asyncio 版）。
+        引数と戻り値は CastleAPIClient.call_agent と同じ。
+        """
+        client = self._get_client()
+        stats = stats if stats is not None else CallStats()
+        requested = model or self.model
+        policy = self.guard.policy
+        estimated = self.pool.estimate_tokens(system_prompt + context + user_message) + max_tokens
+
+        stats.started_at = time.time()
+        for attempt in range(policy.max_retries + 1):
+            stats.model, wait_sec = self.guard.route(requested)
+            stats.failover = stats.model != requested
+            await asyncio.sleep(wait_sec)
+            params = build_message_params(
+                stats.model, system_prompt, user_message, max_tokens, temperature,
+                context=context, prompt_cache=self.prompt_cache,
+            )
+            attempt_started = time.monotonic()
+            try:
+                text, response = await self._attempt(client, params, estimated, stats, stream_to)
+                break
+            except Exception as e:
+                if not is_transient(e):
+                    raise
+                self.guard.record_failure(stats.model)
+                if attempt == policy.max_retries:
+                    raise
+                stats.retries += 1
+                await asyncio.sleep(policy.backoff(attempt, e))
+        self.guard.record_success(stats.model, max_tokens, time.monotonic() - attempt_started)
+        stats.finished_at = time.time()
+
+        stats.record_usage(response.usage)
+        stats.add_to(self.usage)
+        return text
+
+    async def _attempt(self, client, params: dict, estimated: int, stats: CallStats, stream_to: Optional[Path]):
+        """CastleAPIClient._attempt の asyncio 版。二の矢が先に返れば、遅れた方は取り消す"""
+        if stream_to is not None:
+            return await self._send(client, params, estimated, stats, stream_to)
+        delay = self.guard.hedge_delay(params["model"], params["max_tokens"])
+        if delay is None:
+            return await self._send(client, params, estimated, stats, None)
+
+        pending = {asyncio.create_task(self._send(client, params, estimated, stats, None))}
+        try:
+            done, _ = await asyncio.wait(pending, timeout=delay)
+            if not done:
+                stats.hedges += 1
+                pending.add(asyncio.create_task(self._send(client, params, estimated, stats, None)))
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _send(self, client, params: dict, estimated: int, stats: CallStats, stream_to: Optional[Path]):
+        """関所を通って1回送る（再試行の待ち時間中は関所の枠を空けておく）"""
+        async with self.pool:
+            await self.pool.reserve(estimated)
+            try:
+                if stream_to is not None:
+                    with StreamingOutput(stream_to, stats) as output:
+                        async with client.messages.stream(**params) as stream:
+                            async for text in stream.text_stream:
+                                output.write(text)
+                            response = await stream.get_final_message()
+                    text = output.text
+                else:
+                    response = await client.messages.create(**params)
+                    text = response_text(response)
+            except BaseException:
+                self.pool.settle(estimated, 0)
+                raise
+        usage = response.usage
+        self.pool.settle(
+            estimated,
+            usage.input_tokens + (getattr(usage, "cache_creation_input_tokens", 0) or 0) + usage.output_tokens,
+        )
+        return text, response
+
+
+class BatchRequestError(RuntimeError):
+    """束の中の1件が成功しなかった（transient なら次の束に出し直してよい）"""
+
+    # 出し直してよい失敗（過負荷・サーバー側の不調・束ごと期限切れ・取り消し）
+    TRANSIENT_TYPES = {"overloaded_error", "api_error", "rate_limit_error", "expired", "canceled"}
+
+    def __init__(self, custom_id: str, reason: str):
+        super().__init__(f"無念！一括注文 {custom_id} が不首尾に終わりました: {reason}")
+        self.custom_id = custom_id
+        self.reason = reason
+
+    @property
+    def transient(self) -> bool:
+        return self.reason in self.TRANSIENT_TYPES
+
+
+class AnthropicBatchServer:
+    """Message Batches API（本番）。LocalBatchServer と同じ create / status / results で応じる"""
+
+    def __init__(self):
+        self._client = None
+
+    def _get_client(self):
+        """遅延初期化で AsyncAnthropic client を取得（束の問い合わせは短いので接続は共有しない）"""
+        if self._client is None:
+            try:
+                from anthropic import AsyncAnthropic
+                self._client = AsyncAnthropic()
+            except ImportError:
+                raise ImportError(
+                    "無念！anthropic パッケージが見つかりませぬ。\n"
+                    "  pip install anthropic\n"
+                    "を実行してくだされ。"
+                )
+        return self._client
+
+    async def create(self, requests: list[dict]) -> str:
+        batch = await self._get_client().messages.batches.create(requests=requests)
+        return batch.id
+
+    async def status(self, batch_id: str) -> str:
+        batch = await self._get_client().messages.batches.retrieve(batch_id)
+        return batch.processing_status
+
+    async def results(self, batch_id: str) -> list[dict]:
+        entries = await self._get_client().messages.batches.results(batch_id)
+        return [entry.model_dump() async for entry in entries]
+
+
+def load_batch_server(spec: str):
+    """
+    --batch-server の指定から一括注文所を作る。
+    anthropic（本番）・local（castle_batch.LocalBatchServer）・<module>:<関数名>（自前の代役）
+    """
+    if spec == "anthropic":
+        return AnthropicBatchServer()
+    if spec == "local":
+        return LocalBatchServer()
+    module_name, sep, factory_name = spec.partition(":")
+    if not (sep and module_name and factory_name):
+        raise ValueError(f"--batch-server は anthropic / local / <module>:<関数名> のいずれかで指定してくだされ: {spec}")
+    try:
+        factory = getattr(importlib.import_module(module_name), factory_name)
+    except (ImportError, AttributeError) as e:
+        raise ValueError(f"無念！一括注文所 {spec} を呼び出せませぬ: {e}")
+    return factory()
+
+
+class MessageBatcher:
+    """
+    全軍議の「いま出せる」呼び出しを束ねて、1つの Message Batch として出す。
+
+    新しい依頼が gather_window 秒途絶えたら（＝どの軍議も返事待ちで手が止まったら）束を出し、
+    poll_interval 秒ごとに処理の終わりを問い合わせ、終われば各依頼に結果を振り分ける。
+    返事を受け取った軍議は次の段の依頼を出し、それがまた次の束になる。
+    束の処理中でも次の束は出せる（件数・大きさが API の上限を超える分も別の束に分ける）。
+    """
+
+    def __init__(
+        self,
+        server,
+        gather_window: float = DEFAULT_BATCH_GATHER_WINDOW,
+        poll_interval: float = DEFAULT_BATCH_POLL_INTERVAL,
+        max_requests: int = BATCH_MAX_REQUESTS,
+        max_bytes: int = BATCH_MAX_BYTES,
+    ):
+        self.server = server
+        self.gather_window = gather_window
+        self.poll_interval = poll_interval
+        self.max_requests = max_requests
+        self.max_bytes = max_bytes
+        self.pending: list[tuple[dict, asyncio.Future]] = []
+        self.submitted = 0  # 出した束の数
+        self._ids = itertools.count(1)
+        self._last_submit = 0.0
+        self._flusher: Optional[asyncio.Task] = None
+        self._running: set[asyncio.Task] = set()
+
+    async def submit(self, params: dict) -> dict:
+        """依頼1件を次の束に入れ、結果の message（dict）を待つ"""
+        request = {"custom_id": f"req_{next(self._ids):08d}", "params": params}
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append((request, future))
+        self._last_submit = time.monotonic()
+        if self._flusher is None:
+            self._flusher = asyncio.create_task(self._flush_when_quiet())
+        return await future
+
+    def _take(self) -> list[tuple[dict, asyncio.Future]]:
+        """上限に収まるだけ先頭から取る"""
+        size = 0
+        for count, (request, _) in enumerate(self.pending):
+            size += len(json.dumps(request, ensure_ascii=False).encode("utf-8"))
+            if count == self.max_requests or (count and size > self.max_bytes):
+                break
+        else:
+            count = len(self.pending)
+        taken, self.pending = self.pending[:count], self.pending[count:]
+        return taken
+
+    async def _flush_when_quiet(self):
+        while self.pending:
+            quiet = time.monotonic() - self._last_submit
+            if quiet < self.gather_window and len(self.pending) < self.max_requests:
+                await asyncio.sleep(self.gather_window - quiet)
+                continue
+            task = asyncio.create_task(self._run(self._take()))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+        self._flusher = None
+
+    async def _run(self, entries: list[tuple[dict, asyncio.Future]]):
+        try:
+            batch_id = await self.server.create([request for request, _ in entries])
+            self.submitted += 1
+            print(f"{Color.DIM}  📮 一括注文 {batch_id}: {len(entries)}件を差し出しました{Color.RESET}")
+            while await self.server.status(batch_id) != "ended":
+                await asyncio.sleep(self.poll_interval)
+            results = {entry["custom_id"]: entry["result"] for entry in await self.server.results(batch_id)}
+        except Exception as e:
+            for _, future in entries:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        failed = 0
+        for request, future in entries:
+            result = results.get(request["custom_id"], {"type": "expired"})
+            if future.done():
+                continue
+            if result["type"] == "succeeded":
+                future.set_result(result["message"])
+                continue
+            failed += 1
+            reason = result["type"]
+            if reason == "errored":
+                reason = result.get("error", {}).get("error", {}).get("type", "errored")
+            future.set_exception(BatchRequestError(request["custom_id"], reason))
+        print(f"{Color.DIM}  📮 一括注文 {batch_id}: 返事が揃いました"
+              f"（成功 {len(entries) - failed}件 | 不首尾 {failed}件）{Color.RESET}")
+
+
+class BatchCastleAPIClient:
+    """
+    AsyncCastleAPIClient の代わりに MessageBatcher へ依頼を出すクライアント（--batch-api）。
+
+    引数と戻り値は AsyncCastleAPIClient.call_agent と同じだが、返事は束の処理が終わるまで届かない。
+    接続を開いたまま待たないので、1台で数千の軍議を同時に進められる。
+    ストリーミング・二の矢・遮断器は使わず、過負荷などで不首尾に終わった依頼は次の束に出し直す。
+    """
+
+    def __init__(self, batcher: MessageBatcher, model: str = DEFAULT_MODEL, prompt_cache: bool = True):
+        self.batcher = batcher
+        self.model = model
+        self.prompt_cache = prompt_cache
+        self.usage = new_usage_totals()
+
+    async def call_agent(
+        self,
+        system_prompt: str,
+        user_message: str,
+        max_tokens: int = 8192,
+        temperature: float = 0.7,
+        context: str = "",
+        stream_to: Optional[Path] = None,
+        stats: Optional[CallStats] = None,
+        model: Optional[str] = None,
+    ) -> str:
+        """エージェントを呼び出してテキストレスポンスを返す（stream_to は使わない）"""
+        stats = stats if stats is not None else CallStats()
+        stats.model = model or self.model
+        stats.batch = True
+        params = build_message_params(
+            stats.model, system_prompt, user_message, max_tokens, temperature,
+            context=context, prompt_cache=self.prompt_cache,
+        )
+        max_retries = CallGuard.shared().policy.max_retries
+
+        stats.started_at = time.time()
+        for attempt in range(max_retries + 1):
+            try:
+                message = await self.batcher.submit(params)
+                break
+            except BatchRequestError as e:
+                if not e.transient or attempt == max_retries:
+                    raise
+                stats.retries += 1
+        stats.finished_at = time.time()
+
+        stats.record_usage(SimpleNamespace(**message["usage"]))
+        stats.add_to(self.usage)
+        return "".join(block.get("text", "") for block in message["content"] if block.get("type") == "text")
+
+
+# 再生時にストリーミング出力を何回に分けて書くか
+REPLAY_STREAM_CHUNKS = 8
+
+
+def _cassette_request(model: str, system_prompt: str, user_message: str, max_tokens: int, temperature: float,
+                      context: str) -> dict:
+    return {
+        "model": model,
+        "system_prompt": system_prompt,
+        "context": context,
+        "user_message": user_message,
+        "max_tokens": max_tokens,
+        "temperature": temperature,
+    }
+
+
+class RecordingAPIClient:
+    """
+    CastleAPIClient をくるみ、依頼と返事を写し帳（castle_cassette.Cassette）に録る（--record）。
+    呼び出しそのものは中のクライアントに任せるので、再試行・二の矢・ストリーミングもそのまま効く。
+    """
+
+    def __init__(self, inner, cassette: Cassette):
+        self.inner = inner
+        self.cassette = cassette
+
+    @property
+    def model(self) -> str:
+        return self.inner.model
+
+    @property
+    def usage(self) -> dict:
+        return self.inner.usage
+
+    def _record(self, request: dict, text: str, stats: CallStats):
+        self.cassette.record(
+            request,
+            text,
+            {kind: getattr(stats, kind) for kind in new_usage_totals()},
+            model=stats.model,
+            ttft_sec=stats.time_to_first_token,
+            duration_sec=stats.duration,
+        )
+
+    def call_agent(
+        self,
+        system_prompt: str,
+        user_message: str,
+        max_tokens: int = 8192,
+        temperature: float = 0.7,
+        context: str = "",
+        stream_to: Optional[Path] = None,
+        stats: Optional[CallStats] = None,
+        model: Optional[str] = None,
+    ) -> str:
+        stats = stats if stats is not None else CallStats()
+        text = self.inner.call_agent(
+            system_prompt, user_message, max_tokens, temperature, context,
+            stream_to=stream_to, stats=stats, model=model,
+        )
+        request = _cassette_request(model or self.model, system_prompt, user_message, max_tokens, temperature, context)
+        self._record(request, text, stats)
+        return text
+
+
+class AsyncRecordingAPIClient(RecordingAPIClient):
+    """RecordingAPIClient の asyncio 版（AsyncCastleAPIClient をくるむ）"""
+
+    async def call_agent(
+        self,
+        system_prompt: str,
+        user_message: str,
+        max_tokens: int = 8192,
+        temperature: float = 0.7,
+        context: str = "",
+        stream_to: Optional[Path] = None,
+        stats: Optional[CallStats] = None,
+        model: Optional[str] = None,
+    ) -> str:
+        stats = stats if stats is not None else CallStats()
+        text = await self.inner.call_agent(
+            system_prompt, user_message, max_tokens, temperature, context,
+            stream_to=stream_to, stats=stats, model=model,
+        )
+        request = _cassette_request(model or self.model, system_prompt, user_message, max_tokens, temperature, context)
+        self._record(request, text, stats)
+        return text
+
+
+class ReplayAPIClient:
+    """
+    写し帳の返事を API なしで返すクライアント（--replay）。
+
+    プロンプトは本番と同じく組み立てられ、返事は ReplayTiming の待ち時間を置いて届く
+    （ストリーミング時は最初の一字まで待ってから少しずつ書き出す）。
+    軍議ごとに1つ作る — 同じ家臣の何回目の依頼かを数える cursor を軍議ごとに持つため。
+    """
+
+    def __init__(self, cassette: Cassette, timing: Optional[ReplayTiming] = None, model: str = DEFAULT_MODEL):
+        self.cassette = cassette
+        self.timing = timing or ReplayTiming()
+        self.model = model
+        self.usage = new_usage_totals()
+        self._usage_lock = threading.Lock()  # 同期版は動員の worker スレッドから同時に足される
+        self.cursor: dict[str, int] = {}
+
+    def _begin(self, request: dict, stats: CallStats):
+        """(写し帳の返事, 最初の一字までの秒数, 所要秒数)"""
+        interaction = self.cassette.find(request, self.cursor)
+        stats.model = request["model"]
+        stats.started_at = time.time()
+        return interaction, *self.timing.delays(interaction)
+
+    def _chunks(self, text: str) -> list[str]:
+        size = max(1, -(-len(text) // REPLAY_STREAM_CHUNKS))
+        return [text[i:i + size] for i in range(0, len(text), size)] or [""]
+
+    def _finish(self, interaction, stats: CallStats) -> str:
+        stats.finished_at = time.time()
+        for kind in new_usage_totals():
+            setattr(stats, kind, interaction.usage.get(kind, 0))
+        with self._usage_lock:
+            stats.add_to(self.usage)
+        return interaction.response
+
+    def call_agent(
+        self,
+        system_prompt: str,
+        user_message: str,
+        max_tokens: int = 8192,
+        temperature: float = 0.7,
+        context: str = "",
+        stream_to: Optional[Path] = None,
+        stats: Optional[CallStats] = None,
+        model: Optional[str] = None,
+    ) -> str:
+        stats = stats if stats is not None else CallStats()
+        request = _cassette_request(model or self.model, system_prompt, user_message, max_tokens, temperature, context)
+        interaction, ttft, duration = self._begin(request, stats)
+        if stream_to is None:
+            time.sleep(duration)
+            return self._finish(interaction, stats)
+        time.sleep(ttft)
+        chunks = self._chunks(interaction.response)
+        with StreamingOutput(stream_to, stats) as output:
+            for chunk in chunks:
+                output.write(chunk)
+                time.sleep((duration - ttft) / len(chunks))
+        return self._finish(interaction, stats)
+
+
+class AsyncReplayAPIClient(ReplayAPIClient):
+    """ReplayAPIClient の asyncio 版"""
+
+    async def call_agent(
+        self,
+        system_prompt: str,
+        user_message: str,
+        max_tokens: int = 8192,
+        temperature: float = 0.7,
+        context: str = "",
+        stream_to: Optional[Path] = None,
+        stats: Optional[CallStats] = None,
+        model: Optional[str] = None,
+    ) -> str:
+        stats = stats if stats is not None else CallStats()
+        request = _cassette_request(model or self.model, system_prompt, user_message, max_tokens, temperature, context)
+        interaction, ttft, duration = self._begin(request, stats)
+        if stream_to is None:
+            await asyncio.sleep(duration)
+            return self._finish(interaction, stats)
+        await asyncio.sleep(ttft)
+        chunks = self._chunks(interaction.response)
+        with StreamingOutput(stream_to, stats) as output:
+            for chunk in chunks:
+                output.write(chunk)
+                await asyncio.sleep((duration - ttft) / len(chunks))
+        return self._finish(interaction, stats)
+
+
+class AgentOutputCache:
+    """
+    エージェント出力の蔵（内容アドレス型のディスクキャッシュ）。
+
+    (model, system prompt, context, user message, max_tokens, temperature) のハッシュをキーに
+    レスポンス本文を保存する。終盤で倒れた軍議を同じテーマでやり直す場合など、
+    入力が完全に一致する呼び出しは API を使わずに蔵出しする。
+    """
+
+    def __init__(
+        self,
+        cache_dir: Path = CACHE_DIR,
+        max_age_days: float = DEFAULT_CACHE_MAX_AGE_DAYS,
+        max_mb: float = DEFAULT_CACHE_MAX_MB,
+    ):
+        self.cache_dir = cache_dir
+        self.max_age_sec = max_age_days * 86400
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(
+        model: str,
+        system_prompt: str,
+        user_message: str,
+        max_tokens: int,
+        temperature: float,
+        context: str = "",
+    ) -> str:
+        payload = json.dumps(
+            ["v2", model, system_prompt, context, user_message, max_tokens, temperature],
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _entry_path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def get(self, key: str, refresh: bool = False) -> Optional[str]:
+        """蔵出し。期限切れ・強制再取得（refresh）の場合は None"""
+        path = self._entry_path(key)
+        if refresh or not path.exists():
+            self.misses += 1
+            return None
+        try:
+            if time.time() - path.stat().st_mtime > self.max_age_sec:
+                path.unlink(missing_ok=True)
+                self.misses += 1
+                return None
+            entry = json.loads(path.read_text(encoding="utf-8"))
+            os.utime(path)  # 最近使った順で追い出すため
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry["text"]
+
+    def put(self, key: str, text: str, model: str):
+        """蔵入れ（一時ファイル経由で書き込み、途中で倒れても壊れた蔵を残さない）"""
+        if not text:
+            return
+        path = self._entry_path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        entry = {"model": model, "created_at": time.time(), "text": text}
+        tmp_path = path.with_suffix(f".{secrets.token_hex(4)}.tmp")
+        tmp_path.write_text(json.dumps(entry, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp_path, path)
+
+    def evict(self):
+        """期限切れの蔵を捨て、容量超過分は古い（最後に使われた時刻の古い）順に捨てる"""
+        if not self.cache_dir.exists():
+            return
+        now = time.time()
+        entries = []
+        for path in self.cache_dir.glob("*/*.json"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            if now - stat.st_mtime > self.max_age_sec:
+                path.unlink(missing_ok=True)
+            else:
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+
+
+@dataclass
+class ReviewPolicy:
+    """
+    御意見番 → 代筆の推敲の回数と打ち切り条件。
+    1回目は通常の家臣の流れで行い、2回目以降は代筆の持ち場の中で繰り返す。
+    予算（秒・トークン）は2回目以降の推敲に使う分で、次の1回が予算に収まりそうにない時点で打ち切る。
+    """
+    max_rounds: int = DEFAULT_MAX_REVIEW_ROUNDS
+    threshold: int = DEFAULT_REVIEW_THRESHOLD  # 批評の重さがこれを下回れば打ち切る（0=◎, 1=○, 2=△, 3=×）
+    min_change: float = DEFAULT_REVIEW_MIN_CHANGE  # 書き直しによる変化率がこれを下回れば打ち切る
+    budget_sec: Optional[float] = None
+    budget_tokens: Optional[int] = None
+
+    def over_budget(self, elapsed: float, tokens: int, rounds_done: int) -> Optional[str]:
+        """
+        次の1回を始めると予算を超えそうなら、その理由を返す。
+        1回分の費用はそれまでの回の平均で見積もる（まだ1回も終えていなければ予算が残っている限り始める）。
+        """
+        def exceeds(spent: float, budget: float) -> bool:
+            next_round = spent / rounds_done if rounds_done else 0
+            return budget <= 0 or spent + next_round > budget
+
+        if self.budget_sec is not None and exceeds(elapsed, self.budget_sec):
+            return f"刻限（{self.budget_sec:g}秒）"
+        if self.budget_tokens is not None and exceeds(tokens, self.budget_tokens):
+            return f"兵糧（{self.budget_tokens}トークン）"
+        return None
+
+
+@dataclass
+class AgentCall:
+    """
+    家臣の手順（ジェネレーター）が進め役に頼む API 呼び出し1件。
+    手順は AgentCall（1件）・AgentCall のリスト（同時に）・先回りの Future / asyncio.Task（結果を待つ）を yield し、
+    その結果を送り返してもらう。同じ手順をスレッド版（_drive）と asyncio 版（_drive_async）の両方で進める。
+    """
+    name_en: str
+    label: str
+    request: dict
+
+
+# ---------------------------------------------------------------------------
+# メインオーケストレーター
+# ---------------------------------------------------------------------------
 
 class WarCouncil:
     """
@@ -445,275 +2386,1995 @@ class WarCouncil:
         model: str = DEFAULT_MODEL,
         dry_run: bool = False,
         vault_root: Path = VAULT_ROOT,
+        max_parallel: int = DEFAULT_MAX_PARALLEL,
+        async_api: Optional[AsyncCastleAPIClient] = None,
+        api: Optional[CastleAPIClient] = None,
+        run_id: Optional[str] = None,
+        workspace: Optional[CastleWorkspace] = None,
+        cache: Optional[AgentOutputCache] = None,
+        refresh_agents: Optional[list[str]] = None,
+        resume: bool = False,
+        rebuild_from: Optional[str] = None,
+        stream: bool = False,
+        prompt_cache: bool = True,
+        local_executors: bool = True,
+        section_parallel: bool = False,
+        diff_rewrite: bool = False,
+        review: Optional[ReviewPolicy] = None,
+        speculate: bool = False,
+        routing: Optional[RoutingTable] = None,
+        tasks: Optional[TaskQueue] = None,
+        vault_top_k: int = DEFAULT_VAULT_TOP_K,
     ):
         self.theme = theme
         self.model = model
         self.dry_run = dry_run
         self.vault_root = vault_root
-        self.logger = WarCouncilLogger()
-        self.api = CastleAPIClient(model=model)
+        self.vault_top_k = max(0, vault_top_k)
+        self.max_parallel = max(1, max_parallel)
+        self.workspace = workspace or CastleWorkspace.for_run(run_id)
+        self.logger = WarCouncilLogger(log_dir=self.workspace.root)
+        self.artifacts = ArtifactStore(self.workspace)
+        self.api = api or CastleAPIClient(model=model, prompt_cache=prompt_cache)
+        self.async_api = async_api or AsyncCastleAPIClient(model=model, prompt_cache=prompt_cache)
+        self.cache = cache  # None ならキャッシュなし
+        self.refresh_agents = {name.lower() for name in refresh_agents or []}
+        self.stream = stream
+        self.streamed: set[Path] = set()  # ストリーミングで実際に書き出し終えた出力ファイル（蔵出しは含まない）
+        self.local_executors = local_executors
+        self.section_parallel = section_parallel
+        self.diff_rewrite = diff_rewrite
+        self.review = review or ReviewPolicy()
+        self.speculate = speculate
+        self.routing = routing or RoutingTable()
+        self.routes = {agent.name_en: self.routing.resolve(agent.name_en, agent.route) for agent in RETAINERS}
+        self.routes["Karo"] = self.routing.resolve("Karo", KARO_ROUTE)
+        self.resilience: dict[str, dict[str, int]] = {}  # name_en -> 再試行・二の矢・代わりのモデルの回数
+        self._resilience_lock = threading.Lock()
+        self.speculations: dict = {}  # name_en -> 先回りの Future / asyncio.Task
+        self.tasks = tasks  # None なら家臣は全員この軍議の中で動く
+        self.remote_usage = new_usage_totals()  # 働き手が使ったトークン数
+        self.errors: dict[str, str] = {}  # name_en -> 倒れた理由（働き手が持ち場帳へ報告する）
+        self.resume = resume
+        if resume or rebuild_from:
+            self.manifest = RunManifest.load(self.workspace, store=self.artifacts)
+            self.theme = self.theme or self.manifest.theme
+        else:
+            self.manifest = RunManifest(self.workspace, theme=theme, model=model, store=self.artifacts)
+        self.fallbacks: set[str] = set()
+        self.tracer = Tracer(self.run_id, self.theme)
+
+        # --rebuild-from: 手直しされた成果物を活かし、その下流だけを作り直す
+        self.kept: set[str] = set()
+        self.stale: set[str] = set()
+        if rebuild_from:
+            self.resume = True
+            producer, downstream = plan_rebuild(RETAINERS, rebuild_from)
+            if producer is not None:
+                self.kept.add(producer.name_en)
+            self.stale = {agent.name_en for agent in downstream}
+            if rebuild_from != KARO_OUTPUT_REL:
+                self.stale.add("Karo")
+            self.refresh_agents |= {name.lower() for name in self.stale}
         self.results: dict[str, str] = {}  # agent_name -> output content
-        self.current_phase: Optional[Phase] = None
+        self.announced_phases: list[Phase] = []
+
+    @property
+    def run_id(self) -> str:
+        return self.workspace.run_id
 
     def _ensure_dirs(self):
         """作業ディレクトリを確保"""
-        for floor in [
-            FLOOR_STRATEGY, FLOOR_BLUEPRINT, FLOOR_LIBRARY,
-            FLOOR_WRITING, FLOOR_TENSHUKAKU, FLOOR_GALLERY,
-        ]:
-            floor.mkdir(parents=True, exist_ok=True)
+        self.workspace.ensure()
+
+    def _load_vault_context(self) -> str:
+        """Vault内の戦略・テンプレート情報を読み込む（軍議中は1回だけ読む）"""
+        context_parts = []
+
+        # Strategy.md
+        strategy = self.artifacts.read_external(self.vault_root / "Strategy" / "Strategy.md")
+        if strategy is not None:
+            context_parts.append(f"## Strategy.md（執筆戦略ガイド）\n\n{strategy}")
+
+        # Article Template
+        article = self.artifacts.read_external(self.vault_root / "Templates" / "Article.md")
+        if article is not None:
+            context_parts.append(f"## Article Template\n\n{article}")
+
+        # Assets
+        assets = self.artifacts.read_external(self.vault_root / "Assets" / "Assets.md")
+        if assets is not None:
+            context_parts.append(f"## Assets（表現集）\n\n{assets}")
+
+        return "\n\n---\n\n".join(context_parts)
+
+    def _build_user_message(self, agent: Agent, gate: Optional[PreGate] = None) -> str:
+        """エージェント用のユーザーメッセージを構築（下検分済みなら手直し後の入力と残件を渡す）"""
+        parts = [f"# 将軍の勅命（テーマ）\n\n「{self.theme}」\n"]
+
+        # 入力ファイルの内容を添付
+        for input_rel in agent.input_files:
+            content = gate.inputs.get(input_rel) if gate else self.artifacts.read(input_rel)
+            if content is not None:
+                parts.append(f"## 参照資料: {input_rel}\n\n{content}")
+            else:
+                parts.append(f"## 参照資料: {input_rel}\n\n（※ファイル未作成）")
+
+        if gate and gate.notes:
+            parts.append(gate.notes)
+
+        return "\n\n---\n\n".join(parts)
+
+    def _retrieve_vault(self, query: str, budget: int, sources: Optional[tuple[str, ...]] = None) -> str:
+        """Vault の索引から、テーマと持ち場の問いに効く抜粋を予算に収まるだけ選ぶ"""
+        index = load_index(self.vault_root, VAULT_INDEX_PATH)
+        return render_vault_chunks(index.select(f"{self.theme} {query}", self.vault_top_k, budget, sources))
+
+    def _build_vault_block(self, agent: Agent) -> str:
+        """
+        Vault戦略コンテキスト（vault_budget を持つ家臣に付与）。
+        ユーザーメッセージより前の prompt cache 区画に置く。--vault-top-k 0 なら資料を丸ごと、
+        それ以外はテーマと持ち場に効く抜粋だけを添える（同じテーマ・同じ家臣なら同じ抜粋になる）。
+        """
+        if not agent.vault_budget:
+            return ""
+        if self.vault_top_k:
+            vault_ctx = self._retrieve_vault(agent.vault_query, agent.vault_budget)
+        else:
+            vault_ctx = self._load_vault_context()
+        return f"## Vault 戦略コンテキスト\n\n{vault_ctx}" if vault_ctx else ""
+
+    def _announce_phase(self, phase: Phase):
+        """フェーズヘッダーを RETAINERS の定義順に一度だけ出力"""
+        phase_order = list(dict.fromkeys(agent.phase for agent in RETAINERS))
+        if phase in self.announced_phases or phase not in phase_order:
+            return
+        for earlier in phase_order[: phase_order.index(phase) + 1]:
+            if earlier not in self.announced_phases:
+                self.announced_phases.append(earlier)
+                self.logger.phase_start(earlier)
+
+    def _model_for(self, name_en: str) -> str:
+        return self.routing.model_for(self.routes[name_en], self.model)
+
+    def _routed(self, name_en: str, user_message: str) -> dict:
+        """家臣の振り分け（モデル・入力の長さに合わせた出力上限・温度）を call_agent の引数にする"""
+        route = self.routes[name_en]
+        return {
+            "model": self._model_for(name_en),
+            "max_tokens": route.budget(CastleRequestPool.estimate_tokens(user_message)),
+            "temperature": route.temperature,
+        }
+
+    def _cache_lookup(self, name_en: str, name_jp: str, request: dict) -> tuple[Optional[str], Optional[str]]:
+        """
+        蔵を引く。
+        Returns: (キャッシュキー, 蔵出しした出力) — キャッシュ無効ならどちらも None
+        """
+        if self.cache is None:
+            return None, None
+        params = {k: v for k, v in request.items() if k != "model"}
+        key = self.cache.make_key(request.get("model") or self.model, **params)
+        refresh = bool({name_en.lower(), name_jp} & self.refresh_agents)
+        cached = self.cache.get(key, refresh=refresh)
+        if cached is not None:
+            self.logger.cache_hit(name_jp)
+        return key, cached
+
+    def _tally_resilience(self, name_en: str, stats: CallStats):
+        """家臣ごとの再試行・二の矢・代わりのモデルの回数を集計する"""
+        if not (stats.retries or stats.hedges or stats.failover):
+            return
+        with self._resilience_lock:
+            tally = self.resilience.setdefault(name_en, {"retries": 0, "hedges": 0, "failovers": 0})
+            tally["retries"] += stats.retries
+            tally["hedges"] += stats.hedges
+            tally["failovers"] += int(stats.failover)
+
+    def _trace_call(self, name_en: str, label: str, stats: CallStats, request: dict, error: str = ""):
+        """API 呼び出し1回をスパンに残す（倒れた呼び出しも、再試行・二の矢の回数ごと残す）"""
+        finished_at = stats.finished_at or time.time()
+        prompt = request["system_prompt"] + request.get("context", "") + request["user_message"]
+        self.tracer.record_call(
+            name_en, label, stats.started_at or finished_at, finished_at,
+            model=stats.model,
+            tokens={kind: getattr(stats, kind) for kind in TOKEN_KINDS},
+            ttft_sec=stats.time_to_first_token,
+            retries=stats.retries,
+            hedges=stats.hedges,
+            failover=stats.failover,
+            discount=BATCH_DISCOUNT if stats.batch else 1.0,
+            prompt_bytes=len(prompt.encode("utf-8")),
+            error=error,
+        )
+
+    def _call_agent(self, name_en: str, name_jp: str, output_path: Optional[Path], **request) -> str:
+        """
+        CastleAPIClient.call_agent をキャッシュ越しに呼ぶ。
+        ストリーミング有効時は output_path へ届いた分から書き出す（None なら書き出さない）。
+        """
+        key, cached = self._cache_lookup(name_en, name_jp, request)
+        if cached is not None:
+            now = time.time()
+            self.tracer.record_call(name_en, name_jp, now, now, model=request.get("model") or self.model, cached=True)
+            return cached
+        stats = CallStats()
+        error = ""
+        try:
+            response = self.api.call_agent(
+                **request,
+                stream_to=output_path if self.stream else None,
+                stats=stats,
+            )
+        except Exception as e:
+            error = str(e)
+            raise
+        finally:
+            self._tally_resilience(name_en, stats)
+            self._trace_call(name_en, name_jp, stats, request, error)
+        if self.stream and output_path is not None:
+            self.streamed.add(output_path)
+        self.logger.call_metrics(name_jp, stats)
+        if key is not None:
+            self.cache.put(key, response, stats.model)
+        return response
+
+    async def _call_agent_async(self, name_en: str, name_jp: str, output_path: Optional[Path], **request) -> str:
+        """_call_agent の asyncio 版"""
+        key, cached = self._cache_lookup(name_en, name_jp, request)
+        if cached is not None:
+            now = time.time()
+            self.tracer.record_call(name_en, name_jp, now, now, model=request.get("model") or self.model, cached=True)
+            return cached
+        stats = CallStats()
+        error = ""
+        try:
+            response = await self.async_api.call_agent(
+                **request,
+                stream_to=output_path if self.stream else None,
+                stats=stats,
+            )
+        except Exception as e:
+            error = str(e)
+            raise
+        finally:
+            self._tally_resilience(name_en, stats)
+            self._trace_call(name_en, name_jp, stats, request, error)
+        if self.stream and output_path is not None:
+            self.streamed.add(output_path)
+        self.logger.call_metrics(name_jp, stats)
+        if key is not None:
+            self.cache.put(key, response, stats.model)
+        return response
+
+    def _checkpoint_state(self, name: str, input_rels: list[str], output_rel: str) -> Optional[str]:
+        """
+        --resume / --rebuild-from 時に前回の働きを引き継げるか判定する。
+        手直しされた出力（--rebuild-from の対象を含む）は正式な成果として陣中日誌に記録し直す。
+        """
+        if not self.resume or name in self.stale:
+            return None
+        if name in self.kept and self.artifacts.exists(output_rel):
+            state = "edited"
+        else:
+            state = self.manifest.checkpoint_state(name, input_rels, output_rel)
+        if state == "edited":
+            self.manifest.adopt_edit(name, input_rels, output_rel)
+        return state
+
+    def _resume_agent(self, agent: Agent) -> bool:
+        """--resume 時、前回の出力がまだ有効なら再出陣させずに引き継ぐ"""
+        state = self._checkpoint_state(agent.name_en, agent.input_files, agent.output_rel)
+        if state is None:
+            return False
+        self.results[agent.name_en] = self.artifacts.read(agent.output_rel)
+        self.logger.agent_resumed(agent.name_jp, agent.output_file, edited=(state == "edited"))
+        return True
+
+    def _agent_status(self, agent: Agent, success: bool) -> str:
+        if not success:
+            return "failed"
+        if agent.name_en in self.fallbacks:
+            return "fallback"
+        return "success"
+
+    def _record_agent(self, agent: Agent, input_hashes: dict, success: bool, started_at: float):
+        self.manifest.record(agent.name_en, input_hashes, agent.output_rel, self._agent_status(agent, success), started_at)
+
+    def _artifact_bytes(self, rels: list[str]) -> int:
+        return sum(len((self.artifacts.read(rel) or "").encode("utf-8")) for rel in rels)
+
+    def _start_span(self, name_en: str, name_jp: str, phase: Phase, lane: int, input_rels: list[str]):
+        """家臣（家老）1人分のスパンを開く"""
+        return self.tracer.start_agent(name_en, name_jp, phase.value, lane, bytes_read=self._artifact_bytes(input_rels))
+
+    def _end_span(self, span, status: str, output_rel: str):
+        self.tracer.end_agent(span, status, bytes_written=self._artifact_bytes([output_rel]))
+
+    def _log_agent_start(self, agent: Agent):
+        """開始ログ"""
+        opening_lines = {
+            1: "ふむ…将軍様の仰せ、承りました。戦略を練りましょう。",
+            2: "御意。闇に紛れ、情報を掴んで参ります。",
+            3: "注進！注進！偵察に出ます！",
+            4: "てやんでぃ！設計図を引くぜ！",
+            5: "クックック…お手並み拝見といきましょう。",
+            6: "然り。出典なき情報は戯言である。調査を開始する。",
+            7: "筆が乗ってまいりました！初稿を書き上げます！",
+            8: "喝！どれ、読ませてもらおうか。",
+            9: "へへぇ…書き直しますです…（泣）",
+            10: "やれやれ…一字一字、数えさせていただきますぞ。",
+            11: "…処理を開始します。紐付け作業に入ります。",
+            13: "閃いた！色が…色が呼んでいる！",
+            12: "検分、開始する。家老様のお手を煩わせるな。",
+        }
+        self.logger.agent_start(agent, opening_lines.get(agent.number, "参上！"))
+
+    def _run_agent_dry(self, agent: Agent) -> bool:
+        """ドライラン: ダミー出力"""
+        dummy_content = (
+            f"# {agent.name_jp}（{agent.name_en}）の出力\n\n"
+            f"テーマ: {self.theme}\n\n"
+            f"※ドライランのためダミー出力です。\n"
+        )
+        self.artifacts.write(agent.output_rel, dummy_content)
+        self.results[agent.name_en] = dummy_content
+        self.logger.agent_done(agent, f"→ {agent.output_file}（ドライラン）")
+        return True
+
+    def _section_outline(self, agent: Agent) -> Optional[Outline]:
+        """--section-parallel 時、H2 ごとに手分けできる見出し構成なら返す（2節未満なら None）"""
+        if not (agent.section_parallel and self.section_parallel):
+            return None
+        outline = parse_outline(self.artifacts.read(f"{FLOOR_BLUEPRINT}/structure_fixed.md") or "")
+        return outline if len(outline.sections) >= 2 else None
+
+    def _section_requests(self, agent: Agent, outline: Outline) -> list[tuple[str, dict]]:
+        """
+        冒頭と各 H2 セクションの依頼を (呼び名, call_agent の引数) で返す。
+        ペルソナと入力資料は全依頼で共通なので、prompt cache 区画（context）に置く。
+        """
+        system_prompt = agent.load_system_prompt()
+        context_parts = []
+        for rel in [f"{FLOOR_STRATEGY}/persona.md", *agent.input_files]:
+            content = self.artifacts.read(rel)
+            context_parts.append(f"## 参照資料: {rel}\n\n{content if content is not None else '（※ファイル未作成）'}")
+        context = "\n\n---\n\n".join(context_parts)
+
+        route = self.routes[agent.name_en]
+
+        def request(user_message: str, max_tokens: int) -> dict:
+            return {
+                "system_prompt": system_prompt,
+                "context": context,
+                "user_message": user_message,
+                "model": self._model_for(agent.name_en),
+                "max_tokens": max_tokens,
+                "temperature": route.temperature,
+            }
+
+        requests = [(f"{agent.name_jp}・冒頭", request(header_message(self.theme, outline.titles), 2048))]
+        for index, section in enumerate(outline.sections):
+            requests.append((
+                f"{agent.name_jp}・{section.title}",
+                request(section_message(self.theme, outline.titles, index, section), route.max_tokens),
+            ))
+        return requests
+
+    @staticmethod
+    def _assemble_sections(outline: Outline, responses: list[str]) -> list[str]:
+        """冒頭と各セクションの出力を構成順に揃える（見出しの欠けたセクションには補う）"""
+        header = responses[0].strip("\n") + "\n"
+        return [header] + [
+            ensure_heading(text, section.title) for section, text in zip(outline.sections, responses[1:])
+        ]
+
+    def _drive(self, steps: Generator):
+        """家臣の手順をスレッドで進める（頼まれた呼び出しを行い、結果か例外を手順へ送り返す）"""
+        reply, error = None, None
+        while True:
+            try:
+                step = steps.throw(error) if error is not None else steps.send(reply)
+            except StopIteration as stop:
+                return stop.value
+            reply, error = None, None
+            try:
+                reply = self._run_step(step)
+            except Exception as e:
+                error = e
+
+    async def _drive_async(self, steps: Generator):
+        """_drive の asyncio 版"""
+        reply, error = None, None
+        while True:
+            try:
+                step = steps.throw(error) if error is not None else steps.send(reply)
+            except StopIteration as stop:
+                return stop.value
+            reply, error = None, None
+            try:
+                reply = await self._run_step_async(step)
+            except Exception as e:
+                error = e
+
+    def _run_step(self, step):
+        """手順の1歩（AgentCall・そのリスト・先回りの Future）をスレッドで行う"""
+        if isinstance(step, AgentCall):
+            return self._call_agent(step.name_en, step.label, None, **step.request)
+        if isinstance(step, list):
+            if not step:
+                return []
+            with ThreadPoolExecutor(max_workers=min(self.max_parallel, len(step)),
+                                    thread_name_prefix=f"{step[0].name_en}-section") as pool:
+                futures = [pool.submit(self._run_step, call) for call in step]
+                return [future.result() for future in futures]
+        return step.result()
+
+    async def _run_step_async(self, step):
+        """_run_step の asyncio 版"""
+        if isinstance(step, AgentCall):
+            return await self._call_agent_async(step.name_en, step.label, None, **step.request)
+        if isinstance(step, list):
+            return list(await asyncio.gather(*(self._run_step_async(call) for call in step)))
+        return await step
+
+    def _draft_by_section_steps(self, agent: Agent, outline: Outline) -> Generator:
+        """H2 セクションごとに同時に書かせて継ぎ合わせ、継ぎ目を整える"""
+        requests = self._section_requests(agent, outline)
+        self.logger.sections_dispatched(agent.name_jp, len(outline.sections))
+        responses = yield [AgentCall(agent.name_en, label, request) for label, request in requests]
+        parts = self._assemble_sections(outline, responses)
+
+        smoothing, targets = build_smoothing_request(parts)
+        if smoothing:
+            response = yield AgentCall(agent.name_en, f"{agent.name_jp}・継ぎ目", {
+                "system_prompt": SMOOTH_SYSTEM_PROMPT, "user_message": smoothing, "max_tokens": 2048, "temperature": 0.3,
+                "model": self._model_for(agent.name_en),
+            })
+            parts = apply_smoothing(parts, targets, response)
+        return "\n".join(parts)
+
+    def _draft_by_section(self, agent: Agent, outline: Outline) -> str:
+        return self._drive(self._draft_by_section_steps(agent, outline))
+
+    async def _draft_by_section_async(self, agent: Agent, outline: Outline) -> str:
+        return await self._drive_async(self._draft_by_section_steps(agent, outline))
+
+    def _rewrite_plan(self, agent: Agent) -> Optional[RewritePlan]:
+        """--diff-rewrite 時、構造化された批評を初稿に突き合わせられれば差分リライトの段取りを返す"""
+        if not (agent.section_rewrite and self.diff_rewrite):
+            return None
+        draft = self.artifacts.read(f"{FLOOR_WRITING}/draft_v1.md")
+        critique = parse_critique(self.artifacts.read(f"{FLOOR_WRITING}/critique_report.md") or "")
+        plan = plan_rewrite(draft, critique) if draft is not None and critique is not None else None
+        if plan is None:
+            self.logger.rewrite_fallback(agent.name_jp)
+        return plan
+
+    def _rewrite_requests(self, agent: Agent, plan: RewritePlan) -> list[tuple[int, str, dict]]:
+        """書き直す区画ごとの依頼を (区画番号, 呼び名, call_agent の引数) で返す。初稿全文は共通の prompt cache 区画に置く"""
+        system_prompt = agent.load_system_prompt()
+        context = f"## 参照資料: {FLOOR_WRITING}/draft_v1.md（初稿全文）\n\n{join_sections(plan.sections)}"
+        requests = []
+        for index, item in plan.targets:
+            # 出力上限は書き直す区画の長さから見積もる
+            user_message = rewrite_message(self.theme, plan, index, item)
+            requests.append((index, f"{agent.name_jp}・{plan.sections[index].title or '冒頭'}", {
+                "system_prompt": system_prompt,
+                "context": context,
+                "user_message": user_message,
+                **self._routed(agent.name_en, user_message),
+            }))
+        return requests
+
+    def _rewrite_by_section_steps(self, agent: Agent, plan: RewritePlan) -> Generator:
+        """指摘のあったセクションだけを同時に書き直し、元の位置に継ぎ戻す"""
+        self.logger.rewrite_planned(agent.name_jp, [plan.sections[i].title or "冒頭" for i, _ in plan.targets],
+                                    len(plan.sections))
+        requests = self._rewrite_requests(agent, plan)
+        if not requests:
+            return join_sections(plan.sections)
+        responses = yield [AgentCall(agent.name_en, label, request) for _, label, request in requests]
+        return splice_rewrite(plan, {index: text for (index, _, _), text in zip(requests, responses)})
+
+    def _rewrite_by_section(self, agent: Agent, plan: RewritePlan) -> str:
+        return self._drive(self._rewrite_by_section_steps(agent, plan))
+
+    async def _rewrite_by_section_async(self, agent: Agent, plan: RewritePlan) -> str:
+        return await self._drive_async(self._rewrite_by_section_steps(agent, plan))
+
+    def _tokens_spent(self) -> int:
+        return self.usage["input_tokens"] + self.usage["output_tokens"]
+
+    def _review_critic(self) -> Agent:
+        return next(a for a in RETAINERS if a.name_en == "Goikenban")
+
+    def _critique_request(self, critic: Agent, draft: str, round_no: int) -> dict:
+        """n 回目の批評の依頼（改訂稿を初稿の位置に置いて御意見番に読ませる）"""
+        gate = PreGate(
+            inputs={
+                f"{FLOOR_WRITING}/draft_v1.md": draft,
+                f"{FLOOR_LIBRARY}/fact_sheet.md": self.artifacts.read(f"{FLOOR_LIBRARY}/fact_sheet.md"),
+            },
+            notes=f"## 第{round_no}回の検分\n\nこれは前回までの指摘を反映した改訂稿である。まだ残っている問題だけを指摘せよ。",
+        )
+        user_message = self._build_user_message(critic, gate)
+        return {
+            "system_prompt": critic.load_system_prompt(),
+            "context": self._build_vault_block(critic),
+            "user_message": user_message,
+            **self._routed(critic.name_en, user_message),
+        }
+
+    def _full_rewrite_request(self, agent: Agent, draft: str, critique_text: str) -> dict:
+        gate = PreGate(inputs={
+            f"{FLOOR_WRITING}/draft_v1.md": draft,
+            f"{FLOOR_WRITING}/critique_report.md": critique_text,
+        })
+        user_message = self._build_user_message(agent, gate)
+        return {
+            "system_prompt": agent.load_system_prompt(),
+            "context": self._build_vault_block(agent),
+            "user_message": user_message,
+            **self._routed(agent.name_en, user_message),
+        }
+
+    def _review_verdict(self, agent: Agent, round_no: int, critique_text: str) -> Optional[Critique]:
+        """n 回目の批評を記録し、推敲を続けるなら構造化された批評を返す（打ち切るなら None）"""
+        self.artifacts.write(f"{FLOOR_WRITING}/critique_report_r{round_no}.md", critique_text)
+        critique = parse_critique(critique_text)
+        if critique is None:
+            self.logger.review_stopped(agent.name_jp, round_no, "批評の JSON が読み取れませぬ")
+            return None
+        if critique.score < self.review.threshold:
+            self.logger.review_stopped(agent.name_jp, round_no, f"批評の重さ {critique.score} が閾値 {self.review.threshold} を下回った")
+            return None
+        return critique
+
+    def _review_steps(self, agent: Agent, draft: str) -> Generator:
+        """
+        --max-review-rounds が 2 以上なら、御意見番の批評と代筆の書き直しを繰り返す。
+        批評の重さが閾値を下回る・前回からの変化が小さい・予算を使い切る、のいずれかで打ち切る。
+        """
+        if not (agent.review_loop and self.review.max_rounds > 1):
+            return draft
+        critic = self._review_critic()
+        started, tokens_before = time.monotonic(), self._tokens_spent()
+        for round_no in range(2, self.review.max_rounds + 1):
+            reason = self.review.over_budget(time.monotonic() - started, self._tokens_spent() - tokens_before, round_no - 2)
+            if reason:
+                self.logger.review_stopped(agent.name_jp, round_no, f"{reason}を使い切る")
+                break
+            critique_text = yield AgentCall(
+                critic.name_en, f"{critic.name_jp}・第{round_no}回", self._critique_request(critic, draft, round_no)
+            )
+            critique = self._review_verdict(agent, round_no, critique_text)
+            if critique is None:
+                break
+            plan = plan_rewrite(draft, critique) if self.diff_rewrite else None
+            if plan is not None:
+                revised = yield from self._rewrite_by_section_steps(agent, plan)
+            else:
+                revised = yield AgentCall(
+                    agent.name_en, f"{agent.name_jp}・第{round_no}回", self._full_rewrite_request(agent, draft, critique_text)
+                )
+            change = change_ratio(draft, revised)
+            draft = revised
+            self.logger.review_round(agent.name_jp, round_no, critique.score, change)
+            if change < self.review.min_change:
+                self.logger.review_stopped(agent.name_jp, round_no, f"変化率 {change:.1%} が {self.review.min_change:.1%} を下回った")
+                break
+        return draft
+
+    def _review_rounds(self, agent: Agent, draft: str) -> str:
+        return self._drive(self._review_steps(agent, draft))
+
+    async def _review_rounds_async(self, agent: Agent, draft: str) -> str:
+        return await self._drive_async(self._review_steps(agent, draft))
+
+    def _speculative_agents(self, finished: Agent) -> list[Agent]:
+        """finished の出力で先回りできる家臣（--resume / --rebuild-from・持ち場帳を使う時は先回りしない）"""
+        if not self.speculate or self.dry_run or self.resume or self.tasks is not None:
+            return []
+        return [a for a in RETAINERS if a.speculative_input == finished.output_rel]
+
+    def _speculative_request(self, agent: Agent) -> tuple[str, dict]:
+        """先回りの依頼（本来の入力の代わりに speculative_input を読ませる）"""
+        ahead = replace(agent, input_files=[agent.speculative_input])
+        gate = PreGate(
+            inputs={agent.speculative_input: self.artifacts.read(agent.speculative_input)},
+            notes="## 先回りの注意\n\nこの原稿にはまだ出典リンクが貼られていない。見出しと本文には一切手を加えず、画像の配置だけを行え。",
+        )
+        self.logger.speculation_started(agent.name_jp, Path(agent.speculative_input).name)
+        user_message = self._build_user_message(ahead, gate)
+        return f"{agent.name_jp}・先回り", {
+            "system_prompt": agent.load_system_prompt(),
+            "context": self._build_vault_block(agent),
+            "user_message": user_message,
+            **self._routed(agent.name_en, user_message),
+        }
+
+    def _speculative_rel(self, agent: Agent) -> str:
+        return f"{agent.floor}/{Path(agent.output_file).stem}_speculative.md"
+
+    def _speculate_steps(self, agent: Agent) -> Generator:
+        """speculative_input が出来た時点で家臣を先回りさせる（結果は本来の出番で移し替える）"""
+        label, request = self._speculative_request(agent)
+        response = yield AgentCall(agent.name_en, label, request)
+        self.artifacts.write(self._speculative_rel(agent), response)
+        return response
+
+    def _speculate(self, agent: Agent) -> str:
+        return self._drive(self._speculate_steps(agent))
+
+    async def _speculate_async(self, agent: Agent) -> str:
+        return await self._drive_async(self._speculate_steps(agent))
+
+    def _reanchor_speculation(self, agent: Agent, decorated: str) -> Optional[str]:
+        """先回りの出力を本来の入力へ見出し単位で移し替える（移せなければ None）"""
+        result = reanchor_visuals(
+            self.artifacts.read(agent.speculative_input) or "",
+            decorated,
+            self.artifacts.read(agent.input_files[0]) or "",
+        )
+        if result.text is None:
+            self.logger.speculation_discarded(agent.name_jp, result.reason)
+            return None
+        self.logger.speculation_adopted(agent.name_jp, len(result.visuals))
+        return result.text
+
+    def _adopt_speculation_steps(self, agent: Agent) -> Generator:
+        """本来の出番に先回りの結果を待ち受け、使えるなら移し替えた出力を返す"""
+        pending = self.speculations.pop(agent.name_en, None)
+        if pending is None:
+            return None
+        try:
+            decorated = yield pending
+        except Exception as e:
+            self.logger.speculation_discarded(agent.name_jp, f"先回りが倒れました: {e}")
+            return None
+        return self._reanchor_speculation(agent, decorated)
+
+    def _adopt_speculation(self, agent: Agent) -> Optional[str]:
+        return self._drive(self._adopt_speculation_steps(agent))
+
+    async def _adopt_speculation_async(self, agent: Agent) -> Optional[str]:
+        return await self._drive_async(self._adopt_speculation_steps(agent))
+
+    def _discard_speculations(self):
+        """使われずに残った先回り（軍議の中断時など）を取り消す"""
+        for pending in self.speculations.values():
+            pending.cancel()
+        self.speculations.clear()
+
+    def _run_agent_local(self, agent: Agent) -> bool:
+        """local_executor を持つ家臣は API を呼ばず手元で処理する（ドライランでも本物を動かす）"""
+        try:
+            inputs = {rel: self.artifacts.read(rel) for rel in agent.input_files}
+            response = agent.local_executor(inputs)
+            self._complete_agent(agent, response, streamed=False)
+            return True
+        except Exception as e:
+            return self._handle_agent_error(agent, e)
+
+    def _run_pre_gate(self, agent: Agent) -> Optional[PreGate]:
+        """pre_gate を持つ家臣の下検分。付帯資料を書き出し、結果を返す（対象外なら None）"""
+        if not (agent.pre_gate and self.local_executors):
+            return None
+        gate = agent.pre_gate({rel: self.artifacts.read(rel) for rel in agent.input_files})
+        for rel, content in gate.reports.items():
+            self.artifacts.write(rel, content)
+        self.logger.pre_gate(agent.name_jp, gate.summary, settled=gate.output is not None)
+        return gate
+
+    def _take_streamed(self, path: Path) -> bool:
+        """path がストリーミングで書き出し済みか（蔵出しなら書き出されていない）。印は一度で消す"""
+        if path not in self.streamed:
+            return False
+        self.streamed.discard(path)
+        return True
+
+    def _complete_agent(self, agent: Agent, response: str, streamed: Optional[bool] = None):
+        """出力を保存し、完了ログを出す"""
+        # 実際にストリーミングした出力だけはファイルが既にディスク上にある
+        was_streamed = self._take_streamed(agent.output_path(self.workspace))
+        streamed = was_streamed if streamed is None else streamed
+        self.artifacts.write(agent.output_rel, response, persisted=streamed)
+        self.results[agent.name_en] = response
+
+        closing_lines = {
+            1: f"勝機が見えました。→ {agent.output_file}",
+            2: f"…見つけました。→ {agent.output_file}",
+            3: f"敵影確認！報告完了！→ {agent.output_file}",
+            4: f"こいつはいい仕事になるぜ。→ {agent.output_file}",
+            5: f"まあ…及第点としましょう。→ {agent.output_file}",
+            6: f"調査完了。論拠は万全です。→ {agent.output_file}",
+            7: f"初稿、書き上げました！→ {agent.output_file}",
+            8: f"ふん、言いたいことは言った。→ {agent.output_file}",
+            9: f"書き直し完了です…お許しを…→ {agent.output_file}",
+            10: f"計算完了。帳簿は正確です。→ {agent.output_file}",
+            11: f"紐付け完了。承認印を押します。→ {agent.output_file}",
+            13: f"これが私の魂（ソウル）だ！→ {agent.output_file}",
+            12: f"検分完了。家老様へお回しせよ。→ {agent.output_file}",
+        }
+        self.logger.agent_done(agent, closing_lines.get(agent.number, f"完了 → {agent.output_file}"))
+
+    def _handle_agent_error(self, agent: Agent, e: Exception) -> bool:
+        """
+        エラーログを出し、続行可能ならフォールバックする。
+        Returns: フォールバックで続行できたかどうか
+        """
+        error_lines = {
+            1: f"情報不足です: {e}",
+            2: f"霧が深く情報を掴めませんでした: {e}",
+            3: f"偵察続行困難！: {e}",
+            4: f"材料が足りねえ！: {e}",
+            5: f"構成案が届きませんな: {e}",
+            6: f"書庫に火が入りました: {e}",
+            7: f"筆が折れました…: {e}",
+            8: f"初稿が届いておらん！: {e}",
+            9: f"批評レポートが見つかりません…: {e}",
+            10: f"帳簿が読めません: {e}",
+            11: f"ファイル読み込み失敗: {e}",
+            13: f"筆（API）が折れた…: {e}",
+            12: f"検分対象が届いておらぬ！: {e}",
+        }
+        self.logger.agent_error(agent, error_lines.get(agent.number, str(e)))
+        self.errors[agent.name_en] = str(e)
+
+        # 画像生成エラーの場合は続行（プレースホルダー配置）
+        if agent.number == 13:
+            # 前工程の出力をそのまま引き継ぐ
+            prev = self.artifacts.read("04_writing_room/draft_v3_linked.md")
+            if prev is not None:
+                fallback = prev + "\n\n<!-- 画像生成に失敗しました。プレースホルダーを配置しています。 -->\n"
+                self.artifacts.write(agent.output_rel, fallback)
+                self.results[agent.name_en] = fallback
+                self.fallbacks.add(agent.name_en)
+                self.logger.agent_done(agent, "プレースホルダーで続行します。")
+                return True
+        return False
+
+    def _task_options(self) -> dict:
+        """働き手が同じ持ち場を組み直すための設定（モデルの振り分け・蔵・prompt caching は働き手の設定に従う）"""
+        return {
+            "model": self.model,
+            "dry_run": self.dry_run,
+            "stream": self.stream,
+            "local_executors": self.local_executors,
+            "section_parallel": self.section_parallel,
+            "diff_rewrite": self.diff_rewrite,
+            "review": asdict(self.review),
+            "refresh_agents": sorted(self.refresh_agents),
+            "vault_top_k": self.vault_top_k,
+        }
+
+    def _enqueue_task(self, name_en: str, name_jp: str) -> Task:
+        self.artifacts.flush()
+        task = self.tasks.enqueue(
+            self.run_id, str(self.workspace.root.resolve()), name_en, self.theme, self._task_options()
+        )
+        self.logger.task_queued(name_jp, task.id)
+        return task
+
+    def _adopt_task(self, task: Task) -> Task:
+        """働き手の成果物（作業場）と呼び出しの記録をこの軍議に取り込む"""
+        self.artifacts.forget()
+        for span in self.tracer.adopt_calls(task.agent, task.calls):
+            if not span.attrs.get("cached"):
+                for kind in TOKEN_KINDS:
+                    self.remote_usage[kind] += span.attrs.get(kind, 0)
+        if task.status == "fallback":
+            self.fallbacks.add(task.agent)
+        return task
+
+    def _await_task(self, name_en: str, name_jp: str) -> Task:
+        """持ち場を持ち場帳に積み、働き手（war_council.py worker）が片付けるまで待つ"""
+        task = self._enqueue_task(name_en, name_jp)
+        while not task.finished:
+            time.sleep(TASK_POLL_INTERVAL)
+            task = self.tasks.get(task.id)
+        return self._adopt_task(task)
+
+    async def _await_task_async(self, name_en: str, name_jp: str) -> Task:
+        """_await_task の asyncio 版"""
+        task = self._enqueue_task(name_en, name_jp)
+        while not task.finished:
+            await asyncio.sleep(TASK_POLL_INTERVAL)
+            task = self.tasks.get(task.id)
+        return self._adopt_task(task)
+
+    def _finish_remote_agent(self, agent: Agent, task: Task) -> bool:
+        if task.status == "failed":
+            self.logger.agent_error(agent, f"働き手 {task.worker} の持ち場で倒れました: {task.error}")
+            return False
+        self.results[agent.name_en] = self.artifacts.read(agent.output_rel)
+        self.logger.agent_done(agent, f"→ {agent.output_file}（働き手 {task.worker}）")
+        return True
+
+    def _finish_remote_karo(self, task: Task) -> bool:
+        if task.status == "failed":
+            self.logger.karo_speaks(f"無念…働き手 {task.worker} の持ち場で倒れました: {task.error}")
+            return False
+        self.logger.shogun_delivery(self.workspace.display_path(self.final_article_path))
+        return True
+
+    def _run_agent(self, agent: Agent) -> bool:
+        """単一エージェントを実行し、陣中日誌に記録する"""
+        span = self._start_span(agent.name_en, agent.name_jp, agent.phase, agent.number, agent.input_files)
+        if self._resume_agent(agent):
+            self._end_span(span, "resumed", agent.output_rel)
+            return True
+        started_at = time.time()
+        input_hashes = self.manifest.input_hashes(agent.input_files)
+        success = self._execute_agent(agent)
+        self._record_agent(agent, input_hashes, success, started_at)
+        self._end_span(span, self._agent_status(agent, success), agent.output_rel)
+        return success
+
+    async def _run_agent_async(self, agent: Agent) -> bool:
+        """_run_agent の asyncio 版"""
+        span = self._start_span(agent.name_en, agent.name_jp, agent.phase, agent.number, agent.input_files)
+        if self._resume_agent(agent):
+            self._end_span(span, "resumed", agent.output_rel)
+            return True
+        started_at = time.time()
+        input_hashes = self.manifest.input_hashes(agent.input_files)
+        success = await self._execute_agent_async(agent)
+        self._record_agent(agent, input_hashes, success, started_at)
+        self._end_span(span, self._agent_status(agent, success), agent.output_rel)
+        return success
+
+    def _execute_agent(self, agent: Agent) -> bool:
+        """単一エージェントを実行"""
+        self._log_agent_start(agent)
+
+        if agent.local_executor and self.local_executors:
+            return self._run_agent_local(agent)
+
+        if self.tasks is not None:
+            return self._finish_remote_agent(agent, self._await_task(agent.name_en, agent.name_jp))
+
+        try:
+            gate = self._run_pre_gate(agent)
+        except Exception as e:
+            return self._handle_agent_error(agent, e)
+        if gate is not None and gate.output is not None:
+            self._complete_agent(agent, gate.output, streamed=False)
+            return True
+
+        if self.dry_run:
+            return self._run_agent_dry(agent)
+
+        try:
+            speculated = self._adopt_speculation(agent)
+            if speculated is not None:
+                self._complete_agent(agent, speculated, streamed=False)
+                return True
+
+            if gate is not None and gate.request is not None:
+                response = self._call_agent(
+                    agent.name_en, agent.name_jp, None, model=self._model_for(agent.name_en), **gate.request
+                )
+                self._complete_agent(agent, gate.finish(response), streamed=False)
+                return True
+
+            outline = self._section_outline(agent)
+            if outline is not None:
+                self._complete_agent(agent, self._draft_by_section(agent, outline), streamed=False)
+                return True
+
+            plan = self._rewrite_plan(agent)
+            if plan is not None:
+                revised = self._review_rounds(agent, self._rewrite_by_section(agent, plan))
+                self._complete_agent(agent, revised, streamed=False)
+                return True
+
+            # System Prompt読み込み
+            system_prompt = agent.load_system_prompt()
+
+            # ユーザーメッセージ構築
+            user_message = self._build_user_message(agent, gate)
+
+            # API呼び出し（蔵にあれば蔵出し）
+            response = self._call_agent(
+                agent.name_en, agent.name_jp, agent.output_path(self.workspace),
+                system_prompt=system_prompt,
+                context=self._build_vault_block(agent),
+                user_message=user_message,
+                **self._routed(agent.name_en, user_message),
+            )
+
+            reviewed = self._review_rounds(agent, response)
+            self._complete_agent(agent, reviewed, streamed=None if reviewed is response else False)
+            return True
+
+        except Exception as e:
+            return self._handle_agent_error(agent, e)
+
+    async def _execute_agent_async(self, agent: Agent) -> bool:
+        """単一エージェントを実行（asyncio 版）"""
+        self._log_agent_start(agent)
+
+        if agent.local_executor and self.local_executors:
+            return self._run_agent_local(agent)
+
+        if self.tasks is not None:
+            return self._finish_remote_agent(agent, await self._await_task_async(agent.name_en, agent.name_jp))
+
+        try:
+            gate = self._run_pre_gate(agent)
+        except Exception as e:
+            return self._handle_agent_error(agent, e)
+        if gate is not None and gate.output is not None:
+            self._complete_agent(agent, gate.output, streamed=False)
+            return True
+
+        if self.dry_run:
+            return self._run_agent_dry(agent)
+
+        try:
+            speculated = await self._adopt_speculation_async(agent)
+            if speculated is not None:
+                self._complete_agent(agent, speculated, streamed=False)
+                return True
+
+            if gate is not None and gate.request is not None:
+                response = await self._call_agent_async(
+                    agent.name_en, agent.name_jp, None, model=self._model_for(agent.name_en), **gate.request
+                )
+                self._complete_agent(agent, gate.finish(response), streamed=False)
+                return True
+
+            outline = self._section_outline(agent)
+            if outline is not None:
+                self._complete_agent(agent, await self._draft_by_section_async(agent, outline), streamed=False)
+                return True
+
+            plan = self._rewrite_plan(agent)
+            if plan is not None:
+                revised = await self._review_rounds_async(agent, await self._rewrite_by_section_async(agent, plan))
+                self._complete_agent(agent, revised, streamed=False)
+                return True
+
+            system_prompt = agent.load_system_prompt()
+            user_message = self._build_user_message(agent, gate)
+
+            response = await self._call_agent_async(
+                agent.name_en, agent.name_jp, agent.output_path(self.workspace),
+                system_prompt=system_prompt,
+                context=self._build_vault_block(agent),
+                user_message=user_message,
+                **self._routed(agent.name_en, user_message),
+            )
+
+            reviewed = await self._review_rounds_async(agent, response)
+            self._complete_agent(agent, reviewed, streamed=None if reviewed is response else False)
+            return True
+
+        except Exception as e:
+            return self._handle_agent_error(agent, e)
+
+    def _begin_karo_final(self) -> Optional[str]:
+        """
+        家老の最終確認の開始処理。
+        Returns: 城代の final_draft.md の内容（まだ届いていなければ None）
+        """
+        self.logger.phase_start(Phase.FINAL)
+        self.logger.karo_speaks("うむ、城代から上がった記事を検分いたそう。")
+
+        final_draft = self.artifacts.read(KARO_INPUT_REL)
+        if final_draft is None:
+            self.logger.karo_speaks("なんと…城代からの報告がまだ届いておりませぬ！")
+            return None
+        return final_draft
+
+    def _build_karo_message(self, final_draft: str) -> tuple[str, str, str]:
+        """家老用の (System Prompt, 共通コンテキスト, ユーザーメッセージ) を構築"""
+        # 家老のSystem Prompt読み込み
+        karo_prompt_path = AGENTS_DIR / "00_karo_orchestrator.md"
+        system_prompt = read_warm(karo_prompt_path)
+        if system_prompt is None:
+            raise FileNotFoundError(f"無念！筆頭家老の指令書が見つかりませぬ: {karo_prompt_path}")
+
+        if self.vault_top_k:
+            strategy = self._retrieve_vault(KARO_VAULT_QUERY, KARO_VAULT_BUDGET, sources=(VAULT_SOURCES[0][0],))
+        else:
+            strategy = self.artifacts.read_external(self.vault_root / "Strategy" / "Strategy.md") or ""
+
+        # Strategy.md（の抜粋）はユーザーメッセージより前の prompt cache 区画に置く
+        context = f"# Strategy.md（照合用）\n\n{strategy}"
+        user_message = (
+            f"# 城代検分済み記事\n\n{final_draft}\n\n---\n\n"
+            f"将軍の勅命テーマ: 「{self.theme}」\n\n"
+            f"城代の検分を通過した記事です。最終確認を行い、問題がなければ "
+            f"FINAL_ARTICLE として出力してください。修正が必要な場合は修正した上で出力してください。"
+        )
+        return system_prompt, context, user_message
+
+    @property
+    def final_article_path(self) -> Path:
+        """納品物（FINAL_ARTICLE.md）のパス"""
+        return self.workspace.final_article_path
+
+    def _deliver_final(self, content: str):
+        """FINAL_ARTICLE として保存し、将軍へ納品"""
+        final_path = self.final_article_path
+        self.artifacts.write(KARO_OUTPUT_REL, content, persisted=self._take_streamed(final_path))
+        if not self.dry_run:
+            self.logger.karo_speaks("大義である。将軍様への納品の支度が整いました。")
+        self.logger.shogun_delivery(self.workspace.display_path(final_path))
+
+    def _resume_karo(self) -> bool:
+        """--resume 時、前回の納品物がまだ有効なら家老の再検分を省く"""
+        if self._checkpoint_state("Karo", [KARO_INPUT_REL], KARO_OUTPUT_REL) is None:
+            return False
+        self.logger.karo_speaks("前回の納品物に変わりはございませぬ。そのままお納めいたしまする。")
+        self.logger.shogun_delivery(self.workspace.display_path(self.final_article_path))
+        return True
+
+    def _run_karo_final(self) -> bool:
+        """家老（Agent 00）の最終確認（陣中日誌に記録）"""
+        final_draft = self._begin_karo_final()
+        if final_draft is None:
+            return False
+        span = self._start_span("Karo", "筆頭家老", Phase.FINAL, KARO_LANE, [KARO_INPUT_REL])
+        if self._resume_karo():
+            self._end_span(span, "resumed", KARO_OUTPUT_REL)
+            return True
+        started_at = time.time()
+        input_hashes = self.manifest.input_hashes([KARO_INPUT_REL])
+        success = self._execute_karo_final(final_draft)
+        status = "success" if success else "failed"
+        self.manifest.record("Karo", input_hashes, KARO_OUTPUT_REL, status, started_at)
+        self._end_span(span, status, KARO_OUTPUT_REL)
+        return success
+
+    async def _run_karo_final_async(self) -> bool:
+        """_run_karo_final の asyncio 版"""
+        final_draft = self._begin_karo_final()
+        if final_draft is None:
+            return False
+        span = self._start_span("Karo", "筆頭家老", Phase.FINAL, KARO_LANE, [KARO_INPUT_REL])
+        if self._resume_karo():
+            self._end_span(span, "resumed", KARO_OUTPUT_REL)
+            return True
+        started_at = time.time()
+        input_hashes = self.manifest.input_hashes([KARO_INPUT_REL])
+        success = await self._execute_karo_final_async(final_draft)
+        status = "success" if success else "failed"
+        self.manifest.record("Karo", input_hashes, KARO_OUTPUT_REL, status, started_at)
+        self._end_span(span, status, KARO_OUTPUT_REL)
+        return success
+
+    def _execute_karo_final(self, final_draft: str) -> bool:
+        """家老（Agent 00）の最終確認"""
+        if self.tasks is not None:
+            return self._finish_remote_karo(self._await_task("Karo", "筆頭家老"))
+
+        if self.dry_run:
+            # ドライラン
+            self._deliver_final(final_draft)
+            return True
+
+        try:
+            system_prompt, context, user_message = self._build_karo_message(final_draft)
+
+            response = self._call_agent(
+                "Karo", "筆頭家老", self.final_article_path,
+                system_prompt=system_prompt,
+                context=context,
+                user_message=user_message,
+                **self._routed("Karo", user_message),
+            )
+
+            self._deliver_final(response)
+            return True
+
+        except Exception as e:
+            self.logger.karo_speaks(f"無念…不測の事態です: {e}")
+            self.errors["Karo"] = str(e)
+            return False
+
+    async def _execute_karo_final_async(self, final_draft: str) -> bool:
+        """家老（Agent 00）の最終確認（asyncio 版）"""
+        if self.tasks is not None:
+            return self._finish_remote_karo(await self._await_task_async("Karo", "筆頭家老"))
+
+        if self.dry_run:
+            self._deliver_final(final_draft)
+            return True
+
+        try:
+            system_prompt, context, user_message = self._build_karo_message(final_draft)
+
+            response = await self._call_agent_async(
+                "Karo", "筆頭家老", self.final_article_path,
+                system_prompt=system_prompt,
+                context=context,
+                user_message=user_message,
+                **self._routed("Karo", user_message),
+            )
+
+            self._deliver_final(response)
+            return True
+
+        except Exception as e:
+            self.logger.karo_speaks(f"無念…不測の事態です: {e}")
+            self.errors["Karo"] = str(e)
+            return False
+
+    def _dispatch_ready(self, schedule: "RetainerSchedule", running_count: int) -> list[Agent]:
+        """出陣可能な家臣を max_parallel の空き分だけ取り出す"""
+        dispatched = []
+        for agent in schedule.ready():
+            if running_count + len(dispatched) >= self.max_parallel:
+                break
+            schedule.start(agent)
+            self._announce_phase(agent.phase)
+            dispatched.append(agent)
+        return dispatched
+
+    def _run_retainers(self) -> tuple[int, Optional[Agent]]:
+        """
+        依存関係グラフに従い、準備の整った家臣を同時に動員する。
+
+        同時実行数は max_parallel で制限する。準備完了の家臣が複数いる場合は
+        RETAINERS の定義順に出陣させるため、max_parallel=1 なら従来の逐次実行と同じ順序になる。
+
+        Returns:
+            (成功した家臣の数, 倒れた家臣 — 全員無事なら None)
+        """
+        schedule = RetainerSchedule(RETAINERS)
+
+        with ThreadPoolExecutor(max_workers=self.max_parallel) as pool:
+            running: dict[Future, Agent] = {}
+            while schedule.pending or running:
+                for agent in self._dispatch_ready(schedule, len(running)):
+                    running[pool.submit(self._run_agent, agent)] = agent
+
+                if not running:
+                    schedule.check_stalled()
+                    break
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    agent, success = running.pop(future), future.result()
+                    schedule.finish(agent, success)
+                    # 先回りできる家臣は、本来の出番を待たずに動かしておく
+                    for ahead in self._speculative_agents(agent) if success else []:
+                        self.speculations[ahead.name_en] = pool.submit(self._speculate, ahead)
+
+            self._discard_speculations()
+
+        return schedule.success_count, schedule.fallen
+
+    async def _run_retainers_async(self) -> tuple[int, Optional[Agent]]:
+        """_run_retainers の asyncio 版"""
+        schedule = RetainerSchedule(RETAINERS)
+
+        running: dict[asyncio.Task, Agent] = {}
+        queued: list[Agent] = []  # 空きを待つ先回り
+        while schedule.pending or running:
+            # 先回りも max_parallel の枠を使う（スレッド版ではプールの大きさが同じ役目をする）
+            in_flight = [task for task in self.speculations.values() if not task.done()]
+            while queued and len(running) + len(in_flight) < self.max_parallel:
+                ahead = queued.pop(0)
+                self.speculations[ahead.name_en] = asyncio.create_task(self._speculate_async(ahead))
+                in_flight.append(self.speculations[ahead.name_en])
+            for agent in self._dispatch_ready(schedule, len(running) + len(in_flight)):
+                # 先回りが枠を得る前に本来の出番が来たら、先回りはやめる
+                queued = [ahead for ahead in queued if ahead.name_en != agent.name_en]
+                running[asyncio.create_task(self._run_agent_async(agent))] = agent
+
+            if not running and not in_flight:
+                schedule.check_stalled()
+                break
+
+            done, _ = await asyncio.wait([*running, *in_flight], return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task not in running:
+                    continue  # 先回りが済んで枠が空いた
+                agent, success = running.pop(task), task.result()
+                schedule.finish(agent, success)
+                queued += self._speculative_agents(agent) if success else []
+
+        self._discard_speculations()
+        return schedule.success_count, schedule.fallen
+
+    def _open_council(self):
+        """開城"""
+        self._ensure_dirs()
+        if self.cache is not None:
+            self.cache.evict()
+
+        self.tracer.open_council()
+        self.logger.banner()
+        self.logger.workspace_info(self.run_id, self.workspace.display_path(self.workspace.root))
+        self.logger.karo_speaks(
+            f"将軍様より『{self.theme}』との勅命が下った！者ども、支度はよいか！"
+        )
+
+    @property
+    def usage(self) -> dict:
+        """この軍議で使ったトークン数（同期・asyncio 両クライアントと働き手の合計）"""
+        totals = dict(self.remote_usage)
+        for client in (self.api, self.async_api):
+            for key in totals:
+                totals[key] += client.usage[key]
+        return totals
+
+    def _report_usage(self):
+        """トークン使用量と蔵の出入りをサマリーに添える"""
+        if not self.dry_run:
+            self.logger.token_summary(self.usage, self.tracer.totals()["cost_usd"])
+            if self.resilience:
+                self.logger.resilience_summary(self.resilience)
+        if self.cache is not None:
+            self.logger.cache_summary(self.cache.hits, self.cache.misses)
+
+    def _write_trace(self, success: bool):
+        """軍目付の記録（trace.jsonl・trace.chrome.json）を作業場に書き出す"""
+        self.tracer.close_council(success)
+        paths = self.tracer.write(self.workspace.root)
+        print("  🧭 軍目付の記録: " + " / ".join(self.workspace.display_path(path) for path in paths))
+
+    def _abort_council(self, fallen: Agent, success_count: int) -> bool:
+        """致命的エラーの場合は中断（画像生成以外）"""
+        self.logger.karo_speaks(
+            f"無念…{fallen.name_jp}が倒れました。軍議を一時中断いたします。"
+        )
+        self.logger.summary(False, success_count)
+        self._write_trace(False)
+        self._report_usage()
+        self.artifacts.flush()
+        log_path = self.logger.save_log(self.theme)
+        print(f"\n  📜 軍議記録: {log_path}")
+        return False
+
+    def _close_council(self, final_success: bool, success_count: int) -> bool:
+        """サマリーを出してログを保存"""
+        self.logger.summary(final_success, success_count + (1 if final_success else 0))
+        self._write_trace(final_success)
+        self._report_usage()
+        self.artifacts.flush()
+
+        log_path = self.logger.save_log(self.theme)
+        print(f"\n  📜 軍議記録: {log_path}")
+
+        return final_success
+
+    def execute(self) -> bool:
+        """
+        軍議を開始し、全工程を実行する。
+        Returns: 成功したかどうか
+        """
+        self._open_council()
+
+        # 家臣団を依存関係に従って動員
+        success_count, fallen = self._run_retainers()
+        if fallen is not None:
+            return self._abort_council(fallen, success_count)
+
+        # 家老の最終確認
+        final_success = self._run_karo_final()
+
+        return self._close_council(final_success, success_count)
+
+    async def execute_async(self) -> bool:
+        """
+        execute() の asyncio 版。
+
+        API 呼び出しは AsyncCastleAPIClient を経由するため、同じイベントループ上で
+        複数の軍議を並べても HTTP 接続と流量制限（同時実行数・RPM・TPM）を共有できる。
+        Returns: 成功したかどうか
+        """
+        self._open_council()
+
+        success_count, fallen = await self._run_retainers_async()
+        if fallen is not None:
+            return self._abort_council(fallen, success_count)
+
+        final_success = await self._run_karo_final_async()
+
+        return self._close_council(final_success, success_count)
+
+
+# ---------------------------------------------------------------------------
+# 一斉軍議（バッチモード）
+# ---------------------------------------------------------------------------
+
+DEFAULT_BATCH_CONCURRENCY = 4
+
+
+def load_themes(themes_file: Path) -> list[str]:
+    """
+    テーマ一覧ファイルを読み込む。
+
+    1行1テーマのテキスト（空行と # 始まりの行は無視）か、JSONL
+    （1行ごとに JSON 文字列、または {"theme": "..."} オブジェクト）を受け付ける。
+    """
+    themes = []
+    for line_no, raw in enumerate(themes_file.read_text(encoding="utf-8").splitlines(), 1):
+        line = raw.strip()
+        if not line or line.startswith("#"):
+            continue
+        if line[0] in "{\"":
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"無念！{themes_file}:{line_no} の JSON が読めませぬ: {e}")
+            line = entry.get("theme", "") if isinstance(entry, dict) else str(entry)
+            line = line.strip()
+            if not line:
+                raise ValueError(f"無念！{themes_file}:{line_no} にテーマが記されておりませぬ")
+        themes.append(line)
+    return themes
+
+
+async def run_batch(
+    themes: list[str],
+    manifest_path: Path,
+    model: str = DEFAULT_MODEL,
+    dry_run: bool = False,
+    max_parallel: int = DEFAULT_MAX_PARALLEL,
+    concurrency: int = DEFAULT_BATCH_CONCURRENCY,
+    cache_factory: Optional[Callable[[], AgentOutputCache]] = None,
+    refresh_agents: Optional[list[str]] = None,
+    stream: bool = False,
+    prompt_cache: bool = True,
+    local_executors: bool = True,
+    section_parallel: bool = False,
+    diff_rewrite: bool = False,
+    review: Optional[ReviewPolicy] = None,
+    speculate: bool = False,
+    routing: Optional[RoutingTable] = None,
+    metrics_path: Optional[Path] = None,
+    batcher: Optional[MessageBatcher] = None,
+    api_factory: Optional[Callable[[], AsyncCastleAPIClient]] = None,
+    tasks: Optional[TaskQueue] = None,
+    vault_top_k: int = DEFAULT_VAULT_TOP_K,
+) -> list[dict]:
+    """
+    複数テーマの軍議を1プロセス内で同時に開く。
+    各軍議には専用の作業場（castle_floors/runs/<batch_id>_<連番>/）を割り当てる。
+
+    同時に開く軍議は concurrency 件まで。API 呼び出しはプロセス共通の
+    CastleRequestPool を通るため、全軍議を合わせた流量もそこで制限される。
+    1件が失敗しても残りは続行し、結果は完了順に manifest_path（JSONL）へ追記する。
+    cache_factory を渡すと軍議ごとに蔵（AgentOutputCache）を作って使う。
+    metrics_path を渡すと、全軍議のスパンを家臣ごとに集計して Prometheus の text-file 形式で書き出す。
+    batcher を渡すと、全軍議の API 呼び出しを Message Batches に束ねて出す（--batch-api）。
+    api_factory を渡すと、軍議ごとにそれが返すクライアントを使う（--record / --replay）。
+    tasks を渡すと、家臣の持ち場を持ち場帳に積んで働き手に片付けさせる（--task-queue）。
+
+    Returns:
+        テーマごとの結果（themes と同じ順序）
+    """
+    gate = asyncio.Semaphore(max(1, concurrency))
+    batch_id = new_run_id()
+    manifest_path.parent.mkdir(parents=True, exist_ok=True)
+    manifest_path.write_text("", encoding="utf-8")
+    tracers: list[Tracer] = []
+
+    async def run_one(index: int, theme: str) -> dict:
+        async with gate:
+            council = WarCouncil(
+                theme=theme,
+                model=model,
+                dry_run=dry_run,
+                max_parallel=max_parallel,
+                run_id=f"{batch_id}_{index:04d}",
+                cache=cache_factory() if cache_factory else None,
+                refresh_agents=refresh_agents,
+                stream=stream,
+                prompt_cache=prompt_cache,
+                local_executors=local_executors,
+                section_parallel=section_parallel,
+                diff_rewrite=diff_rewrite,
+                review=review,
+                speculate=speculate,
+                routing=routing,
+                async_api=(
+                    BatchCastleAPIClient(batcher, model=model, prompt_cache=prompt_cache) if batcher
+                    else api_factory() if api_factory else None
+                ),
+                tasks=tasks,
+                vault_top_k=vault_top_k,
+            )
+            tracers.append(council.tracer)
+            started = time.time()
+            error = ""
+            try:
+                success = await council.execute_async()
+            except Exception as e:
+                success = False
+                error = str(e)
+
+            final_path = council.final_article_path
+            record = {
+                "index": index,
+                "theme": theme,
+                "run_id": council.run_id,
+                "status": "success" if success else "failed",
+                "duration_sec": round(time.time() - started, 3),
+                "input_tokens": council.usage["input_tokens"],
+                "output_tokens": council.usage["output_tokens"],
+                "cache_read_tokens": council.usage["cache_read_tokens"],
+                "cache_write_tokens": council.usage["cache_write_tokens"],
+                "cost_usd": council.tracer.totals()["cost_usd"],
+                "cache_hits": council.cache.hits if council.cache else 0,
+                "cache_misses": council.cache.misses if council.cache else 0,
+                "output_path": str(final_path) if success else "",
+                "error": error,
+            }
+            with manifest_path.open("a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            return record
+
+    records = list(await asyncio.gather(*(run_one(i, t) for i, t in enumerate(themes))))
+    if metrics_path is not None:
+        write_prometheus([span for tracer in tracers for span in tracer.spans], metrics_path)
+    return records
+
+
+# ---------------------------------------------------------------------------
+# 常駐の軍議所（serve）
+# ---------------------------------------------------------------------------
+
+DEFAULT_SERVE_PORT = 8765
+DEFAULT_SERVE_WORKERS = 4
+DEFAULT_QUEUE_PATH = CASTLE_FLOORS / "council_queue.db"
+
+# 新しい依頼の知らせがなくても、この秒数ごとに受付帳を見直す（別のプロセスが積んだ依頼を拾うため）
+SERVE_POLL_INTERVAL = 5.0
+
+
+def warm_up(client: bool = True) -> int:
+    """
+    常駐の支度: 指令書と Vault 資料を読み込み、Vault の索引を引ける状態にしておき、
+    （client=True なら）共有の AsyncAnthropic client を作っておく。
+    Returns: 読み込んだファイルの数
+    """
+    paths = [agent.prompt_path for agent in RETAINERS] + [AGENTS_DIR / "00_karo_orchestrator.md"]
+    paths += [VAULT_ROOT / rel for rel, _ in VAULT_SOURCES]
+    loaded = sum(1 for path in paths if read_warm(path) is not None)
+    load_index(VAULT_ROOT, VAULT_INDEX_PATH)
+    if client:
+        AsyncCastleAPIClient()._get_client()
+    return loaded
+
+
+class CouncilDaemon:
+    """
+    常駐の軍議所。受付帳（castle_queue.JobQueue）から依頼を取り出し、同じイベントループ上で
+    最大 workers 件の軍議を同時に開く。
+
+    API クライアント（HTTP コネクションプール）・流量制限・指令書と Vault 資料の写しは全軍議で共有するので、
+    1件ごとに Python の立ち上げや読み込みの手間はかからない。止めるときに走っていた依頼は受付帳に
+    running のまま残り、次の起動時に列へ戻されて作業場の続きから再開する。
+    """
+
+    def __init__(
+        self,
+        queue: JobQueue,
+        workers: int = DEFAULT_SERVE_WORKERS,
+        cache_factory: Optional[Callable[[], AgentOutputCache]] = None,
+        **council_options,
+    ):
+        self.queue = queue
+        self.workers = max(1, workers)
+        self.cache_factory = cache_factory
+        self.council_options = council_options
+        self.running: dict[int, asyncio.Task] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._stopping = False
+
+    def wake(self):
+        """別スレッド（HTTP の窓口）から、受付帳を見直すよう知らせる"""
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    def stop(self):
+        self._stopping = True
+        self.wake()
+
+    async def run(self):
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        recovered = self.queue.recover()
+        if recovered:
+            print(f"  🏯 前回走っていた依頼 {recovered}件を列に戻しました（作業場が残っていれば続きから）")
+
+        while not self._stopping:
+            while len(self.running) < self.workers:
+                job = self.queue.claim(new_run_id())
+                if job is None:
+                    break
+                task = asyncio.create_task(self._run_job(job))
+                self.running[job.id] = task
+                task.add_done_callback(lambda _, job_id=job.id: self.running.pop(job_id, None))
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=SERVE_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+        tasks = list(self.running.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _run_job(self, job: Job):
+        workspace = CastleWorkspace.for_run(job.run_id)
+        resume = (workspace.root / RunManifest.FILENAME).exists()
+        print(f"  🏯 依頼 #{job.id}（{job.tenant}）『{job.theme}』に取りかかります → 軍議ID: {job.run_id}"
+              + ("（続きから）" if resume else ""))
+        try:
+            council = WarCouncil(
+                theme=job.theme,
+                workspace=workspace,
+                resume=resume,
+                cache=self.cache_factory() if self.cache_factory else None,
+                **self.council_options,
+            )
+            success = await council.execute_async()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.queue.finish(job.id, "failed", error=str(e))
+        else:
+            self.queue.finish(
+                job.id,
+                "succeeded" if success else "failed",
+                article_path=str(council.final_article_path) if success else "",
+                error="" if success else "軍議が撤退いたしました（作業場の軍議記録をご覧くだされ）",
+                cost_usd=council.tracer.totals()["cost_usd"],
+            )
+        finally:
+            self.wake()
+
+
+class CouncilRequestHandler(BaseHTTPRequestHandler):
+    """
+    軍議所の窓口（JSON）。
+
+        POST   /jobs                  {"theme", "tenant", "priority", "deadline"} を受け付ける（201）
+        GET    /jobs?tenant=&status=  依頼の一覧（新しい順）
+        GET    /jobs/<id>             依頼の状態
+        GET    /jobs/<id>/article     納品物（FINAL_ARTICLE.md。出来上がるまでは 409）
+        DELETE /jobs/<id>             列で待っている依頼を取り消す
+        GET    /health                状態ごとの件数と、走っている軍議の数
+    """
+
+    server_version = "EdoCastle/1.0"
+
+    @property
+    def council_daemon(self) -> CouncilDaemon:
+        return self.server.council_daemon
+
+    def address_string(self) -> str:
+        # Unix ソケットでは client_address が空文字になる
+        return self.client_address[0] if isinstance(self.client_address, tuple) else "unix"
+
+    def log_message(self, format, *args):
+        print(f"{Color.DIM}  📨 {self.address_string()} {format % args}{Color.RESET}", file=sys.stderr)
+
+    def _send(self, status: int, body: bytes, content_type: str, headers: Optional[dict] = None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, status: int, payload, headers: Optional[dict] = None):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self._send(status, body, "application/json; charset=utf-8", headers)
+
+    def _error(self, status: int, message: str):
+        self._send_json(status, {"error": message})
+
+    def _route(self) -> tuple[list[str], dict[str, str]]:
+        url = urllib.parse.urlsplit(self.path)
+        query = {name: values[-1] for name, values in urllib.parse.parse_qs(url.query).items()}
+        return [part for part in url.path.split("/") if part], query
 
-    def _load_vault_context(self) -> str:
-        """Vault内の戦略・テンプレート情報を読み込む"""
-        context_parts = []
+    def _find_job(self, job_id: str) -> Optional[Job]:
+        return self.council_daemon.queue.get(int(job_id)) if job_id.isdigit() else None
 
-        # Strategy.md
-        strategy_path = self.vault_root / "Strategy" / "Strategy.md"
-        if strategy_path.exists():
-            context_parts.append(
-                f"## Strategy.md（執筆戦略ガイド）\n\n{strategy_path.read_text(encoding='utf-8')}"
-            )
+    def do_GET(self):
+        parts, query = self._route()
+        queue = self.council_daemon.queue
+        if parts == ["health"]:
+            self._send_json(200, {
+                "jobs": queue.counts(),
+                "running": len(self.council_daemon.running),
+                "workers": self.council_daemon.workers,
+            })
+            return
+        if parts == ["jobs"]:
+            status = query.get("status")
+            if status and status not in JOB_STATUSES:
+                self._error(400, f"status は {' / '.join(JOB_STATUSES)} のいずれかでございます")
+                return
+            limit = int(query["limit"]) if query.get("limit", "").isdigit() else 100
+            jobs = queue.list(tenant=query.get("tenant"), status=status, limit=limit)
+            self._send_json(200, {"jobs": [job.to_dict() for job in jobs]})
+            return
+        if len(parts) in (2, 3) and parts[0] == "jobs" and parts[2:] in ([], ["article"]):
+            job = self._find_job(parts[1])
+            if job is None:
+                self._error(404, f"依頼 {parts[1]} は受け付けておりませぬ")
+            elif len(parts) == 2:
+                self._send_json(200, job.to_dict())
+            elif job.status != "succeeded":
+                self._error(409, f"依頼 #{job.id} はまだ納品されておりませぬ（{job.status}）")
+            elif not Path(job.article_path).exists():
+                self._error(410, f"納品物が見当たりませぬ: {job.article_path}")
+            else:
+                self._send(200, Path(job.article_path).read_bytes(), "text/markdown; charset=utf-8")
+            return
+        self._error(404, "そのような窓口はございませぬ")
 
-        # Article Template
-        article_path = self.vault_root / "Templates" / "Article.md"
-        if article_path.exists():
-            context_parts.append(
-                f"## Article Template\n\n{article_path.read_text(encoding='utf-8')}"
+    def do_POST(self):
+        parts, _ = self._route()
+        if parts != ["jobs"]:
+            self._error(404, "そのような窓口はございませぬ")
+            return
+        try:
+            payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+            if not isinstance(payload, dict) or not isinstance(payload.get("theme"), str):
+                raise ValueError("theme（文字列）を添えてくだされ")
+            tenant = payload.get("tenant", "default")
+            priority = payload.get("priority", 0)
+            if not isinstance(tenant, str) or not isinstance(priority, int) or isinstance(priority, bool):
+                raise ValueError("tenant は文字列、priority は整数で指定してくだされ")
+            job = self.council_daemon.queue.submit(
+                payload["theme"], tenant=tenant, priority=priority, deadline=parse_deadline(payload.get("deadline")),
             )
+        except ValueError as e:  # json.JSONDecodeError を含む
+            self._error(400, f"無念！依頼を受け付けられませぬ: {e}")
+            return
+        self.council_daemon.wake()
+        self._send_json(201, job.to_dict(), headers={"Location": f"/jobs/{job.id}"})
 
-        # Assets
-        assets_path = self.vault_root / "Assets" / "Assets.md"
-        if assets_path.exists():
-            context_parts.append(
-                f"## Assets（表現集）\n\n{assets_path.read_text(encoding='utf-8')}"
-            )
+    def do_DELETE(self):
+        parts, _ = self._route()
+        if len(parts) != 2 or parts[0] != "jobs":
+            self._error(404, "そのような窓口はございませぬ")
+            return
+        job = self._find_job(parts[1])
+        if job is None:
+            self._error(404, f"依頼 {parts[1]} は受け付けておりませぬ")
+        elif not self.council_daemon.queue.cancel(job.id):
+            self._error(409, f"依頼 #{job.id} は既に{job.status}のため取り消せませぬ")
+        else:
+            self._send_json(200, self.council_daemon.queue.get(job.id).to_dict())
 
-        return "\n\n---\n\n".join(context_parts)
 
-    def _build_user_message(self, agent: Agent) -> str:
-        """エージェント用のユーザーメッセージを構築"""
-        parts = [f"# 将軍の勅命（テーマ）\n\n「{self.theme}」\n"]
+class CouncilHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
 
-        # 入力ファイルの内容を添付
-        for input_rel in agent.input_files:
-            input_path = CASTLE_FLOORS / input_rel
-            if input_path.exists():
-                content = input_path.read_text(encoding="utf-8")
-                parts.append(f"## 参照資料: {input_rel}\n\n{content}")
-            else:
-                parts.append(f"## 参照資料: {input_rel}\n\n（※ファイル未作成）")
 
-        # Vault戦略コンテキスト（最初のエージェントには必ず付与）
-        if agent.number <= 4:
-            vault_ctx = self._load_vault_context()
-            if vault_ctx:
-                parts.append(f"## Vault 戦略コンテキスト\n\n{vault_ctx}")
+class CouncilUnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
 
-        return "\n\n---\n\n".join(parts)
 
-    def _run_agent(self, agent: Agent) -> bool:
-        """単一エージェントを実行"""
-        # フェーズ変更時にヘッダー出力
-        if agent.phase != self.current_phase:
-            self.current_phase = agent.phase
-            self.logger.phase_start(agent.phase)
+def serve_main(argv: list[str]):
+    """war_council.py serve — 常駐の軍議所を開く"""
+    parser = argparse.ArgumentParser(
+        prog="war_council.py serve",
+        description="常駐の軍議所 — テーマを HTTP で受け付け、受付帳の順に軍議を開く",
+    )
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="待ち受けるアドレス（デフォルト: 127.0.0.1）")
+    parser.add_argument("--port", type=int, default=DEFAULT_SERVE_PORT,
+                        help=f"待ち受けるポート（デフォルト: {DEFAULT_SERVE_PORT}）")
+    parser.add_argument("--socket", type=Path, default=None, help="TCP の代わりに Unix ソケットで待ち受ける")
+    parser.add_argument("--queue", type=Path, default=DEFAULT_QUEUE_PATH,
+                        help="受付帳（SQLite）の置き場（デフォルト: castle_floors/council_queue.db）")
+    parser.add_argument("--workers", type=int, default=DEFAULT_SERVE_WORKERS,
+                        help=f"同時に開く軍議の上限（デフォルト: {DEFAULT_SERVE_WORKERS}）")
+    parser.add_argument("--model", type=str, default=DEFAULT_MODEL,
+                        help=f"標準格の家臣が使う Claude モデル（デフォルト: {DEFAULT_MODEL}）")
+    parser.add_argument("--routing", type=Path, default=None, help="家臣ごとのモデルの振り分け（TOML / JSON）")
+    parser.add_argument("--max-parallel", type=int, default=DEFAULT_MAX_PARALLEL,
+                        help=f"軍議ごとに同時に動員する家臣の上限（デフォルト: {DEFAULT_MAX_PARALLEL}）")
+    parser.add_argument("--max-in-flight", type=int, default=DEFAULT_MAX_IN_FLIGHT,
+                        help=f"全軍議で同時に飛ばす API リクエストの上限（デフォルト: {DEFAULT_MAX_IN_FLIGHT}）")
+    parser.add_argument("--rpm", type=int, default=None, help="1分あたりリクエスト数上限（省略時は無制限）")
+    parser.add_argument("--tpm", type=int, default=None, help="1分あたりトークン数上限（省略時は無制限）")
+    parser.add_argument("--no-cache", action="store_true", help="蔵（エージェント出力キャッシュ）を使わない")
+    parser.add_argument("--no-prompt-cache", action="store_true", help="prompt caching を使わない")
+    parser.add_argument("--dry-run", action="store_true", help="ドライラン（API呼び出しなし）")
+    parser.add_argument("--task-queue", type=Path, default=None,
+                        help="家臣の持ち場をこの持ち場帳に積み、働き手（war_council.py worker）に片付けさせる")
+    parser.add_argument("--vault-top-k", type=int, default=DEFAULT_VAULT_TOP_K,
+                        help=f"家臣に添える Vault 資料の抜粋の上限（デフォルト: {DEFAULT_VAULT_TOP_K}、0 で丸ごと）")
+    args = parser.parse_args(argv)
 
-        # 開始ログ
-        opening_lines = {
-            1: "ふむ…将軍様の仰せ、承りました。戦略を練りましょう。",
-            2: "御意。闇に紛れ、情報を掴んで参ります。",
-            3: "注進！注進！偵察に出ます！",
-            4: "てやんでぃ！設計図を引くぜ！",
-            5: "クックック…お手並み拝見といきましょう。",
-            6: "然り。出典なき情報は戯言である。調査を開始する。",
-            7: "筆が乗ってまいりました！初稿を書き上げます！",
-            8: "喝！どれ、読ませてもらおうか。",
-            9: "へへぇ…書き直しますです…（泣）",
-            10: "やれやれ…一字一字、数えさせていただきますぞ。",
-            11: "…処理を開始します。紐付け作業に入ります。",
-            13: "閃いた！色が…色が呼んでいる！",
-            12: "検分、開始する。家老様のお手を煩わせるな。",
-        }
-        self.logger.agent_start(agent, opening_lines.get(agent.number, "参上！"))
+    routing = None
+    if args.routing:
+        try:
+            routing = load_routing(args.routing)
+        except (OSError, ValueError, ImportError) as e:
+            parser.error(str(e))
+    CastleRequestPool.configure(
+        max_in_flight=args.max_in_flight,
+        requests_per_minute=args.rpm,
+        tokens_per_minute=args.tpm,
+    )
+    try:
+        loaded = warm_up(client=not args.dry_run)
+    except (ImportError, RuntimeError) as e:
+        print(f"{Color.RED}  ⚠️  {e}{Color.RESET}")
+        sys.exit(1)
 
-        if self.dry_run:
-            # ドライラン: ダミー出力
-            dummy_content = (
-                f"# {agent.name_jp}（{agent.name_en}）の出力\n\n"
-                f"テーマ: {self.theme}\n\n"
-                f"※ドライランのためダミー出力です。\n"
-            )
-            agent.output_path.write_text(dummy_content, encoding="utf-8")
-            self.results[agent.name_en] = dummy_content
-            self.logger.agent_done(agent, f"→ {agent.output_file}（ドライラン）")
-            return True
+    daemon = CouncilDaemon(
+        JobQueue(args.queue),
+        workers=args.workers,
+        cache_factory=None if args.no_cache else AgentOutputCache,
+        model=args.model,
+        dry_run=args.dry_run,
+        max_parallel=args.max_parallel,
+        prompt_cache=not args.no_prompt_cache,
+        routing=routing,
+        tasks=TaskQueue(args.task_queue) if args.task_queue else None,
+        vault_top_k=args.vault_top_k,
+    )
+    if args.socket:
+        args.socket.unlink(missing_ok=True)
+        server = CouncilUnixServer(str(args.socket), CouncilRequestHandler)
+        where = str(args.socket)
+    else:
+        server = CouncilHTTPServer((args.host, args.port), CouncilRequestHandler)
+        where = f"http://{args.host}:{server.server_address[1]}"
+    server.council_daemon = daemon
+    threading.Thread(target=server.serve_forever, name="council-http", daemon=True).start()
+    print(f"{Color.YELLOW}  🏯 軍議所を開きました: {where} | 受付帳: {args.queue} | "
+          f"同時軍議: {daemon.workers} | 指令書・Vault 資料 {loaded}件を読み込み済み{Color.RESET}")
 
-        try:
-            # System Prompt読み込み
-            system_prompt = agent.load_system_prompt()
+    async def run():
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, daemon.stop)
+            except (NotImplementedError, RuntimeError):
+                pass
+        await daemon.run()
 
-            # ユーザーメッセージ構築
-            user_message = self._build_user_message(agent)
+    try:
+        asyncio.run(run())
+    finally:
+        server.shutdown()
+        server.server_close()
+        if args.socket:
+            args.socket.unlink(missing_ok=True)
+    print(f"{Color.YELLOW}  🏯 軍議所を閉じました（走っていた依頼は次の起動時に続きから）{Color.RESET}")
 
-            # API呼び出し
-            response = self.api.call_agent(
-                system_prompt=system_prompt,
-                user_message=user_message,
-                max_tokens=8192,
-                temperature=0.7,
-            )
 
-            # 出力を保存
-            agent.output_path.write_text(response, encoding="utf-8")
-            self.results[agent.name_en] = response
-
-            # 完了ログ
-            closing_lines = {
-                1: f"勝機が見えました。→ {agent.output_file}",
-                2: f"…見つけました。→ {agent.output_file}",
-                3: f"敵影確認！報告完了！→ {agent.output_file}",
-                4: f"こいつはいい仕事になるぜ。→ {agent.output_file}",
-                5: f"まあ…及第点としましょう。→ {agent.output_file}",
-                6: f"調査完了。論拠は万全です。→ {agent.output_file}",
-                7: f"初稿、書き上げました！→ {agent.output_file}",
-                8: f"ふん、言いたいことは言った。→ {agent.output_file}",
-                9: f"書き直し完了です…お許しを…→ {agent.output_file}",
-                10: f"計算完了。帳簿は正確です。→ {agent.output_file}",
-                11: f"紐付け完了。承認印を押します。→ {agent.output_file}",
-                13: f"これが私の魂（ソウル）だ！→ {agent.output_file}",
-                12: f"検分完了。家老様へお回しせよ。→ {agent.output_file}",
-            }
-            self.logger.agent_done(agent, closing_lines.get(agent.number, f"完了 → {agent.output_file}"))
-            return True
+# ---------------------------------------------------------------------------
+# 働き手（worker）
+# ---------------------------------------------------------------------------
 
-        except Exception as e:
-            error_lines = {
-                1: f"情報不足です: {e}",
-                2: f"霧が深く情報を掴めませんでした: {e}",
-                3: f"偵察続行困難！: {e}",
-                4: f"材料が足りねえ！: {e}",
-                5: f"構成案が届きませんな: {e}",
-                6: f"書庫に火が入りました: {e}",
-                7: f"筆が折れました…: {e}",
-                8: f"初稿が届いておらん！: {e}",
-                9: f"批評レポートが見つかりません…: {e}",
-                10: f"帳簿が読めません: {e}",
-                11: f"ファイル読み込み失敗: {e}",
-                13: f"筆（API）が折れた…: {e}",
-                12: f"検分対象が届いておらぬ！: {e}",
-            }
-            self.logger.agent_error(agent, error_lines.get(agent.number, str(e)))
-
-            # 画像生成エラーの場合は続行（プレースホルダー配置）
-            if agent.number == 13:
-                # 前工程の出力をそのまま引き継ぐ
-                prev_path = CASTLE_FLOORS / "04_writing_room" / "draft_v3_linked.md"
-                if prev_path.exists():
-                    fallback = prev_path.read_text(encoding="utf-8")
-                    fallback += "\n\n<!-- 画像生成に失敗しました。プレースホルダーを配置しています。 -->\n"
-                    agent.output_path.write_text(fallback, encoding="utf-8")
-                    self.results[agent.name_en] = fallback
-                    self.logger.agent_done(agent, "プレースホルダーで続行します。")
-                    return True
-            return False
+DEFAULT_WORKER_CONCURRENCY = 4
 
-    def _run_karo_final(self) -> bool:
-        """家老（Agent 00）の最終確認"""
-        self.logger.phase_start(Phase.FINAL)
-        self.logger.karo_speaks("うむ、城代から上がった記事を検分いたそう。")
 
-        final_draft_path = FLOOR_TENSHUKAKU / "final_draft.md"
-        if not final_draft_path.exists():
-            self.logger.karo_speaks("なんと…城代からの報告がまだ届いておりませぬ！")
-            return False
+def council_for_task(task: Task, **overrides) -> WarCouncil:
+    """持ち場を片付ける軍議を、積んだ軍議の設定と作業場で組み直す（陣中日誌・軍議記録は積んだ側が書く）"""
+    options = task.options
+    return WarCouncil(
+        theme=task.theme,
+        model=options.get("model", DEFAULT_MODEL),
+        dry_run=options.get("dry_run", False),
+        workspace=CastleWorkspace(run_id=task.run_id, root=Path(task.workspace)),
+        stream=options.get("stream", False),
+        local_executors=options.get("local_executors", True),
+        section_parallel=options.get("section_parallel", False),
+        diff_rewrite=options.get("diff_rewrite", False),
+        review=ReviewPolicy(**options["review"]) if options.get("review") else None,
+        refresh_agents=options.get("refresh_agents"),
+        vault_top_k=options.get("vault_top_k", DEFAULT_VAULT_TOP_K),
+        **overrides,
+    )
 
-        if self.dry_run:
-            # ドライラン
-            content = final_draft_path.read_text(encoding="utf-8")
-            final_path = FLOOR_TENSHUKAKU / "FINAL_ARTICLE.md"
-            final_path.write_text(content, encoding="utf-8")
-            self.logger.shogun_delivery(str(final_path.relative_to(BASE_DIR)))
-            return True
 
-        try:
-            # 家老のSystem Prompt読み込み
-            karo_prompt_path = AGENTS_DIR / "00_karo_orchestrator.md"
-            system_prompt = karo_prompt_path.read_text(encoding="utf-8")
-
-            final_draft = final_draft_path.read_text(encoding="utf-8")
-            strategy = ""
-            strategy_path = self.vault_root / "Strategy" / "Strategy.md"
-            if strategy_path.exists():
-                strategy = strategy_path.read_text(encoding="utf-8")
-
-            user_message = (
-                f"# 城代検分済み記事\n\n{final_draft}\n\n---\n\n"
-                f"# Strategy.md（照合用）\n\n{strategy}\n\n---\n\n"
-                f"将軍の勅命テーマ: 「{self.theme}」\n\n"
-                f"城代の検分を通過した記事です。最終確認を行い、問題がなければ "
-                f"FINAL_ARTICLE として出力してください。修正が必要な場合は修正した上で出力してください。"
-            )
+class TaskWorker:
+    """
+    働き手。持ち場帳（castle_queue.TaskQueue）から家臣1人分の持ち場を借り、
+    共有の作業場の成果物を読んで書いて片付ける。
 
-            response = self.api.call_agent(
-                system_prompt=system_prompt,
-                user_message=user_message,
-                max_tokens=8192,
-                temperature=0.3,  # 最終確認は低温度で
-            )
+    同じイベントループ上で最大 concurrency 件の持ち場を同時に片付け、API クライアントと流量制限は共有する。
+    片付けている間は貸し出し期限の 1/3 ごとに期限を延ばし、延ばせなければ（期限が切れて
+    他の働き手へ回っていれば）手を引く。止めるときは片付けていない持ち場を列へ戻す。
+    """
 
-            # FINAL_ARTICLE として保存
-            final_path = FLOOR_TENSHUKAKU / "FINAL_ARTICLE.md"
-            final_path.write_text(response, encoding="utf-8")
+    def __init__(
+        self,
+        tasks: TaskQueue,
+        worker_id: str,
+        concurrency: int = DEFAULT_WORKER_CONCURRENCY,
+        lease_sec: float = DEFAULT_LEASE_SEC,
+        cache_factory: Optional[Callable[[], AgentOutputCache]] = None,
+        **council_overrides,
+    ):
+        self.tasks = tasks
+        self.worker_id = worker_id
+        self.concurrency = max(1, concurrency)
+        self.lease_sec = lease_sec
+        self.cache_factory = cache_factory
+        self.council_overrides = council_overrides
+        self.running: dict[int, asyncio.Task] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._stopping = False
 
-            self.logger.karo_speaks("大義である。将軍様への納品の支度が整いました。")
-            self.logger.shogun_delivery(str(final_path.relative_to(BASE_DIR)))
-            return True
+    def stop(self):
+        self._stopping = True
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    def _finished(self, task_id: int):
+        self.running.pop(task_id, None)
+        self._wake.set()
+
+    async def run(self):
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        while not self._stopping:
+            while len(self.running) < self.concurrency:
+                task = self.tasks.claim(self.worker_id, self.lease_sec)
+                if task is None:
+                    break
+                job = asyncio.create_task(self._run_task(task))
+                self.running[task.id] = job
+                job.add_done_callback(lambda _, task_id=task.id: self._finished(task_id))
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=TASK_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
 
+        jobs = list(self.running.values())
+        for job in jobs:
+            job.cancel()
+        await asyncio.gather(*jobs, return_exceptions=True)
+
+    async def _perform(self, council: WarCouncil, name_en: str) -> str:
+        """持ち場（家臣1人分、または家老の最終確認）を片付け、終わりの状態を返す"""
+        if name_en == "Karo":
+            final_draft = council.artifacts.read(KARO_INPUT_REL)
+            if final_draft is None:
+                raise FileNotFoundError(f"無念！城代の {KARO_INPUT_REL} が作業場に届いておりませぬ")
+            success = await council._execute_karo_final_async(final_draft)
+        else:
+            agent = next((a for a in RETAINERS if a.name_en == name_en), None)
+            if agent is None:
+                raise ValueError(f"無念！{name_en} という家臣はおりませぬ")
+            success = await council._execute_agent_async(agent)
+        council.artifacts.flush()
+        if not success:
+            raise RuntimeError(council.errors.get(name_en, "持ち場で倒れました"))
+        return "fallback" if name_en in council.fallbacks else "succeeded"
+
+    async def _run_task(self, task: Task):
+        again = f"（{task.attempts} 度目の貸し出し）" if task.attempts > 1 else ""
+        print(f"{Color.YELLOW}  🔨 持ち場 #{task.id}: 『{task.theme}』の {task.agent} を引き受けました{again}{Color.RESET}")
+        council = work = None
+        try:
+            council = council_for_task(
+                task, cache=self.cache_factory() if self.cache_factory else None, **self.council_overrides
+            )
+            work = asyncio.create_task(self._perform(council, task.agent))
+            while True:
+                done, _ = await asyncio.wait({work}, timeout=self.lease_sec / 3)
+                if done:
+                    break
+                if not self.tasks.heartbeat(task.id, self.worker_id, self.lease_sec):
+                    work.cancel()
+                    await asyncio.gather(work, return_exceptions=True)
+                    print(f"{Color.RED}  🔨 持ち場 #{task.id} は期限が切れて他の働き手へ回りました。手を引きまする{Color.RESET}")
+                    return
+            status, error = work.result(), ""
+        except asyncio.CancelledError:
+            if work is not None:
+                work.cancel()
+            self.tasks.release(task.id, self.worker_id)
+            raise
         except Exception as e:
-            self.logger.karo_speaks(f"無念…不測の事態です: {e}")
-            return False
+            status, error = "failed", str(e)
 
-    def execute(self) -> bool:
-        """
-        軍議を開始し、全工程を実行する。
-        Returns: 成功したかどうか
-        """
-        self._ensure_dirs()
+        calls = council.tracer.export_calls(task.agent) if council is not None else []
+        if self.tasks.complete(task.id, self.worker_id, status, error=error, calls=calls):
+            print(f"{Color.YELLOW}  🔨 持ち場 #{task.id}: {task.agent} → {status}{Color.RESET}")
+        else:
+            print(f"{Color.RED}  🔨 持ち場 #{task.id} の報告は受け付けられませんでした"
+                  f"（期限が切れて他の働き手へ回っております）{Color.RESET}")
 
-        # 開城
-        self.logger.banner()
-        self.logger.karo_speaks(
-            f"将軍様より『{self.theme}』との勅命が下った！者ども、支度はよいか！"
-        )
 
-        # 家臣団を順に動員
-        success_count = 0
-        for agent in RETAINERS:
-            success = self._run_agent(agent)
-            if success:
-                success_count += 1
-            else:
-                # 致命的エラーの場合は中断（画像生成以外）
-                if agent.number != 13:
-                    self.logger.karo_speaks(
-                        f"無念…{agent.name_jp}が倒れました。軍議を一時中断いたします。"
-                    )
-                    self.logger.summary(False, success_count)
-                    log_path = self.logger.save_log(self.theme)
-                    print(f"\n  📜 軍議記録: {log_path}")
-                    return False
+def worker_main(argv: list[str]):
+    """war_council.py worker — 持ち場帳から家臣1人分の持ち場を借りて片付ける"""
+    parser = argparse.ArgumentParser(
+        prog="war_council.py worker",
+        description="働き手 — 持ち場帳から家臣1人分の持ち場を借り、共有の作業場で片付ける",
+    )
+    parser.add_argument("--queue", type=Path, required=True, help="持ち場帳（SQLite。複数の機械なら共有ストレージ上）")
+    parser.add_argument("--worker-id", type=str, default=f"{socket.gethostname()}:{os.getpid()}",
+                        help="働き手の名（デフォルト: ホスト名:プロセスID）")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_WORKER_CONCURRENCY,
+                        help=f"同時に片付ける持ち場の上限（デフォルト: {DEFAULT_WORKER_CONCURRENCY}）")
+    parser.add_argument("--lease", type=float, default=DEFAULT_LEASE_SEC,
+                        help=f"貸し出し期限（秒、デフォルト: {DEFAULT_LEASE_SEC:g}）。この 1/3 ごとに延ばす")
+    parser.add_argument("--routing", type=Path, default=None, help="家臣ごとのモデルの振り分け（TOML / JSON）")
+    parser.add_argument("--max-in-flight", type=int, default=DEFAULT_MAX_IN_FLIGHT,
+                        help=f"同時に飛ばす API リクエストの上限（デフォルト: {DEFAULT_MAX_IN_FLIGHT}）")
+    parser.add_argument("--rpm", type=int, default=None, help="1分あたりリクエスト数上限（省略時は無制限）")
+    parser.add_argument("--tpm", type=int, default=None, help="1分あたりトークン数上限（省略時は無制限）")
+    parser.add_argument("--no-cache", action="store_true", help="蔵（エージェント出力キャッシュ）を使わない")
+    parser.add_argument("--no-prompt-cache", action="store_true", help="prompt caching を使わない")
+    args = parser.parse_args(argv)
 
-        # 家老の最終確認
-        final_success = self._run_karo_final()
+    routing = None
+    if args.routing:
+        try:
+            routing = load_routing(args.routing)
+        except (OSError, ValueError, ImportError) as e:
+            parser.error(str(e))
+    if args.lease <= 0:
+        parser.error("--lease は 0 より大きい秒数で指定してくだされ")
+    CastleRequestPool.configure(
+        max_in_flight=args.max_in_flight,
+        requests_per_minute=args.rpm,
+        tokens_per_minute=args.tpm,
+    )
+    # ドライランの持ち場もあるので、API クライアントは最初の呼び出しで作る
+    loaded = warm_up(client=False)
 
-        # サマリー
-        self.logger.summary(final_success, success_count + (1 if final_success else 0))
+    worker = TaskWorker(
+        TaskQueue(args.queue),
+        args.worker_id,
+        concurrency=args.concurrency,
+        lease_sec=args.lease,
+        cache_factory=None if args.no_cache else AgentOutputCache,
+        prompt_cache=not args.no_prompt_cache,
+        routing=routing,
+    )
+    print(f"{Color.YELLOW}  🔨 働き手 {args.worker_id} 参上 | 持ち場帳: {args.queue} | "
+          f"同時: {worker.concurrency} | 貸し出し期限: {args.lease:g}秒 | 指令書・Vault 資料 {loaded}件を読み込み済み{Color.RESET}")
 
-        # ログ保存
-        log_path = self.logger.save_log(self.theme)
-        print(f"\n  📜 軍議記録: {log_path}")
+    async def run():
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, worker.stop)
+            except (NotImplementedError, RuntimeError):
+                pass
+        await worker.run()
 
-        return final_success
+    asyncio.run(run())
+    print(f"{Color.YELLOW}  🔨 働き手 {args.worker_id} 退きました（片付けていない持ち場は列へ戻しました）{Color.RESET}")
+
+
+def resolve_rebuild_target(path_str: str, run_id: Optional[str] = None) -> tuple[str, str]:
+    """
+    --rebuild-from の引数を (run_id, 作業場からの相対パス) に解決する。
+
+    castle_floors/runs/<run_id>/ 配下のパスならそこから run_id を読み取る。
+    それ以外は "04_writing_room/draft_v2.md" のような相対表記とみなし、--resume の run_id を使う。
+    """
+    path = Path(path_str).resolve()
+    if RUNS_DIR.resolve() in path.parents:
+        parts = path.relative_to(RUNS_DIR.resolve()).parts
+        if len(parts) >= 3:
+            return parts[0], "/".join(parts[1:])
+    if run_id:
+        return run_id, Path(path_str).as_posix()
+    raise ValueError(
+        f"{path_str} から軍議IDを読み取れませぬ。"
+        "castle_floors/runs/<run_id>/ 配下のパスを指定するか、--resume で軍議IDを添えてくだされ"
+    )
 
 
 # ---------------------------------------------------------------------------
@@ -721,6 +4382,13 @@ class WarCouncil:
 # ---------------------------------------------------------------------------
 
 def main():
+    if sys.argv[1:2] == ["serve"]:
+        serve_main(sys.argv[2:])
+        return
+    if sys.argv[1:2] == ["worker"]:
+        worker_main(sys.argv[2:])
+        return
+
     parser = argparse.ArgumentParser(
         description="江戸城 — 完全自律型記事作成システム (The Shogun Protocol)",
         formatter_class=argparse.RawDescriptionHelpFormatter,
@@ -729,34 +4397,478 @@ def main():
   python war_council.py "AIエージェントの最新動向"
   python war_council.py "リモートワークの生産性向上" --model claude-sonnet-4-20250514
   python war_council.py "テスト実行" --dry-run
+  python war_council.py "テスト実行" --max-parallel 1
+  python war_council.py --themes-file themes.txt --batch-concurrency 8
+  python war_council.py serve --port 8765 --workers 8
+  python war_council.py "テーマ" --async --task-queue /mnt/castle/tasks.db
+  python war_council.py worker --queue /mnt/castle/tasks.db --concurrency 8
         """,
     )
     parser.add_argument(
         "theme",
         type=str,
+        nargs="?",
         help="将軍の勅命（記事テーマ）",
     )
+    parser.add_argument(
+        "--themes-file",
+        type=Path,
+        default=None,
+        help="一斉軍議: 1行1テーマのテキスト、または JSONL のテーマ一覧",
+    )
+    parser.add_argument(
+        "--batch-concurrency",
+        type=int,
+        default=None,
+        help=f"一斉軍議で同時に開く軍議の上限（デフォルト: {DEFAULT_BATCH_CONCURRENCY}、--batch-api 時は全テーマ）",
+    )
+    parser.add_argument(
+        "--record",
+        type=Path,
+        default=None,
+        help="API の依頼と返事を写し帳（JSONL）に録る",
+    )
+    parser.add_argument(
+        "--replay",
+        type=Path,
+        default=None,
+        help="API を呼ばず、写し帳の返事を返す（プロンプトは本番どおり組み立てる）",
+    )
+    parser.add_argument(
+        "--replay-ttft",
+        type=str,
+        default=None,
+        help="再生時の最初の一字までの秒数の分布（fixed:1.5 / uniform:0.5,2 / normal:1,0.3 / lognormal:0,0.5、デフォルト: 録った値）",
+    )
+    parser.add_argument(
+        "--replay-tps",
+        type=str,
+        default=None,
+        help="再生時の出力速度（tok/s）の分布（書式は --replay-ttft と同じ、デフォルト: 録った所要時間）",
+    )
+    parser.add_argument(
+        "--replay-scale",
+        type=float,
+        default=1.0,
+        help="再生時の待ち時間の倍率（0 で待たない、デフォルト: 1）",
+    )
+    parser.add_argument(
+        "--replay-seed",
+        type=int,
+        default=None,
+        help="再生時の待ち時間の乱数の種（揃えれば同じ待ち時間の並びになる）",
+    )
+    parser.add_argument(
+        "--vault-top-k",
+        type=int,
+        default=DEFAULT_VAULT_TOP_K,
+        help=f"家臣に添える Vault 資料の抜粋の上限（デフォルト: {DEFAULT_VAULT_TOP_K}、0 で資料を丸ごと添える）",
+    )
+    parser.add_argument(
+        "--task-queue",
+        type=Path,
+        default=None,
+        help="家臣の持ち場をこの持ち場帳（SQLite）に積み、働き手（war_council.py worker）に片付けさせる",
+    )
+    parser.add_argument(
+        "--batch-api",
+        action="store_true",
+        help="Message Batches API で全軍議の家臣の呼び出しを束ねて出す（単価は半額、返事は束の処理が終わり次第）",
+    )
+    parser.add_argument(
+        "--batch-server",
+        type=str,
+        default="anthropic",
+        help="--batch-api の一括注文所: anthropic（デフォルト）・local（手元の代役）・<module>:<関数名>",
+    )
+    parser.add_argument(
+        "--batch-gather-window",
+        type=float,
+        default=DEFAULT_BATCH_GATHER_WINDOW,
+        help=f"新しい依頼がこの秒数途絶えたら束を出す（デフォルト: {DEFAULT_BATCH_GATHER_WINDOW}）",
+    )
+    parser.add_argument(
+        "--batch-poll-interval",
+        type=float,
+        default=DEFAULT_BATCH_POLL_INTERVAL,
+        help=f"束の処理の終わりを問い合わせる間隔（秒、デフォルト: {DEFAULT_BATCH_POLL_INTERVAL}）",
+    )
+    parser.add_argument(
+        "--manifest",
+        type=Path,
+        default=None,
+        help="一斉軍議の結果一覧（JSONL）の保存先（デフォルト: castle_floors/batch_manifest_<日時>.jsonl）",
+    )
+    parser.add_argument(
+        "--metrics-file",
+        type=Path,
+        default=None,
+        help="家臣ごとの所要時間 p50/p95・トークン・費用を Prometheus の text-file 形式で書き出す先",
+    )
     parser.add_argument(
         "--model",
         type=str,
         default=DEFAULT_MODEL,
-        help=f"使用するClaude モデル（デフォルト: {DEFAULT_MODEL}）",
+        help=f"標準格の家臣が使う Claude モデル（デフォルト: {DEFAULT_MODEL}）",
+    )
+    parser.add_argument(
+        "--max-retries",
+        type=int,
+        default=DEFAULT_MAX_RETRIES,
+        help=f"過負荷・流量超過など一時的な API エラーの再試行回数（デフォルト: {DEFAULT_MAX_RETRIES}）",
+    )
+    parser.add_argument(
+        "--hedge",
+        action="store_true",
+        help="返事が p95 を過ぎても来なければ同じ依頼をもう一本放ち、先に返った方を使う（ストリーミング時は使わない）",
+    )
+    parser.add_argument(
+        "--hedge-after",
+        type=float,
+        default=DEFAULT_HEDGE_AFTER,
+        help=f"p95 が測れるまでの二の矢の合図（秒、デフォルト: {DEFAULT_HEDGE_AFTER:g}）",
+    )
+    parser.add_argument(
+        "--fallback-model",
+        action="append",
+        default=[],
+        metavar="MODEL=FALLBACK",
+        help="MODEL の遮断器が落ちている間に代わりに使うモデル（複数指定可。--routing の [fallbacks] でも指定できる）",
+    )
+    parser.add_argument(
+        "--breaker-threshold",
+        type=int,
+        default=DEFAULT_BREAKER_THRESHOLD,
+        help=f"同じモデルで続けて倒れたら遮断する回数（デフォルト: {DEFAULT_BREAKER_THRESHOLD}）",
+    )
+    parser.add_argument(
+        "--breaker-cooldown",
+        type=float,
+        default=DEFAULT_BREAKER_COOLDOWN,
+        help=f"遮断してから元のモデルを試し直すまでの秒数（デフォルト: {DEFAULT_BREAKER_COOLDOWN:g}）",
+    )
+    parser.add_argument(
+        "--routing",
+        type=Path,
+        default=None,
+        help="家臣ごとのモデルの格・max_tokens・温度を差し替える設定ファイル（TOML / JSON）",
+    )
+    parser.add_argument(
+        "--run-id",
+        type=str,
+        default=None,
+        help="軍議ID（作業場 castle_floors/runs/<run_id>/ の名前。省略時は自動採番）",
+    )
+    parser.add_argument(
+        "--resume",
+        type=str,
+        default=None,
+        metavar="RUN_ID",
+        help="中断した軍議を再開する（入力・出力が前回のままの家臣は再出陣させない）",
+    )
+    parser.add_argument(
+        "--rebuild-from",
+        type=str,
+        default=None,
+        metavar="FILE",
+        help="手直しした成果物（castle_floors/runs/<run_id>/... のパス）を活かし、その下流の家臣だけを作り直す",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="ストリーミングで受け取り、届いた分から出力ファイル（*.partial）へ書き出す",
+    )
+    parser.add_argument(
+        "--no-prompt-cache",
+        action="store_true",
+        help="System Prompt と Vault コンテキストへの prompt caching の区切りを付けない",
+    )
+    parser.add_argument(
+        "--section-parallel",
+        action="store_true",
+        help="右筆に H2 セクションごとに手分けして同時に初稿を書かせる",
+    )
+    parser.add_argument(
+        "--diff-rewrite",
+        action="store_true",
+        help="代筆に御意見番の指摘があったセクションだけを同時に書き直させる",
+    )
+    parser.add_argument(
+        "--speculate",
+        action="store_true",
+        help="絵師を draft_v2.md で先回りさせ、勘定方・公文書係と同時に画像を配置させる",
+    )
+    parser.add_argument(
+        "--max-review-rounds",
+        type=int,
+        default=DEFAULT_MAX_REVIEW_ROUNDS,
+        help=f"御意見番の批評と代筆の書き直しを繰り返す上限回数（デフォルト: {DEFAULT_MAX_REVIEW_ROUNDS}）",
+    )
+    parser.add_argument(
+        "--review-threshold",
+        type=int,
+        choices=sorted(SEVERITY_WEIGHTS.values()),
+        default=DEFAULT_REVIEW_THRESHOLD,
+        help="批評の最も重い評価がこれを下回れば推敲を打ち切る（0=◎, 1=○, 2=△, 3=×、デフォルト: 2）",
+    )
+    parser.add_argument(
+        "--review-min-change",
+        type=float,
+        default=DEFAULT_REVIEW_MIN_CHANGE,
+        help=f"書き直しによる変化率（行単位）がこれを下回れば推敲を打ち切る（デフォルト: {DEFAULT_REVIEW_MIN_CHANGE}）",
+    )
+    parser.add_argument(
+        "--review-budget-sec",
+        type=float,
+        default=None,
+        help="2回目以降の推敲に使える秒数（デフォルト: 無制限）",
+    )
+    parser.add_argument(
+        "--review-budget-tokens",
+        type=int,
+        default=None,
+        help="2回目以降の推敲に使える入出力トークン数（デフォルト: 無制限）",
+    )
+    parser.add_argument(
+        "--no-local-executors",
+        action="store_true",
+        help="勘定方の算盤・城代の下検分など手元の処理を使わず、API を呼ばせる",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="エージェント出力の蔵（キャッシュ）を使わない",
+    )
+    parser.add_argument(
+        "--refresh-agent",
+        action="append",
+        default=[],
+        metavar="NAME",
+        help="指定した家臣だけ蔵を使わず API を呼び直す（英名・和名。複数指定可、家老は Karo）",
+    )
+    parser.add_argument(
+        "--cache-max-age-days",
+        type=float,
+        default=DEFAULT_CACHE_MAX_AGE_DAYS,
+        help=f"蔵の保存期限（日、デフォルト: {DEFAULT_CACHE_MAX_AGE_DAYS}）",
+    )
+    parser.add_argument(
+        "--cache-max-mb",
+        type=float,
+        default=DEFAULT_CACHE_MAX_MB,
+        help=f"蔵の容量上限（MB、デフォルト: {DEFAULT_CACHE_MAX_MB}）",
     )
     parser.add_argument(
         "--dry-run",
         action="store_true",
         help="ドライラン（API呼び出しなし、ダミー出力で流れを確認）",
     )
+    parser.add_argument(
+        "--max-parallel",
+        type=int,
+        default=DEFAULT_MAX_PARALLEL,
+        help=f"同時に動員する家臣の上限（デフォルト: {DEFAULT_MAX_PARALLEL}、1 で逐次実行）",
+    )
+    parser.add_argument(
+        "--async",
+        dest="use_async",
+        action="store_true",
+        help="asyncio 経路（AsyncCastleAPIClient）で実行する",
+    )
+    parser.add_argument(
+        "--max-in-flight",
+        type=int,
+        default=DEFAULT_MAX_IN_FLIGHT,
+        help=f"asyncio 経路・一斉軍議で同時に飛ばす API リクエストの上限（デフォルト: {DEFAULT_MAX_IN_FLIGHT}）",
+    )
+    parser.add_argument(
+        "--rpm",
+        type=int,
+        default=None,
+        help="asyncio 経路・一斉軍議の 1分あたりリクエスト数上限（省略時は無制限）",
+    )
+    parser.add_argument(
+        "--tpm",
+        type=int,
+        default=None,
+        help="asyncio 経路・一斉軍議の 1分あたりトークン数上限（省略時は無制限）",
+    )
 
     args = parser.parse_args()
 
-    council = WarCouncil(
-        theme=args.theme,
-        model=args.model,
-        dry_run=args.dry_run,
+    rebuild_rel = None
+    if args.rebuild_from:
+        try:
+            rebuild_run_id, rebuild_rel = resolve_rebuild_target(args.rebuild_from, args.resume)
+        except ValueError as e:
+            parser.error(str(e))
+        args.resume = rebuild_run_id
+
+    routing = None
+    if args.routing:
+        try:
+            routing = load_routing(args.routing)
+        except (OSError, ValueError, ImportError) as e:
+            parser.error(str(e))
+
+    fallbacks = dict(routing.fallbacks) if routing else {}
+    for spec in args.fallback_model:
+        source, sep, fallback = spec.partition("=")
+        if not (sep and source.strip() and fallback.strip()):
+            parser.error(f"--fallback-model は MODEL=FALLBACK の形で指定してくだされ: {spec}")
+        fallbacks[source.strip()] = fallback.strip()
+    CallGuard.configure(RetryPolicy(
+        max_retries=max(0, args.max_retries),
+        hedge=args.hedge,
+        hedge_after=args.hedge_after,
+        fallbacks=fallbacks,
+        breaker_threshold=max(1, args.breaker_threshold),
+        breaker_cooldown=args.breaker_cooldown,
+    ))
+
+    if args.resume:
+        if args.themes_file or args.run_id:
+            parser.error("--resume / --rebuild-from は --themes-file / --run-id と同時に指定できませぬ")
+    elif bool(args.theme) == bool(args.themes_file):
+        parser.error("テーマか --themes-file のどちらか一方を指定してくだされ")
+
+    batcher = None
+    if args.batch_api:
+        if args.stream:
+            parser.error("--batch-api と --stream は同時に指定できませぬ（束の返事は一度に届きます）")
+        try:
+            batcher = MessageBatcher(
+                load_batch_server(args.batch_server),
+                gather_window=args.batch_gather_window,
+                poll_interval=args.batch_poll_interval,
+            )
+        except ValueError as e:
+            parser.error(str(e))
+
+    cassette = timing = None
+    if args.record or args.replay:
+        if args.record and args.replay:
+            parser.error("--record と --replay は同時に指定できませぬ")
+        if batcher:
+            parser.error("--record / --replay は --batch-api と同時に指定できませぬ")
+        if args.replay and not args.replay.exists():
+            parser.error(f"無念！写し帳が見つかりませぬ: {args.replay}")
+        cassette = Cassette(args.record or args.replay)
+        try:
+            timing = ReplayTiming(
+                ttft=Distribution.parse(args.replay_ttft) if args.replay_ttft else None,
+                tokens_per_sec=Distribution.parse(args.replay_tps) if args.replay_tps else None,
+                scale=max(0.0, args.replay_scale),
+                seed=args.replay_seed,
+            )
+        except ValueError as e:
+            parser.error(str(e))
+
+    tasks = None
+    if args.task_queue:
+        if batcher or cassette:
+            parser.error("--task-queue は --batch-api / --record / --replay と同時に指定できませぬ（API は働き手が呼びます）")
+        tasks = TaskQueue(args.task_queue)
+
+    def make_clients() -> tuple:
+        """軍議ごとの (同期, asyncio) クライアント（録音・再生しないなら WarCouncil の既定に任せる）"""
+        prompt_cache = not args.no_prompt_cache
+        if args.replay:
+            return ReplayAPIClient(cassette, timing, args.model), AsyncReplayAPIClient(cassette, timing, args.model)
+        if args.record:
+            return (
+                RecordingAPIClient(CastleAPIClient(model=args.model, prompt_cache=prompt_cache), cassette),
+                AsyncRecordingAPIClient(AsyncCastleAPIClient(model=args.model, prompt_cache=prompt_cache), cassette),
+            )
+        return None, None
+
+    if args.use_async or args.themes_file:
+        CastleRequestPool.configure(
+            max_in_flight=args.max_in_flight,
+            requests_per_minute=args.rpm,
+            tokens_per_minute=args.tpm,
+        )
+
+    def make_cache() -> AgentOutputCache:
+        return AgentOutputCache(max_age_days=args.cache_max_age_days, max_mb=args.cache_max_mb)
+
+    cache_factory = None if args.no_cache else make_cache
+    review = ReviewPolicy(
+        max_rounds=max(1, args.max_review_rounds),
+        threshold=args.review_threshold,
+        min_change=args.review_min_change,
+        budget_sec=args.review_budget_sec,
+        budget_tokens=args.review_budget_tokens,
     )
 
-    success = council.execute()
+    if args.themes_file:
+        themes = load_themes(args.themes_file)
+        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        manifest_path = args.manifest or CASTLE_FLOORS / f"batch_manifest_{timestamp}.jsonl"
+        records = asyncio.run(run_batch(
+            themes,
+            manifest_path,
+            model=args.model,
+            dry_run=args.dry_run,
+            max_parallel=args.max_parallel,
+            concurrency=args.batch_concurrency or (len(themes) if batcher else DEFAULT_BATCH_CONCURRENCY),
+            cache_factory=cache_factory,
+            refresh_agents=args.refresh_agent,
+            stream=args.stream,
+            prompt_cache=not args.no_prompt_cache,
+            local_executors=not args.no_local_executors,
+            section_parallel=args.section_parallel,
+            diff_rewrite=args.diff_rewrite,
+            review=review,
+            speculate=args.speculate,
+            routing=routing,
+            metrics_path=args.metrics_file,
+            batcher=batcher,
+            api_factory=(lambda: make_clients()[1]) if cassette else None,
+            tasks=tasks,
+            vault_top_k=args.vault_top_k,
+        ))
+        failed = sum(1 for r in records if r["status"] != "success")
+        print(f"\n  📜 一斉軍議の結果: {len(records) - failed}/{len(records)} 件勝利 → {manifest_path}")
+        sys.exit(0 if failed == 0 else 1)
+
+    api, async_api = make_clients()
+    if batcher:
+        async_api = BatchCastleAPIClient(batcher, model=args.model, prompt_cache=not args.no_prompt_cache)
+    try:
+        council = WarCouncil(
+            theme=args.theme or "",
+            model=args.model,
+            dry_run=args.dry_run,
+            max_parallel=args.max_parallel,
+            run_id=args.resume or args.run_id,
+            resume=bool(args.resume),
+            rebuild_from=rebuild_rel,
+            stream=args.stream,
+            prompt_cache=not args.no_prompt_cache,
+            local_executors=not args.no_local_executors,
+            section_parallel=args.section_parallel,
+            diff_rewrite=args.diff_rewrite,
+            review=review,
+            speculate=args.speculate,
+            routing=routing,
+            cache=cache_factory() if cache_factory else None,
+            refresh_agents=args.refresh_agent,
+            api=api,
+            async_api=async_api,
+            tasks=tasks,
+            vault_top_k=args.vault_top_k,
+        )
+    except (FileNotFoundError, ValueError) as e:
+        print(f"{Color.RED}  ⚠️  {e}{Color.RESET}")
+        sys.exit(1)
+
+    if args.use_async or batcher:
+        success = asyncio.run(council.execute_async())
+    else:
+        success = council.execute()
+    if args.metrics_file:
+        write_prometheus(council.tracer.spans, args.metrics_file)
     sys.exit(0 if success else 1)
 
 